@@ -0,0 +1,62 @@
+"""Benchmark the merging of identical photon times in `tttr2xfcs`
+
+Compares the former `np.unique` (sort) based merging with the linear
+`mergeTimes` over all 25 cascades of the default configuration.
+
+Usage: python benchmarks/bench_coarse_graining.py [number of photons]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from pycorrfit.readfiles.read_pt3_scripts.correlation_methods import mergeTimes
+
+
+def merge_unique(y, num):
+    """Sort-based merging of PyCorrFit 1.3 (np.unique)
+
+    The weights are summed per unique time like in `mergeTimes`
+    (PyCorrFit 1.3 attributed repeated photons to the next time).
+    """
+    y, k1 = np.unique(y, return_index=True)
+    return y, np.add.reduceat(num, k1, axis=0)
+
+
+def cascades(merge, y, num, ncasc=25):
+    durations = []
+    for _j in range(ncasc):
+        t0 = time.perf_counter()
+        y, num = merge(y, num)
+        durations.append(time.perf_counter() - t0)
+        y = (y + 1) >> 1
+    return durations, y, num
+
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7
+    rng = np.random.default_rng(42)
+    # 100 kHz count rate in integer nanoseconds
+    y = np.cumsum(rng.exponential(1e4, size)).astype(np.int64)
+    num = np.zeros((size, 2))
+    num[np.arange(size), rng.integers(0, 2, size)] = 1
+
+    tu, yu, nu = cascades(merge_unique, y, num)
+    tm, ym, nm = cascades(mergeTimes, y, num)
+    assert np.array_equal(yu, ym)
+    assert np.array_equal(nu, nm)
+
+    print("{} photons".format(size))
+    print(
+        "{:>8s} {:>12s} {:>12s} {:>8s}".format(
+            "cascade", "unique [s]", "linear [s]", "speedup"
+        )
+    )
+    for jj, (a, b) in enumerate(zip(tu, tm, strict=True)):
+        print("{:8d} {:12.4f} {:12.4f} {:8.1f}".format(jj, a, b, a / b))
+    print(
+        "{:>8s} {:12.4f} {:12.4f} {:8.1f}".format(
+            "total", sum(tu), sum(tm), sum(tu) / sum(tm)
+        )
+    )
@@ -0,0 +1,64 @@
+"""Benchmark the import of Zeiss ConfoCor3 .fcs files
+
+Writes a synthetic multi-curve file and reports the import time and
+the peak memory of `openFCS`. The former `readlines` implementation
+parsed every value with `csv.reader` and `np.float64`; its parsing of
+the count rates is timed for comparison.
+
+Usage: python benchmarks/bench_confocor3.py [repetitions] [trace length]
+"""
+
+import csv
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from os.path import dirname, join
+
+import numpy as np
+
+from pycorrfit.readfiles import openFCS
+
+sys.path.insert(0, join(dirname(__file__), "..", "tests"))
+import synthetic_fcsfiles  # noqa: E402
+
+
+def readlines_csv(path):
+    """Parse all count rates like the former implementation"""
+    with open(path, encoding="iso8859_15") as fd:
+        Alldata = fd.readlines()
+    traces = []
+    for ii, line in enumerate(Alldata):
+        if line.strip().startswith("CountRateArray"):
+            length = int(line.split("=")[1].split()[0])
+            trace = []
+            for row in csv.reader(Alldata[ii + 1 : ii + length + 1], delimiter="\t"):
+                trace.append((np.float64(row[3]) * 1000, np.float64(row[4]) / 1000))
+            traces.append(np.array(trace))
+    return traces
+
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tracelength = int(float(sys.argv[2])) if len(sys.argv) > 2 else 10**5
+    path = pathlib.Path(tempfile.mkdtemp()) / "bench.fcs"
+    synthetic_fcsfiles.write_confocor3(
+        path, repetitions=repetitions, tracelength=tracelength
+    )
+    size = path.stat().st_size / 1024**2
+    print("file size: {:.1f} MB".format(size))
+    print(
+        "{:>14s} {:>9s} {:>9s} {:>10s}".format(
+            "method", "time [s]", "MB/s", "peak [MB]"
+        )
+    )
+    for name, func in [("readlines+csv", readlines_csv), ("openFCS", openFCS)]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        func(path)
+        dur = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+        print("{:>14s} {:9.2f} {:9.1f} {:10.1f}".format(name, dur, size / dur, peak))
+    path.unlink()
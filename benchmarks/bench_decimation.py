@@ -0,0 +1,53 @@
+"""Benchmark the downsampling of intensity traces
+
+Compares the former loop over the interval offsets with the
+vectorized decimation methods of `readfiles.util.downsample_trace`.
+
+Usage: python benchmarks/bench_decimation.py [number of samples]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from pycorrfit.readfiles import util
+
+
+def loop_mean(trace, bestlength=500):
+    """The former implementation of `downsample_trace`"""
+    teiler = int(np.floor(len(trace) / bestlength))
+    newlength = int(np.floor(len(trace) / teiler))
+    newsignal = np.zeros(newlength)
+    for j in np.arange(teiler):
+        newsignal = newsignal + trace[j : newlength * teiler : teiler][:, 1]
+    newsignal = 1.0 * newsignal / teiler
+    newtimes = trace[teiler - 1 : newlength * teiler : teiler][:, 0]
+    if len(trace) % teiler != 0:
+        rest = trace[newlength * teiler :][:, 1]
+        newsignal = np.concatenate((newsignal, [sum(rest) / len(rest)]))
+        newtimes = np.concatenate((newtimes, [trace[-1][0]]))
+    newtrace = np.zeros((len(newtimes), 2))
+    newtrace[:, 0] = newtimes
+    newtrace[:, 1] = newsignal
+    return newtrace
+
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7
+    rng = np.random.default_rng(42)
+    trace = np.zeros((size, 2))
+    trace[:, 0] = np.arange(size) * 0.01
+    trace[:, 1] = rng.poisson(50, size)
+    print("{:>8s} {:>10s} {:>8s}".format("method", "time [s]", "points"))
+    t0 = time.perf_counter()
+    ref = loop_mean(trace)
+    print("{:>8s} {:10.3f} {:8d}".format("loop", time.perf_counter() - t0, len(ref)))
+    for method in sorted(util.DECIMATION_METHODS):
+        t0 = time.perf_counter()
+        dec = util.downsample_trace(trace, method=method)
+        print(
+            "{:>8s} {:10.3f} {:8d}".format(method, time.perf_counter() - t0, len(dec))
+        )
+        if method == "mean":
+            assert np.allclose(dec, ref)
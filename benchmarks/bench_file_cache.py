@@ -0,0 +1,39 @@
+"""Benchmark the on-disk cache of parsed data files
+
+Imports a pt3 file with `open_any` without and with a
+`ParsedFileCache` (first and second import) and reports the times.
+
+Usage: python benchmarks/bench_file_cache.py [path or duration [s]]
+"""
+
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+from os.path import dirname, join
+
+from pycorrfit import readfiles
+
+sys.path.insert(0, join(dirname(__file__), "..", "tests"))
+import synthetic_tttr  # noqa: E402
+
+if __name__ == "__main__":
+    tmpdir = pathlib.Path(tempfile.mkdtemp())
+    arg = sys.argv[1] if len(sys.argv) > 1 else "20"
+    if pathlib.Path(arg).exists():
+        path = pathlib.Path(arg)
+    else:
+        path = synthetic_tttr.write_pt3(tmpdir / "bench.pt3", duration=float(arg))
+    print("file size: {:.1f} MB".format(path.stat().st_size / 1024**2))
+    cache = readfiles.ParsedFileCache(tmpdir / "cache")
+    for name, kwargs in [
+        ("no cache", {}),
+        ("cache (miss)", {"cache": cache}),
+        ("cache (hit)", {"cache": cache}),
+    ]:
+        t0 = time.perf_counter()
+        readfiles.open_any(path, **kwargs)
+        print("{:>14s} {:9.3f} s".format(name, time.perf_counter() - t0))
+    print("cache size: {:.1f} MB".format(cache.size / 1024**2))
+    shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,76 @@
+"""Benchmark Levenberg-Marquardt fits with analytic jacobians
+
+Fits synthetic curves of a few confocal and TIRF models with the analytic
+jacobian of the model and with finite differences and reports the
+number of model evaluations and the times. Fits with constraints
+between varied parameters always use finite differences, so one
+parameter of each constraint is fixed here.
+
+Usage: python benchmarks/bench_fit_jacobian.py [number of fits]
+"""
+
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import pycorrfit as pcf
+from pycorrfit.fit import Fit
+
+#: model id and indices of the varied parameters
+MODELS = [(6011, [0, 1, 3]), (6012, [0, 1, 2]), (6035, [0, 1, 3]), (6013, [0, 3])]
+
+
+def fit(model, params, variable, tau, data):
+    corr = pcf.Correlation(
+        fit_model=model.id,
+        fit_algorithm="Lev-Mar",
+        correlation=np.column_stack((tau, data)),
+    )
+    fit_bool = np.zeros(params.size, dtype=bool)
+    fit_bool[variable] = True
+    corr.fit_parameters_variable = fit_bool
+    start = params.copy()
+    start[variable] *= 0.8
+    corr.fit_parameters = start
+    Fit(corr)
+
+
+if __name__ == "__main__":
+    nfits = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    warnings.simplefilter("ignore")
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), 200))
+    rng = np.random.default_rng(0)
+    ncalls = [0]
+    fit_function = Fit.fit_function
+
+    def counting_fit_function(self, *args, **kwargs):
+        ncalls[0] += 1
+        return fit_function(self, *args, **kwargs)
+
+    Fit.fit_function = counting_fit_function
+    print(
+        "{:>6s} {:>9s} {:>10s} {:>9s}".format(
+            "model", "jacobian", "residuals", "time [s]"
+        )
+    )
+    for modelid, variable in MODELS:
+        model = pcf.models.modeldict[modelid]
+        params = np.array(model.default_values, dtype=float)
+        data = model(params, tau)
+        data += (rng.random(tau.size) - 0.5) * 1e-3 * np.max(data)
+        jacobian = model._jacobian
+        for name in ["analytic", "numeric"]:
+            model._jacobian = jacobian if name == "analytic" else None
+            ncalls[0] = 0
+            t0 = time.perf_counter()
+            for _ in range(nfits):
+                fit(model, params, variable, tau, data)
+            dur = time.perf_counter() - t0
+            print(
+                "{:6d} {:>9s} {:10d} {:9.3f}".format(
+                    modelid, name, ncalls[0] // nfits, dur
+                )
+            )
+        model._jacobian = jacobian
@@ -0,0 +1,72 @@
+"""Benchmark fits without lmfit
+
+Fits synthetic curves with `scipy.optimize.least_squares`
+(`Fit.use_least_squares`) and with lmfit and reports the times.
+The last models have active constraints.
+
+Usage: python benchmarks/bench_fit_least_squares.py [number of fits]
+"""
+
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import pycorrfit as pcf
+from pycorrfit.fit import Fit
+
+#: model id and indices of the varied parameters
+MODELS = [
+    (6000, [0, 1, 2]),
+    (6001, [0, 1, 2]),
+    (6011, [0, 1, 3]),
+    (6012, [0, 1, 2]),
+    (6035, [0, 1, 2, 3]),
+    (6081, [0, 1, 2, 4, 5, 9, 10]),
+]
+
+
+def fit(model, params, variable, tau, data):
+    corr = pcf.Correlation(
+        fit_model=model.id,
+        fit_algorithm="Lev-Mar",
+        correlation=np.column_stack((tau, data)),
+    )
+    fit_bool = np.zeros(params.size, dtype=bool)
+    fit_bool[variable] = True
+    corr.fit_parameters_variable = fit_bool
+    start = params.copy()
+    start[variable] *= 0.8
+    corr.fit_parameters = start
+    Fit(corr)
+    return corr.fit_parameters
+
+
+if __name__ == "__main__":
+    nfits = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    warnings.simplefilter("ignore")
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), 200))
+    rng = np.random.default_rng(0)
+    print(
+        "{:>6s} {:>11s} {:>10s} {:>8s}".format(
+            "model", "lmfit [s]", "scipy [s]", "speedup"
+        )
+    )
+    for modelid, variable in MODELS:
+        model = pcf.models.modeldict[modelid]
+        params = np.array(model.default_values, dtype=float)
+        data = model(params, tau)
+        data += (rng.random(tau.size) - 0.5) * 1e-2 * np.max(data)
+        durs = []
+        for use_least_squares in [False, True]:
+            Fit.use_least_squares = use_least_squares
+            t0 = time.perf_counter()
+            for _ in range(nfits):
+                fit(model, params, variable, tau, data)
+            durs.append(time.perf_counter() - t0)
+        print(
+            "{:6d} {:11.3f} {:10.3f} {:8.1f}".format(
+                modelid, durs[0], durs[1], durs[0] / durs[1]
+            )
+        )
@@ -0,0 +1,54 @@
+"""Benchmark fitting independent correlations in a process pool
+
+Fits a batch of synthetic curves with `Fit(correlations, n_jobs=...)`
+for an increasing number of processes and reports the times.
+
+Usage: python benchmarks/bench_fit_parallel.py [number of curves]
+"""
+
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import pycorrfit as pcf
+from pycorrfit.fit import Fit
+
+#: models of the curves in the batch (repeated)
+MODELS = [6001, 6011, 6012, 6035]
+
+
+def get_correlations(ncurves, tau):
+    rng = np.random.default_rng(0)
+    corrs = []
+    for ii in range(ncurves):
+        modelid = MODELS[ii % len(MODELS)]
+        corr = pcf.Correlation(fit_model=modelid, fit_algorithm="Lev-Mar")
+        params = corr.fit_model.default_values
+        data = corr.fit_model(params, tau)
+        data += (rng.random(tau.size) - 0.5) * 1e-2 * np.max(data)
+        corr.correlation = np.column_stack((tau, data))
+        corr.fit_parameters = params * 0.8
+        corrs.append(corr)
+    return corrs
+
+
+if __name__ == "__main__":
+    ncurves = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    warnings.simplefilter("ignore")
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), 200))
+    ncpu = os.cpu_count() or 1
+    n_jobs_list = sorted({1, 2, max(1, ncpu // 2), ncpu})
+    print("{} curves, {} CPUs".format(ncurves, ncpu))
+    print("{:>6s} {:>9s} {:>8s}".format("n_jobs", "time [s]", "speedup"))
+    ref = None
+    for n_jobs in n_jobs_list:
+        corrs = get_correlations(ncurves, tau)
+        t0 = time.perf_counter()
+        Fit(corrs, n_jobs=n_jobs)
+        dur = time.perf_counter() - t0
+        if ref is None:
+            ref = dur
+        print("{:6d} {:9.3f} {:8.1f}".format(n_jobs, dur, ref / dur))
@@ -0,0 +1,60 @@
+"""Benchmark the `dividAndConquer` intersection backends
+
+The photon times are coarse-grained like in `tttr2xfcs`, so the
+arrays of the higher cascades become shorter and denser.
+
+Usage: python benchmarks/bench_intersection.py [duration in s]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from pycorrfit.readfiles.read_pt3_scripts import fib4
+from pycorrfit.readfiles.read_pt3_scripts.correlation_methods import mergeTimes
+
+
+def best_of(func, *args, repeat=3):
+    best = np.inf
+    for _ii in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rng = np.random.default_rng(42)
+    names = sorted(fib4.BACKENDS)
+    if "numba" in names:
+        # compile
+        fib4.BACKENDS["numba"](np.arange(3), np.arange(3))
+
+    print("default backend: {}".format(fib4.get_backend()))
+    print(
+        "{:>10s} {:>8s} {:>10s} ".format("rate [Hz]", "cascade", "photons")
+        + " ".join(["{:>14s}".format(n + " [ms]") for n in names])
+    )
+    for rate in [1e4, 1e5, 1e6]:
+        size = int(rate * duration)
+        y = np.cumsum(rng.exponential(1e9 / rate, size)).astype(np.int64)
+        num = np.ones((size, 1))
+        for jj in range(25):
+            y, num = mergeTimes(y, num)
+            if jj % 6 == 0:
+                times = []
+                ref = None
+                for name in names:
+                    tt, res = best_of(fib4.BACKENDS[name], y, y + 6)
+                    if ref is None:
+                        ref = res
+                    assert np.array_equal(ref[0], res[0])
+                    assert np.array_equal(ref[1], res[1])
+                    times.append(tt * 1000)
+                print(
+                    "{:10.0e} {:8d} {:10d} ".format(rate, jj, y.size)
+                    + " ".join(["{:14.3f}".format(t) for t in times])
+                )
+            y = (y + 1) >> 1
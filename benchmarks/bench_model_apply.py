@@ -0,0 +1,41 @@
+"""Benchmark the batched evaluation of the model functions
+
+Evaluates every built-in model for a stack of parameter vectors,
+once in a Python loop and once with a single `Model.apply` call.
+
+Usage: python benchmarks/bench_model_apply.py [number of curves]
+"""
+
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from pycorrfit import models as mdls
+
+if __name__ == "__main__":
+    ncurves = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tau = np.exp(np.linspace(np.log(1e-3), np.log(1e4), 200))
+    rng = np.random.default_rng(0)
+    print("{} curves, {} lag times".format(ncurves, tau.size))
+    print(
+        "{:>5s} {:>9s} {:>9s} {:>8s}".format(
+            "model", "loop [s]", "batch [s]", "speedup"
+        )
+    )
+    warnings.simplefilter("ignore")
+    for model in sorted(mdls.models, key=lambda mm: mm.id):
+        params = np.array(model.default_values, dtype=float)
+        stack = params * (1 + 0.1 * rng.random((ncurves, params.size)))
+        t0 = time.perf_counter()
+        for pp in stack:
+            model.apply(pp, tau)
+        t1 = time.perf_counter()
+        model.apply(stack, tau)
+        t2 = time.perf_counter()
+        print(
+            "{:5d} {:9.3f} {:9.3f} {:8.1f}".format(
+                model.id, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)
+            )
+        )
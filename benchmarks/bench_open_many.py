@@ -0,0 +1,43 @@
+"""Benchmark the parallel import of data files
+
+Writes synthetic Zeiss ConfoCor3 .fcs files and imports them with
+`open_many` for an increasing number of processes.
+
+Usage: python benchmarks/bench_open_many.py [number of files]
+"""
+
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+from os.path import dirname, join
+
+from pycorrfit import readfiles
+
+sys.path.insert(0, join(dirname(__file__), "..", "tests"))
+import synthetic_fcsfiles  # noqa: E402
+
+if __name__ == "__main__":
+    nfiles = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    tmpdir = pathlib.Path(tempfile.mkdtemp())
+    paths = [
+        synthetic_fcsfiles.write_confocor3(
+            tmpdir / "bench{}.fcs".format(ii), repetitions=2, tracelength=10**4
+        )
+        for ii in range(nfiles)
+    ]
+    ncpu = os.cpu_count() or 1
+    print("{} files, {} CPUs".format(nfiles, ncpu))
+    print("{:>9s} {:>9s} {:>8s}".format("n_workers", "time [s]", "speedup"))
+    workers = sorted({1, 2, 4, 8, 16, ncpu} & set(range(1, ncpu + 1)))
+    for n_workers in workers:
+        t0 = time.perf_counter()
+        for _path, _data, exc in readfiles.open_many(paths, n_workers=n_workers):
+            assert exc is None
+        dur = time.perf_counter() - t0
+        if n_workers == 1:
+            serial = dur
+        print("{:9d} {:9.2f} {:8.1f}".format(n_workers, dur, serial / dur))
+    shutil.rmtree(tmpdir, ignore_errors=True)
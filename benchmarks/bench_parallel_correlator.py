@@ -0,0 +1,38 @@
+"""Benchmark `tttr2xfcs` with different numbers of worker processes
+
+The speed-up is limited by the number of CPU cores and by the
+lags of the first cascades, which contain most of the photons.
+
+Usage: python benchmarks/bench_parallel_correlator.py [duration in s]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from pycorrfit.readfiles.read_pt3_scripts.correlation_methods import tttr2xfcs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+import synthetic_tttr  # noqa: E402
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    nsync, channel, dtime = synthetic_tttr.photon_stream(duration=duration, rate=1e6)
+    y = nsync * 100
+    num = np.zeros((y.size, 2))
+    num[:, 0] = channel == 1
+    num[:, 1] = channel == 2
+    print("{} photons, {} CPUs".format(y.size, os.cpu_count()))
+    ref = None
+    for n_workers in [1, 2, 4, 8, 16]:
+        if n_workers > 2 * (os.cpu_count() or 1):
+            break
+        t0 = time.perf_counter()
+        auto, _ = tttr2xfcs(y, num, 0, 25, 6, n_workers=n_workers)
+        tt = time.perf_counter() - t0
+        if ref is None:
+            ref = auto
+        assert np.array_equal(ref, auto)
+        print("{:>3d} workers: {:8.3f} s".format(n_workers, tt))
@@ -0,0 +1,57 @@
+"""Benchmark the decay histograms and time series of a pt3/ptu import
+
+Compares one `delayTime2bin` call per channel (decays and time
+series) with the single pass of `delayTime2binChannels`.
+
+Usage: python benchmarks/bench_preprocessing.py [number of photons]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from pycorrfit.readfiles.read_pt3_scripts.correlation_methods import (
+    delayTime2bin,
+    delayTime2binChannels,
+)
+
+
+def per_channel(subChanArr, trueTimeArr, dTimeArr, channels):
+    result = []
+    for ch in channels:
+        result.append(delayTime2bin(np.array(dTimeArr), np.array(subChanArr), ch, 10))
+        result.append(
+            delayTime2bin(np.array(trueTimeArr), np.array(subChanArr), ch, 25000000)
+        )
+    return result
+
+
+def single_pass(subChanArr, trueTimeArr, dTimeArr, channels):
+    decays = delayTime2binChannels(dTimeArr, subChanArr, channels, 10)
+    series = delayTime2binChannels(trueTimeArr, subChanArr, channels, 25000000)
+    return [res for pair in zip(decays, series, strict=True) for res in pair]
+
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7
+    rng = np.random.default_rng(42)
+    # 100 s measurement
+    trueTimeArr = np.sort(rng.integers(0, 10**11, size))
+    dTimeArr = rng.integers(0, 4096, size).astype(np.uint16)
+    print(
+        "{:>9s} {:>14s} {:>14s}".format(
+            "channels", "per channel [s]", "single pass [s]"
+        )
+    )
+    for nch in [1, 2, 4]:
+        subChanArr = rng.integers(1, nch + 1, size).astype(np.uint8)
+        channels = list(range(1, nch + 1))
+        times = []
+        results = []
+        for func in [per_channel, single_pass]:
+            t0 = time.perf_counter()
+            results.append(func(subChanArr, trueTimeArr, dTimeArr, channels))
+            times.append(time.perf_counter() - t0)
+        assert results[0] == results[1]
+        print("{:9d} {:14.3f} {:14.3f}".format(nch, *times))
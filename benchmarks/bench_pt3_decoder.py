@@ -0,0 +1,81 @@
+"""Benchmark the .pt3 record decoder against the former Python loop
+
+Usage: python benchmarks/bench_pt3_decoder.py [file.pt3]
+"""
+
+import pathlib
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pycorrfit.readfiles.read_pt3_scripts import import_methods
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "tests"))
+import synthetic_tttr  # noqa: E402
+
+
+def pt3records_loop(f, Records, ofltime, syncperiod, Resolution):
+    """The record decoder of PyCorrFit 1.3 (one struct.unpack per record)"""
+    WRAPAROUND = 65536
+    chanArr = [0] * Records
+    trueTimeArr = [0] * Records
+    dTimeArr = [0] * Records
+    for b in range(0, Records):
+        T3Record = struct.unpack("I", f.read(4))[0]
+        nsync = T3Record & 65535
+        chan = (T3Record >> 28) & 15
+        chanArr[b] = chan
+        dtime = 0
+        if chan in [1, 2, 3, 4]:
+            dtime = (T3Record >> 16) & 4095
+        elif chan == 15:
+            markers = (T3Record >> 16) & 15
+            if markers == 0:
+                ofltime = ofltime + WRAPAROUND
+        truensync = ofltime + nsync
+        truetime = (truensync * syncperiod) + (dtime * Resolution)
+        trueTimeArr[b] = truetime
+        dTimeArr[b] = dtime
+    return (np.array(chanArr), np.array(trueTimeArr), np.array(dTimeArr), ofltime)
+
+
+def pt3import_loop(path):
+    with open(path, "rb") as f:
+        Records, Resolution, syncperiod = import_methods.pt3header(f)
+        return pt3records_loop(f, Records, 0, syncperiod, Resolution)
+
+
+def timeit(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        paths = [pathlib.Path(sys.argv[1])]
+    else:
+        tmpdir = pathlib.Path(tempfile.mkdtemp(prefix="pycorrfit_bench_"))
+        paths = [
+            synthetic_tttr.write_pt3(
+                tmpdir / "{:g}s.pt3".format(dur), duration=dur, rate=200e3
+            )
+            for dur in [1, 5, 20]
+        ]
+
+    print(
+        "{:>12s} {:>10s} {:>10s} {:>8s}".format(
+            "records", "loop [s]", "numpy [s]", "speedup"
+        )
+    )
+    for path in paths:
+        tl, ref = timeit(pt3import_loop, path)
+        tv, res = timeit(import_methods.pt3import, path)
+        # arrival times are integer nanoseconds since PyCorrFit 1.4
+        ref = (ref[0], np.round(ref[1]).astype(np.int64), ref[2])
+        for a, b in zip(ref, res[:3], strict=True):
+            assert np.array_equal(a, b)
+        print("{:12d} {:10.3f} {:10.4f} {:8.0f}".format(ref[0].size, tl, tv, tl / tv))
@@ -0,0 +1,84 @@
+"""Benchmark saving and loading session files
+
+Saves a synthetic session with long traces in the text (version 1)
+and binary (version 2) session file format, loads it again and
+reports the times and file sizes.
+
+Usage: python benchmarks/bench_session.py [number of pages]
+"""
+
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pycorrfit import openfile
+from pycorrfit.trace import Trace
+
+
+def make_infodict(npages):
+    tau = np.exp(np.linspace(np.log(1e-3), np.log(1e3), 300))
+    time = np.linspace(0, 6e4, 10**4)
+    infodict = {
+        "Correlations": {},
+        "Parameters": {},
+        "Supplements": {},
+        "External Functions": {},
+        "Traces": {},
+        "Comments": {},
+        "Backgrounds": [],
+        "External Weights": {},
+        "Preferences": {},
+    }
+    infodict["Comments"]["Session"] = ""
+    for pageid in range(1, npages + 1):
+        corr = np.column_stack((tau, 1 / (1 + tau / pageid)))
+        rate = 10 + np.random.normal(size=time.size)
+        infodict["Correlations"][pageid] = [tau, corr]
+        infodict["Traces"][pageid] = [Trace(trace=np.column_stack((time, rate)))]
+        infodict["Parameters"][pageid] = [
+            "#{}:".format(pageid),
+            6000,
+            [4, 0.4, 0.1],
+            [True, True, False],
+            [0, tau.size],
+            [0, 3, 5, "Lev-Mar"],
+            [None, None],
+            False,
+            None,
+            [[0, np.inf], [0, np.inf], [0, np.inf]],
+        ]
+        infodict["Comments"][pageid] = "page {}".format(pageid)
+    return infodict
+
+
+if __name__ == "__main__":
+    npages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    tmpdir = pathlib.Path(tempfile.mkdtemp())
+    infodict = make_infodict(npages)
+    print("{} pages".format(npages))
+    print(
+        "{:>7s} {:>8s} {:>8s} {:>10s} {:>9s}".format(
+            "version", "save [s]", "load [s]", "+data [s]", "size [MB]"
+        )
+    )
+    for version in [1, 2]:
+        path = tmpdir / "session{}.pcfs".format(version)
+        t0 = time.perf_counter()
+        openfile.SaveSessionData(str(path), infodict, version=version)
+        t1 = time.perf_counter()
+        ldt = openfile.LoadSessionData(str(path))
+        t2 = time.perf_counter()
+        for key in ["Correlations", "Traces"]:
+            for pageid in ldt[key]:
+                ldt[key][pageid]
+        t3 = time.perf_counter()
+        print(
+            "{:7d} {:8.2f} {:8.3f} {:10.2f} {:9.1f}".format(
+                version, t1 - t0, t2 - t1, t3 - t1, path.stat().st_size / 1024**2
+            )
+        )
+    shutil.rmtree(tmpdir, ignore_errors=True)
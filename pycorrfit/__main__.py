@@ -1,4 +1,5 @@
 """Run PyCorrFit"""
 from .gui import main
 
-main.Main()
+if __name__ == "__main__":
+    main.Main()
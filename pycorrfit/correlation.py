@@ -196,22 +196,7 @@ class Correlation(object):
         """ Check parameters using self.fit_model.func_verification and the user defined
             boundaries self.fit_parameters_range for each parameter.
         """
-        p = 1. * np.array(parms)
-        r = self.fit_parameters_range
-        for i in range(len(p)):
-            if r[i][0] == r[i][1]:
-                pass
-            elif r[i][0] is None:
-                if p[i] > r[i][1]:
-                    p[i] = r[i][1]
-            elif r[i][1] is None:
-                if p[i] < r[i][0]:
-                    p[i] = r[i][1]
-            elif p[i] < r[i][0]:
-                p[i] = r[i][0]
-            elif p[i] > r[i][1]:
-                p[i] = r[i][1]
-        return p
+        return fit.check_parameter_range(parms, self.fit_parameters_range)
 
     @property
     def correlation(self):
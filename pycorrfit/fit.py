@@ -1,10 +1,17 @@
 """PyCorrFit data set: Classes for FCS data evaluation"""
+from concurrent.futures import ProcessPoolExecutor
 import copy
+import functools
+import os
+import pickle
 import warnings
 
 import lmfit
 import numpy as np
 import scipy.interpolate as spintp
+import scipy.optimize as spopt
+
+from . import models as mdls
 
 
 class StuckParameterWarning(UserWarning):
@@ -211,14 +218,102 @@ class Constraint(object):
 
         return kwargs
 
+    def get_transform_constraint(self):
+        """
+        Numeric counterpart of `get_lmfit_parameter_kwargs` for
+        `ConstraintTransform`. Returns None if the constraint does
+        not apply (not both parameters are varied).
+        """
+        p1, p2 = self.parameters
+        if not (p1["bool"] and p2["bool"]):
+            return None
+        return (p1["id"],
+                p2["id"],
+                p2["sign"],
+                "delta_{}_{}".format(p1["id"], p2["id"]),
+                -1 if self.operator == "<" else 1,
+                self.offset,
+                self.fit_bounds[p1["id"]][0],
+                self.fit_bounds[p1["id"]][1])
+
+
+class ConstraintTransform(object):
+    """ Numeric transform from the varied lmfit parameters to the
+    model parameters.
+
+    This replaces the string expressions of
+    `Constraint.get_lmfit_parameter_kwargs`, which lmfit evaluates
+    with its expression interpreter for every function call.
+    """
+
+    def __init__(self, names, size, constraints):
+        """
+        Parameters
+        ----------
+        names : list of str
+            Names of the varied lmfit parameters, model parameters
+            ("parm0001") and constraint parameters ("delta_2_1")
+        size : int
+            Number of model parameters
+        constraints : list of tuples
+            Model parameters defined by constraints in the order in
+            which they are computed, each a tuple
+            `(p1, p2, sign, delta, opsign, offset, min, max)` with
+            `p1 = clip(sign*p2 + opsign*delta + offset, min, max)`,
+            where `p1` and `p2` are model parameter indices and
+            `delta` is the name of the constraint parameter.
+        """
+        self.names = list(names)
+        self.size = size
+        self.parmpos = np.array([ii for ii, name in enumerate(self.names)
+                                 if name.startswith("parm")], dtype=int)
+        self.parmid = np.array([int(self.names[ii][4:])
+                                for ii in self.parmpos], dtype=int)
+        self.constraints = [(p1, p2, sign, self.names.index(delta),
+                             opsign, offset, pmin, pmax)
+                            for (p1, p2, sign, delta, opsign, offset,
+                                 pmin, pmax) in constraints]
+
+    def __call__(self, x, parms):
+        """
+        Update the model parameters `parms` in-place with the values
+        `x` of the varied lmfit parameters and return them.
+        """
+        parms[self.parmid] = x[self.parmpos]
+        for p1, p2, sign, di, opsign, ofs, pmin, pmax in self.constraints:
+            parms[p1] = min(max(sign*parms[p2] + opsign*x[di] + ofs, pmin),
+                            pmax)
+        return parms
+
+    def jacobian(self, x, parms):
+        """
+        Derivatives of the model parameters `parms = self(x, parms)`
+        with respect to `x`, shape (number of model parameters, len(x))
+
+        The derivatives of a clipped parameter vanish. Fits with
+        constraints therefore use finite differences, which can
+        leave the bounds of the constraint (see `Fit.minimize`).
+        """
+        dpdx = np.zeros((self.size, len(self.names)))
+        dpdx[self.parmid, self.parmpos] = 1
+        for p1, p2, sign, di, opsign, ofs, pmin, pmax in self.constraints:
+            # clipped parameters do not depend on `x`
+            if pmin <= sign*parms[p2] + opsign*x[di] + ofs <= pmax:
+                dpdx[p1] = sign*dpdx[p2]
+                dpdx[p1, di] += opsign
+        return dpdx
+
 
 class Fit(object):
     """ Used for fitting FCS data to models.
     """
+    #: Perform "Lev-Mar" fits without coupled constraints directly
+    #: with `scipy.optimize.least_squares` (see `Fit.least_squares`)
+    use_least_squares = True
 
     def __init__(self, correlations=[], global_fit=False,
                  global_fit_variables=[],
-                 uselatex=False, verbose=0):
+                 uselatex=False, verbose=0, n_jobs=1):
         """ Using an FCS model, fit the data of shape (N,2).
 
 
@@ -241,6 +336,13 @@ class Fit(object):
             Increase verbosity by incrementing this number.
         uselatex: bool
             If verbose > 0, plotting will be performed with LaTeX.
+        n_jobs: int or None
+            Number of processes for fitting the correlations
+            independently (not used for global fits); `None` uses
+            all CPUs. Only the data required for fitting are sent to
+            the worker processes (see `Fit.get_fit_job`). Correlations
+            with models that cannot be pickled (e.g. user-defined
+            models) are fitted in the current process.
         """
         if len(global_fit_variables) != 0:
             raise NotImplementedError("`global_fit_variables` not available!")
@@ -256,28 +358,27 @@ class Fit(object):
 
         if not global_fit:
             # Fit each correlation separately
-            for corr in self.correlations:
-                # Set fitting options
-                self.fit_algorithm = corr.fit_algorithm
-                # Get the data required for fitting
-                self.x = corr.correlation_fit[:, 0]
-                self.y = corr.correlation_fit[:, 1]
-                # fit_bool: True for variable
-                self.fit_bool = corr.fit_parameters_variable.copy()
-                self.fit_parm = corr.fit_parameters.copy()
-                self.fit_bound = copy.copy(corr.fit_parameters_range)
-                self.is_weighted_fit = corr.is_weighted_fit
-                self.fit_weights = Fit.compute_weights(corr,
-                                                       verbose=verbose,
-                                                       uselatex=uselatex)
-                self.fit_parm_names = corr.fit_model.parameters[0]
-                self.func = corr.fit_model.function
-                self.check_parms = corr.check_parms
-                self.constraints = corr.fit_model.constraints
-                # Directly perform the fit and set the "fit" attribute
-                self.minimize()
-                # Run a second time:
-                self.minimize()
+            jobs = [Fit.get_fit_job(corr, verbose=verbose, uselatex=uselatex)
+                    for corr in self.correlations]
+            if n_jobs is None:
+                n_jobs = os.cpu_count() or 1
+            n_jobs = max(1, min(int(n_jobs), len(jobs)))
+            if n_jobs > 1:
+                results = Fit.minimize_jobs(jobs, n_jobs=n_jobs)
+            else:
+                results = [None] * len(jobs)
+            for corr, job, res in zip(self.correlations, jobs, results):
+                self.set_fit_job(job)
+                if res is None:
+                    # Directly perform the fit and set the "fit" attribute
+                    self.minimize()
+                    # Run a second time:
+                    self.minimize()
+                else:
+                    # fitted in a worker process
+                    self.fit_parm, self.parmoptim_error, caught = res
+                    for message, category in caught:
+                        warnings.warn(message, category)
                 # update correlation model parameters
                 corr.fit_parameters = self.fit_parm
                 # save fit data in correlation class
@@ -379,6 +480,8 @@ class Fit(object):
                 return np.concatenate(out)
 
             self.func = global_func
+            # finite differences are used for global fits
+            self.jac = None
 
             # Create function for checking
             def global_check_parms(parameters,
@@ -406,6 +509,102 @@ class Fit(object):
                 # save fit data in correlation class
                 corr.fit_results = self.get_fit_results(corr)
 
+    @staticmethod
+    def get_fit_job(correlation, verbose=0, uselatex=False):
+        """ Return the data required for fitting a single correlation
+
+        The returned dictionary contains the lag times "x", the
+        correlation "y", the "weights", the "model" (the model id
+        for built-in models, the model instance otherwise), and
+        the fit settings. It can be sent to a worker process
+        (see `Fit.minimize_jobs`) and is applied with `Fit.set_fit_job`.
+        """
+        corr = correlation
+        model = corr.fit_model
+        if (mdls.modeldict.get(model.id) is model and
+                model.function.__module__.startswith("pycorrfit.models.")):
+            # built-in models are looked up in the worker processes
+            model = model.id
+        job = {
+            "x": corr.correlation_fit[:, 0],
+            "y": corr.correlation_fit[:, 1],
+            "weights": Fit.compute_weights(corr,
+                                           verbose=verbose,
+                                           uselatex=uselatex),
+            "model": model,
+            "fit_algorithm": corr.fit_algorithm,
+            # fit_bool: True for variable
+            "fit_bool": corr.fit_parameters_variable.copy(),
+            "fit_parm": corr.fit_parameters.copy(),
+            "fit_bound": corr.fit_parameters_range,
+            "is_weighted_fit": corr.is_weighted_fit,
+        }
+        return job
+
+    def set_fit_job(self, job):
+        """ Set up fitting of a single correlation from `Fit.get_fit_job`
+        """
+        model = job["model"]
+        if not isinstance(model, mdls.Model):
+            model = mdls.modeldict[model]
+        # Set fitting options
+        self.fit_algorithm = job["fit_algorithm"]
+        # Get the data required for fitting
+        self.x = job["x"]
+        self.y = job["y"]
+        self.fit_bool = job["fit_bool"].copy()
+        self.fit_parm = job["fit_parm"].copy()
+        self.fit_bound = copy.copy(job["fit_bound"])
+        self.is_weighted_fit = job["is_weighted_fit"]
+        self.fit_weights = job["weights"]
+        self.fit_parm_names = model.parameters[0]
+        self.func = model.function
+        if model.jacobian is not None:
+            self.jac = model.apply_jacobian
+        else:
+            self.jac = None
+        self.check_parms = functools.partial(check_parameter_range,
+                                             ranges=job["fit_bound"])
+        self.constraints = model.constraints
+
+    @staticmethod
+    def minimize_jobs(jobs, n_jobs=None):
+        """ Fit several jobs from `Fit.get_fit_job` in a process pool
+
+        Returns a list with the results of `fit_job` in the order of
+        `jobs`. For jobs whose model cannot be pickled, the result is
+        None and the fit has to be performed in the current process.
+        """
+        results = [None] * len(jobs)
+        shipped = []
+        for ii, job in enumerate(jobs):
+            if isinstance(job["model"], mdls.Model):
+                try:
+                    pickle.dumps(job["model"])
+                except Exception:
+                    # e.g. user-defined models
+                    continue
+            shipped.append(ii)
+        if not shipped:
+            return results
+
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = max(1, min(int(n_jobs), len(shipped)))
+        # Larger chunks reduce the communication overhead for many
+        # short fits, but should still be distributed evenly.
+        chunksize = max(1, len(shipped) // (4 * n_jobs))
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+        try:
+            shipres = executor.map(fit_job,
+                                   [jobs[ii] for ii in shipped],
+                                   chunksize=chunksize)
+            for ii, res in zip(shipped, shipres):
+                results[ii] = res
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
     def get_fit_results(self, correlation):
         """
         Return a dictionary with all information about the performed fit.
@@ -688,7 +887,7 @@ class Fit(object):
         objective function that returns the residual (difference between
         model and data) to be minimized in a least squares sense.
         """
-        parms = Fit.lmfitparm2array(params)
+        parms = self.lmfitparm2model(params)
         tominimize = (self.func(parms, x) - y)
         # Check dataweights for zeros and don't use these
         # values for the least squares method.
@@ -699,6 +898,26 @@ class Fit(object):
         # tominimize = tominimize[~np.isinf(tominimize)]
         return tominimize
 
+    def fit_jacobian(self, params, x, y, weights=1):
+        """
+        Jacobian of `fit_function` with respect to the varied lmfit
+        parameters, shape (number of varied parameters, N).
+
+        The partial derivatives of the model (`self.jac`) are mapped
+        to the lmfit parameters with the chain rule, taking into
+        account the parameters that are defined by constraints
+        (see `ConstraintTransform`).
+        """
+        xfree = np.array([params[name].value
+                          for name in self.transform.names])
+        parms = self.lmfitparm2model(params)
+        jac = self.jac(parms, x)
+        tominimize = np.dot(self.transform.jacobian(xfree, parms).T, jac)
+        with np.errstate(divide='ignore'):
+            tominimize = np.where(weights != 0,
+                                  tominimize/weights, 0)
+        return tominimize
+
     def fit_function_scalar(self, parms, x, y, weights=1):
         """
         Wrapper of `fit_function`.
@@ -718,8 +937,14 @@ class Fit(object):
 
         self.fit_bool : 1d ndarray length P, bool
         self.fit_parm : 1d ndarray length P, float
+
+        The model parameters that are defined by constraints are
+        not varied by lmfit, but computed from the constraint
+        parameters with `self.transform` (see `Fit.lmfitparm2model`).
         """
         params = lmfit.Parameters()
+        # model parameters defined by constraints
+        constrained = {}
 
         # First, add all fixed parameters
         for pp in range(len(self.fit_parm)):
@@ -765,7 +990,19 @@ class Fit(object):
                         if con.parameters[0]["id"] == pp:
                             kws = con.get_lmfit_parameter_kwargs()
                             if kws is not None:
-                                kwarglist += kws
+                                kwdelt, kwp1 = kws
+                                # The expression of `kwp1` is
+                                # evaluated in `self.transform`.
+                                constrained[pp] = \
+                                    con.get_transform_constraint()
+                                kwarglist += [
+                                    kwdelt,
+                                    {"name": kwp1["name"],
+                                     "value": self.fit_parm[pp],
+                                     "vary": False,
+                                     "min": self.fit_bound[pp][0],
+                                     "max": self.fit_bound[pp][1],
+                                     }]
                 if len(kwarglist) == 0:
                     # normal parameter
                     kwarglist += [{"name": "parm{:04d}".format(pp),
@@ -777,8 +1014,137 @@ class Fit(object):
                 for kw in kwarglist:
                     params.add(lmfit.Parameter(**kw))
 
+        self.transform = ConstraintTransform(
+            names=[name for name, par in params.items() if par.vary],
+            size=len(self.fit_parm),
+            constraints=[constrained[pp] for pp in sorted(constrained)])
         return params
 
+    def lmfitparm2model(self, params):
+        """
+        Model parameters from the lmfit parameters `params`
+        (including the parameters defined by constraints)
+
+        Arrays are returned unchanged.
+        """
+        parms = Fit.lmfitparm2array(params)
+        if isinstance(params, lmfit.parameter.Parameters):
+            xfree = np.array([params[name].value
+                              for name in self.transform.names])
+            parms = self.transform(xfree, parms.astype(float))
+        return parms
+
+    @staticmethod
+    def is_box_constrained(params):
+        """
+        Returns True if the varied parameters in `params` are
+        only restricted by their boundaries (see `Fit.least_squares`)
+        """
+        for par in params.values():
+            if par.expr or (par.vary and not par.min < par.max):
+                return False
+        return True
+
+    def least_squares(self, params, **kwargs):
+        """
+        Fit with `scipy.optimize.least_squares` instead of lmfit
+
+        This bypasses the parameter bookkeeping of lmfit, which is
+        the major part of the computation time for simple models.
+        The varied parameters in `params` must only be restricted by
+        their boundaries (see `Fit.is_box_constrained`) and must not
+        be coupled by constraints (`self.transform.constraints`). The
+        Levenberg-Marquardt algorithm is used if it converges within
+        the boundaries, otherwise the trust region reflective
+        algorithm with the boundaries.
+
+        Parameters
+        ----------
+        params : lmfit.Parameters
+            Initial parameters, updated in-place with the result
+        kwargs : dict
+            Keyword arguments for `scipy.optimize.least_squares`,
+            e.g. "ftol" and "xtol"
+
+        Returns
+        -------
+        result : scipy.optimize.OptimizeResult
+            The result of `scipy.optimize.least_squares` with the
+            attributes of an lmfit result used in `Fit.minimize`:
+            "params", "ier", "errorbars", and "covar" (the covariance
+            matrix scaled with the reduced Chi², None if it cannot
+            be computed).
+        """
+        transform = self.transform
+        names = transform.names
+        lower = np.array([params[name].min for name in names], dtype=float)
+        upper = np.array([params[name].max for name in names], dtype=float)
+        x0 = np.clip([params[name].value for name in names], lower, upper)
+        # full parameter array that is updated with the varied parameters
+        parms = self.lmfitparm2model(params)
+        with np.errstate(divide='ignore'):
+            invweights = np.broadcast_to(
+                np.where(self.fit_weights != 0, 1/self.fit_weights, 0),
+                self.y.shape)
+        unweighted = invweights == 0
+
+        def residuals(x):
+            transform(x, parms)
+            res = self.func(parms, self.x) - self.y
+            res *= invweights
+            res[unweighted] = 0
+            return res
+
+        if self.jac is not None:
+            def jacobian(x):
+                transform(x, parms)
+                jac = np.dot(self.jac(parms, self.x).T,
+                             transform.jacobian(x, parms))
+                jac *= invweights[:, None]
+                jac[unweighted] = 0
+                return jac
+        else:
+            jacobian = "2-point"
+
+        # The gradient is not a termination condition in lmfit
+        # (scipy.optimize.leastsq), because it is small for the
+        # residuals of correlation curves.
+        kwargs.setdefault("gtol", np.finfo(float).eps)
+
+        kwargs["x_scale"] = "jac"
+        kwargs["max_nfev"] = 2000*(len(names)+1)
+
+        result = None
+        if np.all((lower < x0) & (x0 < upper)) and self.y.size >= len(names):
+            # The Levenberg-Marquardt algorithm (MINPACK) is much faster
+            # than the trust region reflective algorithm. Its result is
+            # used if it lies within the boundaries.
+            result = spopt.least_squares(fun=residuals, x0=x0, jac=jacobian,
+                                         method="lm", **kwargs)
+            if (not np.isfinite(result.cost)
+                    or np.any(result.x < lower) or np.any(result.x > upper)):
+                result = None
+        if result is None:
+            result = spopt.least_squares(fun=residuals, x0=x0, jac=jacobian,
+                                         bounds=(lower, upper), method="trf",
+                                         **kwargs)
+        # attributes of an lmfit result
+        result.params = params
+        for name, value in zip(names, result.x):
+            params[name].value = value
+        result.ier = result.status
+        # covariance matrix as computed by lmfit (scipy.optimize.leastsq)
+        try:
+            covar = np.linalg.inv(np.dot(result.jac.T, result.jac))
+        except np.linalg.LinAlgError:
+            result.covar = None
+            result.errorbars = False
+        else:
+            redchi = 2 * result.cost / max(1, self.y.size - len(names))
+            result.covar = covar * redchi
+            result.errorbars = bool(np.all(np.diag(result.covar) > 0))
+        return result
+
     @staticmethod
     def lmfitparm2array(parms, parmid="parm", attribute="value"):
         """
@@ -829,24 +1195,52 @@ class Fit(object):
 
         # Get algorithm
         method = Algorithms[self.fit_algorithm][0]
-        methodkwargs = Algorithms[self.fit_algorithm][2]
+        methodkwargs = dict(Algorithms[self.fit_algorithm][2])
+        # Parameters that are only restricted by their boundaries
+        # are fitted without lmfit. Constraints between varied
+        # parameters are left to lmfit with finite differences
+        # (see `ConstraintTransform.jacobian`).
+        use_least_squares = (method == "leastsq"
+                             and self.use_least_squares
+                             and not self.transform.constraints
+                             and Fit.is_box_constrained(params))
+        lmfitkwargs = dict(methodkwargs)
+        if (method == "leastsq" and self.jac is not None
+                and not self.transform.constraints):
+            # Analytic partial derivatives of the model. Parameters
+            # defined by constraints are pinned where a constraint
+            # is active (clipping or `delta` at its bound) and their
+            # exact derivative vanishes there, which lets the fit get
+            # stuck. Finite differences are used in that case.
+            lmfitkwargs["Dfun"] = self.fit_jacobian
+            lmfitkwargs["col_deriv"] = 1
 
         # Begin fitting
         # Fit a several times and stop earlier if the residuals
         # are small enough (heuristic approach).
         nfits = 5
         diff = np.inf
-        parmsinit = Fit.lmfitparm2array(params)
+        parmsinit = self.lmfitparm2model(params)
         for ii in range(nfits):
             res0 = self.fit_function(params, self.x, self.y)
-            result = lmfit.minimize(fcn=self.fit_function,
-                                    params=params,
-                                    method=method,
-                                    kws={"x": self.x,
-                                         "y": self.y,
-                                         "weights": self.fit_weights},
-                                    **methodkwargs
-                                    )
+            result = None
+            if use_least_squares:
+                try:
+                    result = self.least_squares(params, **methodkwargs)
+                except ValueError:
+                    # The trust region reflective algorithm cannot
+                    # handle values that are not finite (e.g. for
+                    # extreme parameters), MINPACK (lmfit) can.
+                    use_least_squares = False
+            if result is None:
+                result = lmfit.minimize(fcn=self.fit_function,
+                                        params=params,
+                                        method=method,
+                                        kws={"x": self.x,
+                                             "y": self.y,
+                                             "weights": self.fit_weights},
+                                        **lmfitkwargs
+                                        )
             params = result.params
             res1 = self.fit_function(params, self.x, self.y)
             diff = np.average(np.abs(res0-res1))
@@ -856,7 +1250,7 @@ class Fit(object):
                 multby = .5
                 # Try to vary stuck fitting parameters
                 # the result from the previous fit
-                parmsres = Fit.lmfitparm2array(params)
+                parmsres = self.lmfitparm2model(params)
                 # the parameters that are varied during fitting
                 parmsbool = Fit.lmfitparm2array(params, attribute="vary")
                 # The parameters that are stuck
@@ -876,7 +1270,7 @@ class Fit(object):
                 break
 
         # Now write the optimal parameters to our values:
-        self.fit_parm = Fit.lmfitparm2array(params)
+        self.fit_parm = self.lmfitparm2model(params)
         # Only allow physically correct parameters
         self.fit_parm = self.check_parms(self.fit_parm)
         # Compute error estimates for fit (Only "Lev-Mar")
@@ -903,6 +1297,45 @@ class Fit(object):
             self.parmoptim_error = None
 
 
+def check_parameter_range(parms, ranges):
+    """ Return a copy of *parms* clipped to the fitting boundaries
+        *ranges* (list of [min, max] for each parameter).
+    """
+    p = 1. * np.array(parms)
+    r = ranges
+    for i in range(len(p)):
+        if r[i][0] == r[i][1]:
+            pass
+        elif r[i][0] is None:
+            if p[i] > r[i][1]:
+                p[i] = r[i][1]
+        elif r[i][1] is None:
+            if p[i] < r[i][0]:
+                p[i] = r[i][1]
+        elif p[i] < r[i][0]:
+            p[i] = r[i][0]
+        elif p[i] > r[i][1]:
+            p[i] = r[i][1]
+    return p
+
+
+def fit_job(job):
+    """ Fit a single job from `Fit.get_fit_job` (used in worker processes)
+
+    Returns the fit parameters, the error estimates of the fit
+    parameters, and the warnings issued during fitting as a list
+    of (message, category) tuples.
+    """
+    fit = Fit()
+    fit.set_fit_job(job)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        fit.minimize()
+        fit.minimize()
+    caught = [(str(ww.message), ww.category) for ww in caught]
+    return fit.fit_parm, fit.parmoptim_error, caught
+
+
 def GetAlgorithmStringList():
     """
         Get supported fitting algorithms as strings.
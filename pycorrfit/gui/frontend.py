@@ -30,6 +30,7 @@ from . import edclasses
 from . import misc
 from . import page
 from . import plotting
+from .threaded_progress import ThreadedProgressDlg
 from . import tools
 from . import update
 from . import usermodel
@@ -108,6 +109,9 @@ class MyFrame(wx.Frame):
         self.dirname = os.curdir
         self.filename = None
 
+        # On-disk cache of imported data files (see `GetFileCache`)
+        self.filecache = readfiles.ParsedFileCache()
+
         # Session Comment - may be edited and saved later
         self.SessionComment = "This is a session comment. It will be saved" +\
                               " as the session is saved."
@@ -266,6 +270,24 @@ class MyFrame(wx.Frame):
         cid = self.menuBar.FindMenu("Current &Page")
         self.menuBar.EnableTop(cid, enabled)
 
+    def GetFileCache(self):
+        """ The on-disk cache of imported data files or None if it is
+            disabled in the preferences.
+        """
+        if self.MenuFileCache.IsChecked():
+            return self.filecache
+        else:
+            return None
+
+    def GetTraceDecimation(self):
+        """ The method for downsampling the traces of imported data
+            files (see `readfiles.util.downsample_trace`).
+        """
+        for method, item in self.MenuTraceDecimation.items():
+            if item.IsChecked():
+                return method
+        return "mean"
+
     def MakeMenu(self):
         self.filemenu = wx.Menu()
         # toolmenu and curmenu are public, because they need to be enabled/
@@ -310,6 +332,26 @@ class MyFrame(wx.Frame):
         self.MenuAutocloseTools = prefmenu.Append(wx.ID_ANY, "Autoclose tools",
                                                   "Automatically close tools after usage.",
                                                   kind=wx.ITEM_CHECK)
+        prefmenu.AppendSeparator()
+        self.MenuFileCache = prefmenu.Append(wx.ID_ANY, "Cache imported files",
+                                             "Store parsed data files on disk to speed up importing them again.",
+                                             kind=wx.ITEM_CHECK)
+        self.MenuFileCache.Check()
+        menuClearCache = prefmenu.Append(wx.ID_ANY, "Clear file cache",
+                                         "Remove all cached data files from disk.")
+        prefmenu.AppendSeparator()
+        decimmenu = wx.Menu()
+        self.MenuTraceDecimation = dict()
+        for method, name, helpstr in [
+                ("mean", "Average", "Average neighboring trace values (preserves the count rate)."),
+                ("minmax", "Minimum and maximum", "Keep the extrema of the trace (preserves spikes)."),
+                ("lttb", "Largest triangle", "Keep the visual shape of the trace (LTTB)."),
+        ]:
+            self.MenuTraceDecimation[method] = decimmenu.Append(
+                wx.ID_ANY, name, helpstr, kind=wx.ITEM_RADIO)
+        self.MenuTraceDecimation["mean"].Check()
+        prefmenu.AppendSubMenu(decimmenu, "Trace downsampling",
+                               "Method for downsampling the traces of imported files.")
         # toolmenu
         toolkeys = list(tools.ToolDict.keys())
         toolkeys.sort()
@@ -417,6 +459,7 @@ class MyFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self.OnDeletePage, menuClPa)
         # Preferences
         self.Bind(wx.EVT_MENU, self.OnLatexCheck, self.MenuUseLatex)
+        self.Bind(wx.EVT_MENU, self.OnClearFileCache, menuClearCache)
         # Help
         self.Bind(wx.EVT_MENU, self.OnSoftware, menuSoftw)
         self.Bind(wx.EVT_MENU, self.OnContribute, menuContribute)
@@ -562,6 +605,17 @@ class MyFrame(wx.Frame):
 
         self.dirname = dirname
 
+    def OnClearFileCache(self, e=None):
+        """ Remove all entries of the on-disk cache of imported data files
+        """
+        size = self.filecache.size
+        self.filecache.clear()
+        text = "Removed {:.1f} MB of cached data files from\n{}".format(
+            size/1024**2, self.filecache.directory)
+        dlg = wx.MessageDialog(self, text, "Clear file cache",
+                               style=wx.ICON_INFORMATION | wx.OK)
+        dlg.ShowModal()
+
     def OnClearSession(self, e=None, clearmodels=False):
         """
             Clear the entire session
@@ -767,7 +821,11 @@ class MyFrame(wx.Frame):
             # self.filename = dlg.GetFilename()
             # self.dirname = dlg.GetDirectory()
             try:
-                Stuff = readfiles.open_any(self.dirname, self.filename)
+                _path, Stuff, excpt = next(readfiles.open_many(
+                    [path], n_workers=1, cache=self.GetFileCache(),
+                    trace_decimation=self.GetTraceDecimation()))
+                if excpt is not None:
+                    raise excpt
             except:
                 # The file format is not supported.
                 info = sys.exc_info()
@@ -782,7 +840,7 @@ class MyFrame(wx.Frame):
                 return
             else:
                 dataexp = Stuff["Correlation"]
-                trace = Stuff["Trace"]
+                trace = readfiles.get_traces(Stuff)
                 curvelist = Stuff["Type"]
                 filename = Stuff["Filename"]
                 if "Weight" in Stuff:
@@ -1070,28 +1128,36 @@ class MyFrame(wx.Frame):
             wx.PD_CAN_ABORT
         dlgi = wx.ProgressDialog("Import", "Loading data...",
                                  maximum=N, parent=self, style=style)
-        for j in np.arange(N):
-            afile = Datafiles[j]
+        # Import the files in parallel
+        paths = [os.path.join(self.dirname, afile) for afile in Datafiles]
+        results = dict()
+        dlgi.Update(0, "Loading data...")
+        for j, (path, Stuff, excpt) in enumerate(
+                readfiles.open_many(
+                    paths, cache=self.GetFileCache(),
+                    trace_decimation=self.GetTraceDecimation())):
+            results[str(path)] = (Stuff, excpt)
             # Let the user abort, if he wants to:
-            if dlgi.Update(j, "Loading data: "+afile)[0] == False:
+            if dlgi.Update(j+1, "Loaded data: "+path.name)[0] == False:
                 dlgi.Destroy()
                 return
-            # Stuff = readfiles.openAny(self.dirname, afile)
-            try:
-                Stuff = readfiles.open_any(self.dirname, afile)
-            except Exception as excpt:
+        # Keep the (sorted) order of the files
+        for afile, path in zip(Datafiles, paths):
+            Stuff, excpt = results[str(pathlib.Path(path))]
+            if excpt is not None:
                 # The file does not seem to be what it seems to be.
                 BadFiles.append(afile)
                 Exceptions.append(excpt)
                 # Print exception
-                trb = traceback.format_exc(excpt)
+                trb = "".join(traceback.format_exception(excpt))
                 trb = "..." + trb.replace("\n", "\n...")
                 warnings.warn("Problem processing a file." +
                               " Reason:\n{}".format(trb))
             else:
+                traces = readfiles.get_traces(Stuff)
                 for i in np.arange(len(Stuff["Type"])):
                     Correlation.append(Stuff["Correlation"][i])
-                    Trace.append(Stuff["Trace"][i])
+                    Trace.append(traces[i])
                     Type.append(Stuff["Type"][i])
                     Filename.append(Stuff["Filename"][i])
                     if "Weight" in Stuff:
@@ -1120,7 +1186,7 @@ class MyFrame(wx.Frame):
             # The file does not seem to be what it seems to be.
             errstr = "The following files could not be processed:\n"
             for item, excpt in zip(BadFiles, Exceptions):
-                trb = traceback.format_exc(excpt)
+                trb = "".join(traceback.format_exception(excpt))
                 trb = "   " + trb.replace("\n", "\n   ")
                 errstr += " " + item + "\n" + trb
             dlg = wx.MessageDialog(self, errstr, "Error",
@@ -1663,7 +1729,14 @@ class MyFrame(wx.Frame):
             # Save everything
             path = dlg.GetPath()            # Workaround since 0.7.5
             (self.dirname, self.filename) = os.path.split(path)
-            opf.SaveSessionData(path, Infodict)
+            # Save in a background thread to keep the GUI responsive
+            saver = ThreadedProgressDlg(self, opf.SaveSessionData,
+                                        args=[(path, Infodict)],
+                                        title="Saving session",
+                                        messages=["Writing session file..."])
+            if saver.aborted:
+                # The session file was not written
+                self.filename = None
         else:
             self.dirname = dlg.GetDirectory()
             self.filename = None
@@ -1,5 +1,6 @@
 """Main execution script"""
 from looseversion import LooseVersion
+import multiprocessing
 import sys
 import warnings
 
@@ -70,6 +71,9 @@ def CheckVersion(given, required, name):
 
 # Start gui
 def Main():
+    # Process workers of `readfiles.open_many` (spawn start method on
+    # Windows and macOS) must not start another GUI in frozen builds.
+    multiprocessing.freeze_support()
 
     # VERSION
     version = doc.__version__
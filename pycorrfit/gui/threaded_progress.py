@@ -188,7 +188,10 @@ class ThreadedProgressDlg(object):
                 break
 
             if worker.traceback:
-                dlg.Destroy()
+                if dlg:
+                    dlg.Destroy()
+                else:
+                    wx.EndBusyCursor()
                 self.aborted = True
                 self.index_aborted = jj
                 raise Exception(worker.traceback)
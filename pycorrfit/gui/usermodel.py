@@ -73,7 +73,8 @@ class CorrFunc(object):
         def G(parms, tau):
             tau = np.atleast_1d(tau)
             for i in np.arange(len(parms)):
-                self.vardict[self.variables[i]] = float(parms[i])
+                self.vardict[self.variables[i]] = np.asarray(parms[i],
+                                                             dtype=float)
             self.vardict["tau"] = tau
             # Function called with array/list
             # The problem here might be
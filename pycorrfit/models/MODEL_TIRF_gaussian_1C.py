@@ -1,6 +1,9 @@
 import numpy as np
 import scipy.special as sps
 
+from .cp_tirf import tir_gauss_jac
+from .cp_triplet import trip, trip_jac
+
 
 def wixi(x):
     """ Complex Error Function (Faddeeva/Voigt).
@@ -127,10 +130,7 @@ def CF_Gxyz_TIR_gauss_trip(parms, tau):
                   (2*D*tau*kappa**2 - 1)/(2*kappa) * w_ix)
 
     # triplet
-    if tautrip == 0 or T == 0:
-        triplet = 1
-    else:
-        triplet = 1 + T/(1-T) * np.exp(-tau/tautrip)
+    triplet = trip(tau=tau, tautrip=tautrip, T=T)
 
     # Neff is not the actual particle number. This formula just looks nicer
     # this way.
@@ -140,6 +140,49 @@ def CF_Gxyz_TIR_gauss_trip(parms, tau):
     return 1 / (Neff) * g2D * gz * triplet
 
 
+def jacobian_6013(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_TIR_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    D = parms[0]
+    r0 = parms[1]
+    deva = parms[2]
+    Conc = parms[3]
+
+    Neff = Conc * np.pi * r0**2 * deva
+    g, dg_D, dg_r0, dg_deva = tir_gauss_jac(tau=tau, D=D, r0=r0, deva=deva)
+    G = g / Neff
+
+    return [dg_D / Neff,
+            dg_r0 / Neff - 2*G/r0,
+            dg_deva / Neff - G/deva,
+            -G/Conc]
+
+
+def jacobian_6014(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_TIR_gauss_trip` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    D = parms[0]
+    r0 = parms[1]
+    deva = parms[2]
+    Conc = parms[3]
+    tautrip = parms[4]
+    T = parms[5]
+
+    Neff = Conc * np.pi * r0**2 * deva
+    g, dg_D, dg_r0, dg_deva = tir_gauss_jac(tau=tau, D=D, r0=r0, deva=deva)
+    G = g / Neff
+    tr, dtr_tautrip, dtr_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+
+    return [dg_D / Neff * tr,
+            (dg_r0 / Neff - 2*G/r0) * tr,
+            (dg_deva / Neff - G/deva) * tr,
+            -G/Conc * tr,
+            G*dtr_tautrip,
+            G*dtr_T]
+
+
 def MoreInfo_6013(parms, countrate=None):
     u"""Supplementary variables:
         Beware that the effective volume is chosen arbitrarily.
@@ -244,6 +287,7 @@ model1["Parameters"] = parms_6013
 model1["Definitions"] = m_3dtirsq6013
 model1["Supplements"] = MoreInfo_6013
 model1["Boundaries"] = get_boundaries_6013(values_6013)
+model1["Jacobian"] = jacobian_6013
 
 
 # 3D Model TIR gaussian + triplet
@@ -283,6 +327,7 @@ model2["Parameters"] = parms_6014
 model2["Definitions"] = m_3dtirsq6014
 model2["Supplements"] = MoreInfo_6014
 model2["Boundaries"] = get_boundaries_6014(values_6014)
+model2["Jacobian"] = jacobian_6014
 
 
 Modelarray = [model1, model2]
@@ -1,6 +1,10 @@
 import numpy as np
 import scipy.special as sps
 
+from .cp_mix import double_pnum_jac
+from .cp_tirf import lateral_gauss_jac, tir_gauss_jac
+from .cp_triplet import trip, trip_jac
+
 
 def wixi(x):
     """ Complex Error Function (Faddeeva/Voigt).
@@ -90,10 +94,7 @@ def CF_Gxyz_3d2dT_gauss(parms, tau):
     particle3D = alpha**2*F * g2D3D * gz
 
     # triplet
-    if tautrip == 0 or T == 0:
-        triplet = 1
-    else:
-        triplet = 1 + T/(1-T) * np.exp(-tau/tautrip)
+    triplet = trip(tau=tau, tautrip=tautrip, T=T)
 
     # Norm
     norm = (1-F + alpha*F)**2
@@ -103,6 +104,40 @@ def CF_Gxyz_3d2dT_gauss(parms, tau):
     return G + off
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_3d2dT_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    D2D = parms[1]
+    D3D = parms[2]
+    F = parms[3]
+    r0 = parms[4]
+    deva = parms[5]
+    alpha = parms[6]
+    tautrip = parms[7]
+    T = parms[8]
+
+    g1, dg1_D, dg1_r0 = lateral_gauss_jac(tau=tau, D=D2D, r0=r0)
+    g2, dg2_D, dg2_r0, dg2_deva = tir_gauss_jac(tau=tau, D=D3D, r0=r0,
+                                                deva=deva)
+    # species 1 is the surface bound species (F₁ = 1-F)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=1-F, alpha=alpha, g1=g1, g2=g2)
+    tr, dtr_tautrip, dtr_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+
+    return [dg_n*tr,
+            dg_g1*dg1_D*tr,
+            dg_g2*dg2_D*tr,
+            -dg_F1*tr,
+            (dg_g1*dg1_r0 + dg_g2*dg2_r0)*tr,
+            dg_g2*dg2_deva*tr,
+            dg_alpha*tr,
+            g*dtr_tautrip,
+            g*dtr_T,
+            np.ones_like(g)]
+
+
 def get_boundaries(parms):
     # strictly positive
     boundaries = [[0, np.inf]]*len(parms)
@@ -224,5 +259,6 @@ model1["Definitions"] = m_gauss_3d_2d_t
 model1["Boundaries"] = get_boundaries(values)
 model1["Supplements"] = MoreInfo
 model1["Constraints"] = [[2, ">", 1]]
+model1["Jacobian"] = jacobian
 
 Modelarray = [model1]
@@ -1,6 +1,10 @@
 import numpy as np
 import scipy.special as sps
 
+from .cp_mix import double_pnum_jac
+from .cp_tirf import tir_gauss_jac
+from .cp_triplet import trip, trip_jac
+
 
 def wixi(x):
     """ Complex Error Function (Faddeeva/Voigt).
@@ -106,10 +110,7 @@ def CF_Gxyz_3D3DT_gauss(parms, tau):
     particle2 = alpha**2*(1-F) * g2D2 * gz2
 
     # triplet
-    if tautrip == 0 or T == 0:
-        triplet = 1
-    else:
-        triplet = 1 + T/(1-T) * np.exp(-tau/tautrip)
+    triplet = trip(tau=tau, tautrip=tautrip, T=T)
 
     # Norm
     norm = (F + alpha*(1-F))**2
@@ -119,6 +120,40 @@ def CF_Gxyz_3D3DT_gauss(parms, tau):
     return G + off
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_3D3DT_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    D1 = parms[1]
+    D2 = parms[2]
+    F = parms[3]
+    r0 = parms[4]
+    deva = parms[5]
+    alpha = parms[6]
+    tautrip = parms[7]
+    T = parms[8]
+
+    g1, dg1_D, dg1_r0, dg1_deva = tir_gauss_jac(tau=tau, D=D1, r0=r0,
+                                                deva=deva)
+    g2, dg2_D, dg2_r0, dg2_deva = tir_gauss_jac(tau=tau, D=D2, r0=r0,
+                                                deva=deva)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=F, alpha=alpha, g1=g1, g2=g2)
+    tr, dtr_tautrip, dtr_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+
+    return [dg_n*tr,
+            dg_g1*dg1_D*tr,
+            dg_g2*dg2_D*tr,
+            dg_F1*tr,
+            (dg_g1*dg1_r0 + dg_g2*dg2_r0)*tr,
+            (dg_g1*dg1_deva + dg_g2*dg2_deva)*tr,
+            dg_alpha*tr,
+            g*dtr_tautrip,
+            g*dtr_T,
+            np.ones_like(g)]
+
+
 def get_boundaries(parms):
     # strictly positive
     boundaries = [[0, np.inf]]*len(parms)
@@ -241,5 +276,6 @@ model1["Definitions"] = m_gauss_3d_3d_t
 model1["Boundaries"] = get_boundaries(values)
 model1["Supplements"] = MoreInfo
 model1["Constraints"] = [[2, ">", 1]]
+model1["Jacobian"] = jacobian
 
 Modelarray = [model1]
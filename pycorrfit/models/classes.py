@@ -18,6 +18,11 @@ class Model(object):
         else:
             self._supplements = lambda x, y: []
 
+        if "Jacobian" in list(datadict.keys()):
+            self._jacobian = datadict["Jacobian"]
+        else:
+            self._jacobian = None
+
         if "Boundaries" in list(datadict.keys()):
             self._boundaries = datadict["Boundaries"]
         else:
@@ -60,8 +65,51 @@ class Model(object):
         """
         Apply the model with `parameters` and lag
         times `tau`
+
+        `parameters` may also be a 2D array of shape (K, P) that
+        contains K parameter sets. The model is then evaluated for
+        all parameter sets in one vectorized call and the result
+        has the shape (K, N), where N is the number of lag times.
         """
-        return self.function(parameters, tau)
+        if np.ndim(parameters) != 2:
+            return self.function(parameters, tau)
+        parameters = np.asarray(parameters, dtype=float)
+        shape = parameters.shape[:1] + np.shape(tau)
+        # parameters[:, i] as a column of shape (K, 1), so that
+        # the model functions broadcast them against tau (N,)
+        columns = parameters.T[:, :, np.newaxis]
+        G = np.asarray(self.function(columns, np.atleast_1d(tau)))
+        full = parameters.shape[:1] + (np.size(tau),)
+        if G.shape != full:
+            # e.g. parameters that do not depend on tau
+            G = np.broadcast_to(G, full).copy()
+        return G.reshape(shape)
+
+    def apply_jacobian(self, parameters, tau):
+        """
+        Partial derivatives of the model with respect to its
+        parameters at the lag times `tau`
+
+        Returns an array of shape (P, N) with one row per parameter
+        or, for a stack of parameter vectors of shape (K, P), an
+        array of shape (K, P, N). Raises a ValueError if the model
+        does not define its jacobian (see `Model.jacobian`).
+        """
+        if self._jacobian is None:
+            raise ValueError("{} does not define a jacobian!".format(self))
+        if np.ndim(parameters) != 2:
+            jac = self._jacobian(parameters, tau)
+            out = np.empty((len(jac),) + np.shape(tau))
+            for ii, dd in enumerate(jac):
+                out[ii] = dd
+            return out
+        parameters = np.asarray(parameters, dtype=float)
+        shape = parameters.shape + np.shape(tau)
+        columns = parameters.T[:, :, np.newaxis]
+        jac = self._jacobian(columns, np.atleast_1d(tau))
+        full = parameters.shape[:1] + (np.size(tau),)
+        jac = np.array([np.broadcast_to(dd, full) for dd in jac])
+        return jac.transpose(1, 0, 2).reshape(shape)
 
     @property
     def boundaries(self):
@@ -145,6 +193,12 @@ class Model(object):
     def id(self):
         return self._definitions[0]
 
+    @property
+    def jacobian(self):
+        """Method that computes the partial derivatives of the model
+        function with respect to the parameters or None"""
+        return self._jacobian
+
     @property
     def name(self):
         return self.description_short
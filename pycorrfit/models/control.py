@@ -54,7 +54,7 @@ def append_model(modelarray):
 def model_setup(modelid, name, comp, mtype, fctn, par_labels, par_values,
                 par_vary=None, par_boundaries=None, par_constraints=None,
                 par_hr_labels=None, par_hr_factors=None,
-                supplementary_method=None,
+                supplementary_method=None, jacobian=None,
                 ):
     u"""
     This helper method does everything that is required to make a model
@@ -109,6 +109,11 @@ def model_setup(modelid, name, comp, mtype, fctn, par_labels, par_values,
         A method that takes the parameters `par_values` and the countrate
         of the experiment as an argument and returns a dictinoary of
         supplementary information.
+    jacobian : callable
+        A method with the same arguments as `fctn` that returns the
+        partial derivatives of the model function with respect to
+        each parameter (a list of length `len(par_values)`). If not
+        given, the derivatives are approximated during fitting.
     """
     # Checks
     assert len(par_labels) == len(par_values)
@@ -151,6 +156,9 @@ def model_setup(modelid, name, comp, mtype, fctn, par_labels, par_values,
     if par_constraints is not None:
         model["Constraints"] = par_constraints
 
+    if jacobian is not None:
+        model["Jacobian"] = jacobian
+
     append_model(model)
 
 
@@ -6,5 +6,24 @@ def threed(tau, taudiff, SP):
     return 1/((1 + tau/taudiff) * np.sqrt(1+tau/(taudiff*SP**2)))
 
 
+def threed_jac(tau, taudiff, SP):
+    """Value of `threed` and its partial derivatives with respect to
+    `taudiff` and `SP`"""
+    aa = 1 + tau/taudiff
+    bb = 1 + tau/(taudiff*SP**2)
+    G = 1/(aa * np.sqrt(bb))
+    dtaudiff = G * tau/taudiff**2 * (1/aa + 1/(2*SP**2*bb))
+    dSP = G * tau/(taudiff*SP**3*bb)
+    return G, dtaudiff, dSP
+
+
 def twod(tau, taudiff):
     return 1/((1 + tau/taudiff))
+
+
+def twod_jac(tau, taudiff):
+    """Value of `twod` and its partial derivative with respect to
+    `taudiff`"""
+    G = 1/(1 + tau/taudiff)
+    dtaudiff = G**2 * tau/taudiff**2
+    return G, dtaudiff
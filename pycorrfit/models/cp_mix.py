@@ -1,4 +1,5 @@
 """Mixed components for fitting models"""
+import numpy as np
 
 
 def double_pnum(n,
@@ -72,9 +73,8 @@ def triple_pnum(n,
         The keyword arguments for `comp1`, `comp2`, and `comp3`.
     """
     alpha11 = 1
-    F3 = 1 - F1 - F2
-    if F3 < 0:
-        F3 = 0
+    # F3 is zero if F1 + F2 > 1 (element-wise for arrays)
+    F3 = np.maximum(1 - F1 - F2, 0)
 
     norm = (F1*alpha11 + F2*alpha21 + F3*alpha31)**2
 
@@ -85,3 +85,58 @@ def triple_pnum(n,
     G = 1/n * (g1 + g2 + g3) / norm
 
     return G
+
+
+def double_pnum_jac(n, F1, alpha, g1, g2):
+    u"""
+    Value of `double_pnum` and its partial derivatives with respect
+    to `n`, `F1`, `alpha`, and the two components.
+
+    Parameters
+    ----------
+    n, F1, alpha : float
+        See `double_pnum`
+    g1, g2 : float or ndarray
+        The values of the model functions of the components
+    """
+    SS = F1 + alpha*(1-F1)
+    nn = n * SS**2
+    num = F1*g1 + alpha**2*(1-F1)*g2
+    G = num / nn
+    dn = -G / n
+    dF1 = (g1 - alpha**2*g2 - 2*num*(1-alpha)/SS) / nn
+    dalpha = (2*alpha*(1-F1)*g2 - 2*num*(1-F1)/SS) / nn
+    dg1 = F1 / nn
+    dg2 = alpha**2*(1-F1) / nn
+    return G, dn, dF1, dalpha, dg1, dg2
+
+
+def triple_pnum_jac(n, F1, F2, alpha21, alpha31, g1, g2, g3):
+    u"""
+    Value of `triple_pnum` and its partial derivatives with respect
+    to `n`, `F1`, `F2`, `alpha21`, `alpha31`, and the three components.
+
+    Parameters
+    ----------
+    n, F1, F2, alpha21, alpha31 : float
+        See `triple_pnum`
+    g1, g2, g3 : float or ndarray
+        The values of the model functions of the components
+    """
+    F3 = np.maximum(1 - F1 - F2, 0)
+    # derivative of F3 with respect to F1 and F2
+    dF3 = np.where(1 - F1 - F2 < 0, 0, -1)
+    SS = F1 + F2*alpha21 + F3*alpha31
+    nn = n * SS**2
+    num = F1*g1 + alpha21**2*F2*g2 + alpha31**2*F3*g3
+    G = num / nn
+    dn = -G / n
+    dF1 = (g1 + alpha31**2*g3*dF3 - 2*num*(1 + alpha31*dF3)/SS) / nn
+    dF2 = (alpha21**2*g2 + alpha31**2*g3*dF3
+           - 2*num*(alpha21 + alpha31*dF3)/SS) / nn
+    dalpha21 = (2*alpha21*F2*g2 - 2*num*F2/SS) / nn
+    dalpha31 = (2*alpha31*F3*g3 - 2*num*F3/SS) / nn
+    dg1 = F1 / nn
+    dg2 = alpha21**2*F2 / nn
+    dg3 = alpha31**2*F3 / nn
+    return G, dn, dF1, dF2, dalpha21, dalpha31, dg1, dg2, dg3
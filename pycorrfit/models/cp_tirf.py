@@ -0,0 +1,41 @@
+"""TIRF fitting model components"""
+import numpy as np
+import scipy.special as sps
+
+from .cp_confocal import twod_jac
+
+
+def lateral_gauss_jac(tau, D, r0):
+    """Value of the lateral Gaussian component 1/(1+4*D*τ/r₀²) and
+    its partial derivatives with respect to `D` and `r0`"""
+    taudiff = r0**2/(4*D)
+    G, dtaudiff = twod_jac(tau=tau, taudiff=taudiff)
+    dD = -dtaudiff*taudiff/D
+    dr0 = 2*dtaudiff*taudiff/r0
+    return G, dD, dr0
+
+
+def axial_tir_jac(tau, D, deva):
+    """Value of the axial component of an evanescent excitation
+
+    gz = x/sqrt(π) + (1 - 2*x²)/2 * w(i*x), x = sqrt(D*τ)/d_eva
+
+    and its partial derivatives with respect to `D` and `deva`
+    (w(i*x) = exp(x²)*erfc(x))
+    """
+    x = np.sqrt(D*tau)/deva
+    w_ix = sps.erfcx(x)
+    G = x/np.sqrt(np.pi) + (1 - 2*x**2)/2*w_ix
+    dx = 2*x**2/np.sqrt(np.pi) - x*(1 + 2*x**2)*w_ix
+    dD = dx*x/(2*D)
+    ddeva = -dx*x/deva
+    return G, dD, ddeva
+
+
+def tir_gauss_jac(tau, D, r0, deva):
+    """Value of the (not normalized) TIR-FCS component of a freely
+    diffusing species with a Gaussian lateral detection profile and
+    its partial derivatives with respect to `D`, `r0`, and `deva`"""
+    g2D, dg2D_D, dg2D_r0 = lateral_gauss_jac(tau=tau, D=D, r0=r0)
+    gz, dgz_D, dgz_deva = axial_tir_jac(tau=tau, D=D, deva=deva)
+    return g2D*gz, dg2D_D*gz + g2D*dgz_D, dg2D_r0*gz, g2D*dgz_deva
@@ -3,9 +3,30 @@ import numpy as np
 
 
 def trip(tau, tautrip, T):
-    if tautrip == 0 or T == 0:
-        AA = 1
-    else:
+    # No triplet contribution if `tautrip` or `T` is zero. This is
+    # evaluated element-wise, such that arrays of parameters can be
+    # used (see `pycorrfit.models.classes.Model.apply`).
+    tautrip = np.asarray(tautrip, dtype=float)
+    T = np.asarray(T, dtype=float)
+    off = np.logical_or(tautrip == 0, T == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
         AA = 1 + T/(1-T) * np.exp(-tau / tautrip)
+    return np.where(off, 1, AA)[()]
 
-    return AA
+
+def trip_jac(tau, tautrip, T):
+    """Value of `trip` and its partial derivatives with respect to
+    `tautrip` and `T`"""
+    tautrip = np.asarray(tautrip, dtype=float)
+    T = np.asarray(T, dtype=float)
+    # `trip` is constant for `tautrip == 0`
+    off = tautrip == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        EE = np.exp(-tau / tautrip)
+        AA = 1 + T/(1-T) * EE
+        dtautrip = T/(1-T) * EE * tau/tautrip**2
+        dT = EE/(1-T)**2
+    AA = np.where(np.logical_or(off, T == 0), 1, AA)[()]
+    dtautrip = np.where(off, 0, dtautrip)[()]
+    dT = np.where(off, 0, dT)[()]
+    return AA, dtautrip, dT
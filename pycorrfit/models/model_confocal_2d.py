@@ -1,7 +1,7 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod
+from .cp_confocal import twod, twod_jac
 
 # 2D simple gauss
 
@@ -33,6 +33,20 @@ def CF_Gxy_gauss(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxy_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taudiff = parms[1]
+
+    BB, dBB_taudiff = twod_jac(tau=tau, taudiff=taudiff)
+
+    return [-BB/n**2,
+            dBB_taudiff/n,
+            np.ones_like(BB)]
+
+
 def supplements(parms, countrate=None):
     # We can only give you the effective particle number
     n = parms[0]
@@ -62,5 +76,6 @@ model_setup(
     par_values=parms,
     par_vary=[True, True, False],
     par_boundaries=boundaries,
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod
-from .cp_mix import double_pnum
+from .cp_confocal import twod, twod_jac
+from .cp_mix import double_pnum, double_pnum_jac
 
 
 # 2D + 2D Gauß
@@ -54,6 +54,29 @@ def CF_Gxyz_gauss_2D2D(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss_2D2D` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud1 = parms[1]
+    taud2 = parms[2]
+    F = parms[3]
+    alpha = parms[4]
+
+    g1, dg1_taudiff = twod_jac(tau=tau, taudiff=taud1)
+    g2, dg2_taudiff = twod_jac(tau=tau, taudiff=taud2)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=F, alpha=alpha, g1=g1, g2=g2)
+
+    return [dg_n,
+            dg_g1*dg1_taudiff,
+            dg_g2*dg2_taudiff,
+            dg_F1,
+            dg_alpha,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         [6] n₁ = n*F₁     Particle number of species 1
@@ -109,5 +132,6 @@ model_setup(
     par_vary=[True, True, True, True, False, False],
     par_boundaries=boundaries,
     par_constraints=[[2, ">", 1]],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,7 +1,7 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import threed
+from .cp_confocal import threed, threed_jac
 
 # 3D simple gauss
 
@@ -43,6 +43,22 @@ def CF_Gxyz_gauss(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taudiff = parms[1]
+    SP = parms[2]
+
+    BB, dBB_taudiff, dBB_SP = threed_jac(tau=tau, taudiff=taudiff, SP=SP)
+
+    return [-BB/n**2,
+            dBB_taudiff/n,
+            dBB_SP/n,
+            np.ones_like(BB)]
+
+
 def supplements(parms, countrate=None):
     # We can only give you the effective particle number
     n = parms[0]
@@ -72,5 +88,6 @@ model_setup(
     par_values=parms,
     par_vary=[True, True, False, False],
     par_boundaries=boundaries,
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
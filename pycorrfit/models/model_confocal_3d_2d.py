@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod, threed
-from .cp_mix import double_pnum
+from .cp_confocal import twod, threed, twod_jac, threed_jac
+from .cp_mix import double_pnum, double_pnum_jac
 
 
 # 3D + 2D + T
@@ -54,6 +54,32 @@ def CF_Gxyz_3d2d_gauss(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_3d2d_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud2D = parms[1]
+    taud3D = parms[2]
+    F = parms[3]
+    SP = parms[4]
+    alpha = parms[5]
+
+    g1, dg1_taudiff = twod_jac(tau=tau, taudiff=taud2D)
+    g2, dg2_taudiff, dg2_SP = threed_jac(tau=tau, taudiff=taud3D,
+                                         SP=SP)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=1-F, alpha=alpha, g1=g1, g2=g2)
+
+    return [dg_n,
+            dg_g1*dg1_taudiff,
+            dg_g2*dg2_taudiff,
+            -dg_F1,
+            dg_g2*dg2_SP,
+            dg_alpha,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         Effective number of freely diffusing particles in 3D solution:
@@ -113,5 +139,6 @@ model_setup(
     par_vary=[True, True, True, True, False, False, False],
     par_boundaries=boundaries,
     par_constraints=[[2, "<", 1]],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import threed
-from .cp_mix import double_pnum
+from .cp_confocal import threed, threed_jac
+from .cp_mix import double_pnum, double_pnum_jac
 
 
 def CF_Gxyz_gauss_3D3D(parms, tau):
@@ -54,6 +54,33 @@ def CF_Gxyz_gauss_3D3D(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss_3D3D` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud1 = parms[1]
+    taud2 = parms[2]
+    F = parms[3]
+    SP = parms[4]
+    alpha = parms[5]
+
+    g1, dg1_taudiff, dg1_SP = threed_jac(tau=tau, taudiff=taud1,
+                                         SP=SP)
+    g2, dg2_taudiff, dg2_SP = threed_jac(tau=tau, taudiff=taud2,
+                                         SP=SP)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=F, alpha=alpha, g1=g1, g2=g2)
+
+    return [dg_n,
+            dg_g1*dg1_taudiff,
+            dg_g2*dg2_taudiff,
+            dg_F1,
+            (dg_g1*dg1_SP + dg_g2*dg2_SP),
+            dg_alpha,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         [7]  n₁ = n*F₁     Particle number of species 1
@@ -111,5 +138,6 @@ model_setup(
     par_vary=[True, True, True, True, False, False, False],
     par_boundaries=boundaries,
     par_constraints=[[2, ">", 1]],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
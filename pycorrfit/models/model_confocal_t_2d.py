@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod
-from .cp_triplet import trip
+from .cp_confocal import twod, twod_jac
+from .cp_triplet import trip, trip_jac
 
 
 # 2D simple gauss
@@ -45,6 +45,25 @@ def CF_Gxy_T_gauss(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxy_T_gauss` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taudiff = parms[1]
+    tautrip = parms[2]
+    T = parms[3]
+
+    tr, dtr_tautrip, dtr_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+    BB, dBB_taudiff = twod_jac(tau=tau, taudiff=taudiff)
+
+    return [-BB*tr/n**2,
+            dBB_taudiff*tr/n,
+            BB*dtr_tautrip/n,
+            BB*dtr_T/n,
+            np.ones_like(BB)]
+
+
 def supplements(parms, countrate=None):
     # We can only give you the effective particle number
     n = parms[0]
@@ -88,5 +107,6 @@ model_setup(
         u"T",
         u"offset"],
     par_hr_factors=[1., 1., 1000., 1., 1.],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,9 +1,9 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod
-from .cp_triplet import trip
-from .cp_mix import double_pnum
+from .cp_confocal import twod, twod_jac
+from .cp_triplet import trip, trip_jac
+from .cp_mix import double_pnum, double_pnum_jac
 
 
 # 2D + 2D + Triplet Gauß
@@ -63,6 +63,34 @@ def CF_Gxyz_gauss_2D2DT(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss_2D2DT` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud1 = parms[1]
+    taud2 = parms[2]
+    F = parms[3]
+    alpha = parms[4]
+    tautrip = parms[5]
+    T = parms[6]
+
+    g1, dg1_taudiff = twod_jac(tau=tau, taudiff=taud1)
+    g2, dg2_taudiff = twod_jac(tau=tau, taudiff=taud2)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=F, alpha=alpha, g1=g1, g2=g2)
+    tr, dtr_tautrip, dtr_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+
+    return [dg_n*tr,
+            dg_g1*dg1_taudiff*tr,
+            dg_g2*dg2_taudiff*tr,
+            dg_F1*tr,
+            dg_alpha*tr,
+            g*dtr_tautrip,
+            g*dtr_T,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         [8] n₁ = n*F₁     Particle number of species 1
@@ -144,5 +172,6 @@ model_setup(
         1.,     # "T",
         1.      # "offset"
     ],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import threed
-from .cp_triplet import trip
+from .cp_confocal import threed, threed_jac
+from .cp_triplet import trip, trip_jac
 
 
 def CF_Gxyz_blink(parms, tau):
@@ -45,6 +45,27 @@ def CF_Gxyz_blink(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_blink` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    T = parms[1]
+    tautrip = parms[2]
+    taudiff = parms[3]
+    SP = parms[4]
+
+    AA, dAA_tautrip, dAA_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+    BB, dBB_taudiff, dBB_SP = threed_jac(tau=tau, taudiff=taudiff, SP=SP)
+
+    return [-AA*BB/n**2,
+            dAA_T*BB/n,
+            dAA_tautrip*BB/n,
+            AA*dBB_taudiff/n,
+            AA*dBB_SP/n,
+            np.ones_like(BB)]
+
+
 def supplements(parms, countrate=None):
     # We can only give you the effective particle number
     n = parms[0]
@@ -90,5 +111,6 @@ model_setup(
         u"SP",
         u"offset"],
     par_hr_factors=[1., 1., 1000., 1., 1., 1.],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,9 +1,9 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod, threed
-from .cp_triplet import trip
-from .cp_mix import triple_pnum
+from .cp_confocal import twod, threed, twod_jac, threed_jac
+from .cp_triplet import trip, trip_jac
+from .cp_mix import triple_pnum, triple_pnum_jac
 
 
 def CF_Gxyz_gauss_3D3D2DT(parms, tau):
@@ -80,6 +80,47 @@ def CF_Gxyz_gauss_3D3D2DT(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss_3D3D2DT` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud1 = parms[1]
+    taud2 = parms[2]
+    taud3 = parms[3]
+    F1 = parms[4]
+    F2 = parms[5]
+    SP = parms[6]
+    alpha21 = parms[7]
+    alpha31 = parms[8]
+    tautrip = parms[9]
+    T = parms[10]
+
+    g1, dg1_taudiff, dg1_SP = threed_jac(tau=tau, taudiff=taud1,
+                                         SP=SP)
+    g2, dg2_taudiff, dg2_SP = threed_jac(tau=tau, taudiff=taud2,
+                                         SP=SP)
+    g3, dg3_taudiff = twod_jac(tau=tau, taudiff=taud3)
+    (g, dg_n, dg_F1, dg_F2, dg_alpha21, dg_alpha31,
+     dg_g1, dg_g2, dg_g3) = triple_pnum_jac(
+        n=n, F1=F1, F2=F2, alpha21=alpha21, alpha31=alpha31,
+        g1=g1, g2=g2, g3=g3)
+    tr, dtr_tautrip, dtr_T = trip_jac(tau=tau, tautrip=tautrip, T=T)
+
+    return [dg_n*tr,
+            dg_g1*dg1_taudiff*tr,
+            dg_g2*dg2_taudiff*tr,
+            dg_g3*dg3_taudiff*tr,
+            dg_F1*tr,
+            dg_F2*tr,
+            (dg_g1*dg1_SP + dg_g2*dg2_SP)*tr,
+            dg_alpha21*tr,
+            dg_alpha31*tr,
+            g*dtr_tautrip,
+            g*dtr_T,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         [12]  n₁ = n*F₁     Particle number of species 1 (3D)
@@ -182,5 +223,6 @@ model_setup(
         1.,     # T
         1.      # offset
     ],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod
-from .cp_triplet import trip
+from .cp_confocal import twod, twod_jac
+from .cp_triplet import trip, trip_jac
 
 
 # 2D + TT Gauß
@@ -49,6 +49,30 @@ def CF_Gxy_gauss_2DTT(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxy_gauss_2DTT` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud = parms[1]
+    tautrip1 = parms[2]
+    T1 = parms[3]
+    tautrip2 = parms[4]
+    T2 = parms[5]
+
+    g, dg_taud = twod_jac(tau=tau, taudiff=taud)
+    tr1, dtr1_tautrip, dtr1_T = trip_jac(tau=tau, tautrip=tautrip1, T=T1)
+    tr2, dtr2_tautrip, dtr2_T = trip_jac(tau=tau, tautrip=tautrip2, T=T2)
+
+    return [-g*tr1*tr2/n**2,
+            dg_taud*tr1*tr2/n,
+            g*dtr1_tautrip*tr2/n,
+            g*dtr1_T*tr2/n,
+            g*tr1*dtr2_tautrip/n,
+            g*tr1*dtr2_T/n,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     # We can only give you the effective particle number
     n = parms[0]
@@ -117,5 +141,6 @@ model_setup(
         1.,     # T2
         1.      # offset
     ],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
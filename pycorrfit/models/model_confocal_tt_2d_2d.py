@@ -1,9 +1,9 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod
-from .cp_triplet import trip
-from .cp_mix import double_pnum
+from .cp_confocal import twod, twod_jac
+from .cp_triplet import trip, trip_jac
+from .cp_mix import double_pnum, double_pnum_jac
 
 
 # 2D + 2D + TT Gauß
@@ -70,6 +70,40 @@ def CF_Gxy_gauss_2D2DTT(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxy_gauss_2D2DTT` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud1 = parms[1]
+    taud2 = parms[2]
+    F = parms[3]
+    alpha = parms[4]
+    tautrip1 = parms[5]
+    T1 = parms[6]
+    tautrip2 = parms[7]
+    T2 = parms[8]
+
+    g1, dg1_taudiff = twod_jac(tau=tau, taudiff=taud1)
+    g2, dg2_taudiff = twod_jac(tau=tau, taudiff=taud2)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=F, alpha=alpha, g1=g1, g2=g2)
+    tr1, dtr1_tautrip, dtr1_T = trip_jac(tau=tau, tautrip=tautrip1, T=T1)
+    tr2, dtr2_tautrip, dtr2_T = trip_jac(tau=tau, tautrip=tautrip2, T=T2)
+    tr = tr1 * tr2
+
+    return [dg_n*tr,
+            dg_g1*dg1_taudiff*tr,
+            dg_g2*dg2_taudiff*tr,
+            dg_F1*tr,
+            dg_alpha*tr,
+            g*dtr1_tautrip*tr2,
+            g*dtr1_T*tr2,
+            g*tr1*dtr2_tautrip,
+            g*tr1*dtr2_T,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         [10]  n₁ = n*F₁     Particle number of species 1
@@ -161,5 +195,6 @@ model_setup(
         1.,     # T2
         1.      # offset
     ],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
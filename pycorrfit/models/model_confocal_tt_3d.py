@@ -1,8 +1,8 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import threed
-from .cp_triplet import trip
+from .cp_confocal import threed, threed_jac
+from .cp_triplet import trip, trip_jac
 
 
 # 3D + Triplet Gauß
@@ -53,6 +53,32 @@ def CF_Gxyz_gauss_3DTT(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss_3DTT` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taudiff = parms[1]
+    SP = parms[2]
+    tautrip1 = parms[3]
+    T1 = parms[4]
+    tautrip2 = parms[5]
+    T2 = parms[6]
+
+    g, dg_taudiff, dg_SP = threed_jac(tau=tau, taudiff=taudiff, SP=SP)
+    tr1, dtr1_tautrip, dtr1_T = trip_jac(tau=tau, tautrip=tautrip1, T=T1)
+    tr2, dtr2_tautrip, dtr2_T = trip_jac(tau=tau, tautrip=tautrip2, T=T2)
+
+    return [-g*tr1*tr2/n**2,
+            dg_taudiff*tr1*tr2/n,
+            dg_SP*tr1*tr2/n,
+            g*dtr1_tautrip*tr2/n,
+            g*dtr1_T*tr2/n,
+            g*tr1*dtr2_tautrip/n,
+            g*tr1*dtr2_T/n,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     # We can only give you the effective particle number
     n = parms[0]
@@ -125,5 +151,6 @@ model_setup(
         1.,     # T2
         1.      # offset
     ],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
@@ -1,9 +1,9 @@
 import numpy as np
 
 from .control import model_setup
-from .cp_confocal import twod, threed
-from .cp_triplet import trip
-from .cp_mix import double_pnum
+from .cp_confocal import twod, threed, twod_jac, threed_jac
+from .cp_triplet import trip, trip_jac
+from .cp_mix import double_pnum, double_pnum_jac
 
 
 # 3D + 2D + TT Gauß
@@ -74,6 +74,43 @@ def CF_Gxyz_gauss_3D2DTT(parms, tau):
     return G
 
 
+def jacobian(parms, tau):
+    u"""Partial derivatives of `CF_Gxyz_gauss_3D2DTT` with respect to
+        the parameters *parms* (same order as *parms*)
+    """
+    n = parms[0]
+    taud2D = parms[1]
+    taud3D = parms[2]
+    F = parms[3]
+    SP = parms[4]
+    alpha = parms[5]
+    tautrip1 = parms[6]
+    T1 = parms[7]
+    tautrip2 = parms[8]
+    T2 = parms[9]
+
+    g1, dg1_taudiff = twod_jac(tau=tau, taudiff=taud2D)
+    g2, dg2_taudiff, dg2_SP = threed_jac(tau=tau, taudiff=taud3D,
+                                         SP=SP)
+    g, dg_n, dg_F1, dg_alpha, dg_g1, dg_g2 = double_pnum_jac(
+        n=n, F1=1-F, alpha=alpha, g1=g1, g2=g2)
+    tr1, dtr1_tautrip, dtr1_T = trip_jac(tau=tau, tautrip=tautrip1, T=T1)
+    tr2, dtr2_tautrip, dtr2_T = trip_jac(tau=tau, tautrip=tautrip2, T=T2)
+    tr = tr1 * tr2
+
+    return [dg_n*tr,
+            dg_g1*dg1_taudiff*tr,
+            dg_g2*dg2_taudiff*tr,
+            -dg_F1*tr,
+            dg_g2*dg2_SP*tr,
+            dg_alpha*tr,
+            g*dtr1_tautrip*tr2,
+            g*dtr1_T*tr2,
+            g*tr1*dtr2_tautrip,
+            g*tr1*dtr2_T,
+            np.ones_like(g)]
+
+
 def supplements(parms, countrate=None):
     u"""Supplementary parameters:
         Effective number of freely diffusing particles in 3D solution:
@@ -171,5 +208,6 @@ model_setup(
         1.,     # T2
         1.      # offset
     ],
-    supplementary_method=supplements
+    supplementary_method=supplements,
+    jacobian=jacobian,
 )
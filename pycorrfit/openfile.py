@@ -4,12 +4,14 @@ This file contains definitions for opening PyCorrFit sessions and
 saving PyCorrFit correlation curves.
 """
 import codecs
+import collections
+import collections.abc
+from concurrent.futures import ThreadPoolExecutor
 import csv
 from importlib.metadata import version, PackageNotFoundError
 import io
 import os
-import shutil
-import tempfile
+import uuid
 import warnings
 import zipfile
 
@@ -25,6 +27,9 @@ except PackageNotFoundError:
     # package is not installed
     __version__ = "unknown"
 
+#: version of the session file format written by `SaveSessionData`
+SESSION_VERSION = 2
+
 
 def LoadSessionData(sessionfile, parameters_only=False):
     """Load PyCorrFit session data from a zip file (.pcfs)
@@ -111,6 +116,69 @@ def LoadSessionData(sessionfile, parameters_only=False):
             Infodict["External Functions"][key] = funcfile.read()
             funcfile.close()
             key = key+1
+    try:
+        # Raises KeyError, if file is not present (version 1):
+        Arc.getinfo("Manifest.yaml")
+    except KeyError:
+        _load_arrays_v1(Arc, Infodict)
+    else:
+        with Arc.open("Manifest.yaml") as fd:
+            manifest = yaml.safe_load(fd)
+        _load_arrays_v2(sessionfile, manifest, Infodict)
+    # Get the comments, if they exist
+    commentfilename = "comments.txt"
+    try:
+        # Raises KeyError, if file is not present:
+        Arc.getinfo(commentfilename)
+    except KeyError:
+        pass
+    else:
+        # Open the file
+        commentfile = Arc.open(commentfilename, 'r')
+        Infodict["Comments"] = dict()
+        for i in np.arange(len(Infodict["Parameters"])):
+            number = str(Infodict["Parameters"][i][0]
+                         ).strip().strip(":").strip("#")
+            pageid = int(number)
+            # Strip line ending characters for all the Pages.
+            Infodict["Comments"][pageid] = \
+                commentfile.readline().decode().strip()
+        # Now Add the Session Comment (the rest of the file).
+        ComList = commentfile.readlines()
+        Infodict["Comments"]["Session"] = ''
+        for line in ComList:
+            Infodict["Comments"]["Session"] += line.decode()
+        commentfile.close()
+    # Preferences
+    preferencesname = "preferences.cfg"
+    try:
+        # Raises KeyError, if file is not present:
+        Arc.getinfo(preferencesname)
+    except:
+        pass
+    else:
+        prefdict = {}
+        with Arc.open(preferencesname) as fd:
+            data = fd.readlines()
+        for line in data:
+            line = line.decode().strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+            key, value = line.split("=")
+            key = key.strip()
+            value = value.strip()
+            if value.count(","):
+                value = [v.strip() for v in value.split(",")]
+            prefdict[key] = value
+        Infodict["Preferences"] = prefdict
+    Arc.close()
+    return Infodict
+
+
+def _load_arrays_v1(Arc, Infodict):
+    """Load the correlations, traces, backgrounds, and external weights
+    of a session file (version 1, text files) into `Infodict`
+    """
     # Get the correlation arrays
     Infodict["Correlations"] = dict()
     for i in np.arange(len(Infodict["Parameters"])):
@@ -185,29 +253,6 @@ def LoadSessionData(sessionfile, parameters_only=False):
             Infodict["Traces"][pageid] = thistrace
         else:
             Infodict["Traces"][pageid] = None
-    # Get the comments, if they exist
-    commentfilename = "comments.txt"
-    try:
-        # Raises KeyError, if file is not present:
-        Arc.getinfo(commentfilename)
-    except KeyError:
-        pass
-    else:
-        # Open the file
-        commentfile = Arc.open(commentfilename, 'r')
-        Infodict["Comments"] = dict()
-        for i in np.arange(len(Infodict["Parameters"])):
-            number = str(Infodict["Parameters"][i][0]
-                         ).strip().strip(":").strip("#")
-            pageid = int(number)
-            # Strip line ending characters for all the Pages.
-            Infodict["Comments"][pageid] = commentfile.readline().strip()
-        # Now Add the Session Comment (the rest of the file).
-        ComList = commentfile.readlines()
-        Infodict["Comments"]["Session"] = ''
-        for line in ComList:
-            Infodict["Comments"]["Session"] += line.decode()
-        commentfile.close()
     # Get the Backgroundtraces and data if they exist
     bgfilename = "backgrounds.csv"
     try:
@@ -268,33 +313,139 @@ def LoadSessionData(sessionfile, parameters_only=False):
                     Wdata.append(np.float64(row[0]))
             Weightsdict[pageid][Nkey] = np.array(Wdata)
         Infodict["External Weights"] = Weightsdict
-    # Preferences
-    preferencesname = "preferences.cfg"
-    try:
-        # Raises KeyError, if file is not present:
-        Arc.getinfo(preferencesname)
-    except:
-        pass
-    else:
-        prefdict = {}
-        with Arc.open(preferencesname) as fd:
-            data = fd.readlines()
-        for line in data:
-            line = line.decode().strip()
-            if len(line) == 0 or line.startswith("#"):
-                continue
-            key, value = line.split("=")
-            key = key.strip()
-            value = value.strip()
-            if value.count(","):
-                value = [v.strip() for v in value.split(",")]
-            prefdict[key] = value
-        Infodict["Preferences"] = prefdict
-    Arc.close()
-    return Infodict
 
 
-def SaveSessionData(sessionfile, Infodict):
+def _load_arrays_v2(sessionfile, manifest, Infodict):
+    """Add the correlations, traces, backgrounds, and external weights
+    of a session file (version 2, .npy files) to `Infodict`
+
+    The arrays of the pages are loaded when a page is first accessed
+    (see `LazySessionData`).
+    """
+    if manifest.get("version", 2) > SESSION_VERSION:
+        warnings.warn("Session file format version {} ".format(
+            manifest["version"]) + "is not supported, trying anyway.")
+    archive = SessionArchive(sessionfile)
+    pages = manifest.get("pages", {})
+
+    def get_correlation(pageid):
+        page = pages[pageid]
+        if "correlation" in page:
+            dataexp = archive.read_array(page["correlation"])
+            tau = dataexp[:, 0]
+        else:
+            # We do not have a curve here
+            dataexp = None
+            tau = archive.read_array(page["tau"])
+        return [tau, dataexp]
+
+    def get_traces(pageid):
+        traces = [archive.read_array(name)
+                  for name in pages[pageid].get("traces", [])]
+        if len(traces) != 0:
+            return traces
+        else:
+            return None
+
+    def get_weights(pageid):
+        weights = pages[pageid]["weights"]
+        return {key: archive.read_array(weights[key])
+                for key in sorted(weights)}
+
+    Infodict["Correlations"] = LazySessionData(archive, pages.keys(),
+                                               get_correlation)
+    Infodict["Traces"] = LazySessionData(archive, pages.keys(), get_traces)
+    Infodict["External Weights"] = LazySessionData(
+        archive, [pid for pid in pages if pages[pid].get("weights")],
+        get_weights)
+    if "backgrounds" in manifest:
+        Infodict["Backgrounds"] = list()
+        for bg in manifest["backgrounds"]:
+            newbackground = Trace(trace=archive.read_array(bg["trace"]),
+                                  name=bg["name"],
+                                  countrate=np.float64(bg["countrate"]))
+            Infodict["Backgrounds"].append(newbackground)
+    archive.release()
+
+
+class SessionArchive(object):
+    """Reads arrays from a session file (version 2) on demand
+
+    The zip file is opened on the first access. It is closed again
+    when all lazily loaded data were read (see `LazySessionData`)
+    or when `close` is called, so that the session file can be
+    overwritten.
+    """
+
+    def __init__(self, sessionfile):
+        self.sessionfile = sessionfile
+        self._arc = None
+        # number of `LazySessionData` items that were not loaded yet
+        self._pending = 0
+
+    def close(self):
+        if self._arc is not None:
+            self._arc.close()
+            self._arc = None
+
+    def read_array(self, name):
+        """Return the array stored in the .npy member `name`"""
+        if self._arc is None:
+            self._arc = zipfile.ZipFile(self.sessionfile, mode='r')
+        return np.load(io.BytesIO(self._arc.read(name)), allow_pickle=False)
+
+    def register(self, number=1):
+        self._pending += number
+
+    def release(self, number=0):
+        self._pending -= number
+        if self._pending <= 0:
+            self.close()
+
+
+class LazySessionData(collections.abc.Mapping):
+    """Page data of a session file that are loaded on first access
+
+    Behaves like a read-only dictionary mapping page numbers to
+    the data returned by `loader(pageid)`.
+    """
+
+    def __init__(self, archive, keys, loader):
+        self._archive = archive
+        self._keys = list(keys)
+        self._loader = loader
+        self._data = dict()
+        self._archive.register(len(self._keys))
+
+    def __getitem__(self, key):
+        if key not in self._data:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._data[key] = self._loader(key)
+            self._archive.release(1)
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def close(self):
+        """Close the session file
+
+        Data that were not loaded yet are still available; the
+        session file is opened again when they are accessed.
+        """
+        self._archive.close()
+
+    def __repr__(self):
+        return "<LazySessionData: {} pages, {} loaded>".format(
+            len(self._keys), len(self._data))
+
+
+def SaveSessionData(sessionfile, Infodict, version=None,
+                    compression=zipfile.ZIP_STORED, n_threads=1):
     """Session PyCorrFit session data to file.
 
 
@@ -312,23 +463,34 @@ def SaveSessionData(sessionfile, Infodict):
         "Parameters", dict: page numbers, all parameters of the pages
         "Preferences", dict: fixed page parameters
         "Traces", dict: page numbers, all traces of the pages
+    version : int or None
+        Session file format version, defaults to `SESSION_VERSION`.
+        Version 1 stores all arrays as text (CSV) files, version 2
+        as binary NumPy (.npy) files listed in "Manifest.yaml".
+    compression : int
+        Compression method of the zip archive, e.g.
+        `zipfile.ZIP_DEFLATED`; the default is no compression.
+    n_threads : int
+        Number of threads that encode the archive members while
+        they are compressed and written.
 
 
     The version of PyCorrFit is written to Readme.txt
+
+    The members are streamed into a temporary file next to
+    `sessionfile`, which then replaces `sessionfile`. This function
+    does not change the working directory and can be called from
+    a background thread.
     """
-    (dirname, filename) = os.path.split(sessionfile)
+    if version is None:
+        version = SESSION_VERSION
+    if version not in [1, 2]:
+        raise ValueError("Unknown session file format version: {}".format(
+            version))
     # Sometimes you have multiple endings...
-    if filename.endswith(".pcfs") is not True:
-        filename += ".pcfs"
-    # Change working directory
-    returnWD = os.getcwd()
-    tempdir = tempfile.mkdtemp()
-    os.chdir(tempdir)
-    # Create zip file
-    Arc = zipfile.ZipFile(filename, mode='w')
+    if sessionfile.endswith(".pcfs") is not True:
+        sessionfile += ".pcfs"
     # Only do the Yaml thing for safe operations.
-    # Make the yaml dump
-    parmsfilename = "Parameters.yaml"
     # Parameters have to be floats in lists
     # in order for yaml.safe_load to work.
     Parms = Infodict["Parameters"]
@@ -354,28 +516,20 @@ def SaveSessionData(sessionfile, Infodict):
         # Fit parameter range
         Parms[idparm][9] = np.array(Parms[idparm][9], dtype="float").tolist()
         Parmlist.append(Parms[idparm])
-
     try:
         # We would like to perform safe_dump, because in the
         # Windoes x64 version, some integers are exported
         # like this: `!!python/long '105'` using `yaml.dump`.
-        with open(parmsfilename, "w") as yamlfd:
-            yaml.safe_dump(Parmlist, yamlfd)
+        parmsyaml = yaml.safe_dump(Parmlist)
     except yaml.representer.RepresenterError:
         # `RepresenterError: cannot represent an object: 0`
         # In this case, we choose to use the normal dump
         # and pray.
         # However, this should not happen, because in the above
         # for-loop we set the correct dtype for each parameter .
-        if os.path.exists(parmsfilename):
-            os.remove(parmsfilename)
-        with open(parmsfilename, "w") as yamlfd:
-            yaml.dump(Parmlist, yamlfd)
-
-    Arc.write(parmsfilename)
-    os.remove(os.path.join(tempdir, parmsfilename))
+        parmsyaml = yaml.dump(Parmlist)
+    members = [("Parameters.yaml", _text_member(parmsyaml))]
     # Supplementary data (errors of fit)
-    errsfilename = "Supplements.yaml"
     Sups = Infodict["Supplements"]
     SupKeys = list(Sups.keys())
     SupKeys.sort()
@@ -385,163 +539,187 @@ def SaveSessionData(sessionfile, Infodict):
         chi2 = Sups[idsup]["Chi sq"]
         globalshare = Sups[idsup]["Global Share"]
         Suplist.append([idsup, error, chi2, globalshare])
-    with open(errsfilename, "w") as fd:
-        yaml.safe_dump(Suplist, fd)
-    Arc.write(errsfilename)
-    os.remove(os.path.join(tempdir, errsfilename))
+    members.append(("Supplements.yaml",
+                    _text_member(yaml.safe_dump(Suplist))))
     # Save external functions
     for key in Infodict["External Functions"].keys():
-        funcfilename = "model_"+str(key)+".txt"
-        funcfile = codecs.open(funcfilename, 'w', encoding="utf-8")
-        funcfile.write(Infodict["External Functions"][key])
-        funcfile.close()
-        Arc.write(funcfilename)
-        os.remove(os.path.join(tempdir, funcfilename))
+        members.append(("model_"+str(key)+".txt",
+                        _text_member(Infodict["External Functions"][key])))
+    # Save comments into txt file
+    # Comments[-1] is comment on whole Session
+    Ckeys = list(Infodict["Comments"].keys())
+    try:
+        Ckeys.remove("Session")
+    except ValueError:
+        pass
+    Ckeys.sort()
+    comments = ""
+    for key in Ckeys:
+        comments += Infodict["Comments"][key]+"\r\n"
+    comments += Infodict["Comments"]["Session"]
+    members.append(("comments.txt", _text_member(comments)))
+    # Save the arrays
+    if version == 1:
+        members += _array_members_v1(Infodict)
+    else:
+        members += _array_members_v2(Infodict)
+    # Preferences
+    preferences = ""
+    for key in Infodict["Preferences"]:
+        value = Infodict["Preferences"][key]
+        if isinstance(value, list):
+            value = " ".join("{}".format(it) for it in value)
+        else:
+            value = "{}".format(value)
+        preferences += "{} = {}\n".format(key, value)
+    members.append(("preferences.cfg", _text_member(preferences)))
+    # Readme
+    members.append(("Readme.txt", _text_member(ReadmeSession)))
+    # Write the archive to a temporary file first, so that an
+    # existing session file is only replaced by a complete one.
+    tempname = "{}.{}.tmp".format(sessionfile, uuid.uuid4().hex[:8])
+    try:
+        with zipfile.ZipFile(tempname, mode='w',
+                             compression=compression) as Arc:
+            _write_members(Arc, members, n_threads)
+        os.replace(tempname, sessionfile)
+    except BaseException:
+        if os.path.exists(tempname):
+            os.remove(tempname)
+        raise
+
+
+def _text_member(text):
+    """Return a writer for an archive member containing `text`"""
+    def write(fd):
+        fd.write(text.encode("utf-8"))
+    return write
+
+
+def _csv_member(rows, delimiter=','):
+    """Return a writer for an archive member containing the CSV `rows`"""
+    def write(fd):
+        text = io.TextIOWrapper(fd, encoding="utf-8", newline="")
+        csv.writer(text, delimiter=delimiter).writerows(rows)
+        text.flush()
+        text.detach()
+    return write
+
+
+def _table_member(array, header):
+    """Return a writer for an archive member containing the columns
+    of `array` as comma-separated text"""
+    def write(fd):
+        np.savetxt(fd, array, fmt="%.20e", delimiter=",", newline="\r\n",
+                   header=header, comments="")
+    return write
+
+
+def _npy_member(array):
+    """Return a writer for an archive member containing `array` in
+    the NumPy .npy format"""
+    def write(fd):
+        np.save(fd, array, allow_pickle=False)
+    return write
+
+
+def _write_members(Arc, members, n_threads=1):
+    """Stream the `members` (list of name and writer) into `Arc`
+
+    If `n_threads` is larger than one, the members are encoded in
+    a thread pool, while the current thread compresses and writes
+    the previously encoded members.
+    """
+    if n_threads <= 1:
+        for name, write in members:
+            with Arc.open(name, mode='w', force_zip64=True) as fd:
+                write(fd)
+        return
+
+    def encode(write):
+        fd = io.BytesIO()
+        write(fd)
+        return fd.getbuffer()
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        pending = collections.deque()
+        members = iter(members)
+        while True:
+            # Limit the number of encoded members kept in memory
+            for name, write in members:
+                pending.append((name, pool.submit(encode, write)))
+                if len(pending) >= 2 * n_threads:
+                    break
+            if not pending:
+                break
+            name, future = pending.popleft()
+            with Arc.open(name, mode='w', force_zip64=True) as fd:
+                fd.write(future.result())
+
+
+def _array_members_v1(Infodict):
+    """Archive members of the correlations, traces, backgrounds, and
+    external weights as text files (version 1)"""
+    Parms = Infodict["Parameters"]
+    members = list()
     # Save (dataexp and tau)s into separate csv files.
     for pageid in Infodict["Correlations"].keys():
         # Since *Array* and *Parms* are in the same order (the page order),
         # we will identify the filename by the Page title number.
         number = str(pageid)
         expfilename = "data"+number+".csv"
-        expfile = open(expfilename, 'w')
         tau = Infodict["Correlations"][pageid][0]
         exp = Infodict["Correlations"][pageid][1]
-        dataWriter = csv.writer(expfile, delimiter=',')
         if exp is not None:
-            # Names of Columns
-            dataWriter.writerow(['# tau', 'experimental data'])
-            # Actual Data
             # Do not use len(tau) instead of len(exp[:,0])) !
             # Otherwise, the experimental data will not be saved entirely,
             # if it has been cropped. Because tau might be smaller, than
             # exp[:,0] --> tau = exp[startcrop:endcrop,0]
-            for j in np.arange(len(exp[:, 0])):
-                dataWriter.writerow(["%.20e" % exp[j, 0],
-                                     "%.20e" % exp[j, 1]])
+            members.append((expfilename, _table_member(
+                np.asarray(exp)[:, :2], '# tau,experimental data')))
         else:
             # Only write tau
-            dataWriter.writerow(['# tau'+' only'])
-            for j in np.arange(len(tau)):
-                dataWriter.writerow(["%.20e" % tau[j]])
-        expfile.close()
-        # Add to archive
-        Arc.write(expfilename)
-        os.remove(os.path.join(tempdir, expfilename))
+            members.append((expfilename, _table_member(
+                np.asarray(tau).reshape(-1, 1), '# tau only')))
     # Save traces into separate csv files.
     for pageid in Infodict["Traces"].keys():
         number = str(pageid)
         # Since *Trace* and *Parms* are in the same order, which is the
         # Page order, we will identify the filename by the Page title
         # number.
-        if Infodict["Traces"][pageid] is not None and len(Infodict["Traces"][pageid]) != 0:
-            if Parms[pageid][7] is True:
-                # We have cross correlation: save two traces
-                # A
-                tracefilenamea = "trace"+number+"A.csv"
-                tracefile = open(tracefilenamea, 'w')
-                traceWriter = csv.writer(tracefile, delimiter=',')
-                time = Infodict["Traces"][pageid][0][:, 0]
-                rate = Infodict["Traces"][pageid][0][:, 1]
-                # Names of Columns
-                traceWriter.writerow(['# time', 'count rate'])
-                # Actual Data
-                for j in np.arange(len(time)):
-                    traceWriter.writerow(["%.20e" % time[j],
-                                          "%.20e" % rate[j]])
-                tracefile.close()
-                # Add to archive
-                Arc.write(tracefilenamea)
-                os.remove(os.path.join(tempdir, tracefilenamea))
-                # B (only if it exists...)
-                try:
-                    _ = Infodict["Traces"][pageid][1]
-                except IndexError:
-                    pass
-                else:
-                    tracefilenameb = "trace"+number+"B.csv"
-                    tracefile = open(tracefilenameb, 'w')
-                    traceWriter = csv.writer(tracefile, delimiter=',')
-                    time = Infodict["Traces"][pageid][1][:, 0]
-                    rate = Infodict["Traces"][pageid][1][:, 1]
-                    # Names of Columns
-                    traceWriter.writerow(['# time', 'count rate'])
-                    # Actual Data
-                    for j in np.arange(len(time)):
-                        traceWriter.writerow(["%.20e" % time[j],
-                                              "%.20e" % rate[j]])
-                    tracefile.close()
-                    # Add to archive
-                    Arc.write(tracefilenameb)
-                    os.remove(os.path.join(tempdir, tracefilenameb))
-            else:
-                # Save one single trace
-                tracefilename = "trace"+number+".csv"
-                tracefile = open(tracefilename, 'w')
-                traceWriter = csv.writer(tracefile, delimiter=',')
-                time = Infodict["Traces"][pageid][0][:, 0]
-                rate = Infodict["Traces"][pageid][0][:, 1]
-                # Names of Columns
-                traceWriter.writerow(['# time', 'count rate'])
-                # Actual Data
-                for j in np.arange(len(time)):
-                    traceWriter.writerow(["%.20e" % time[j],
-                                          "%.20e" % rate[j]])
-                tracefile.close()
-                # Add to archive
-                Arc.write(tracefilename)
-                os.remove(os.path.join(tempdir, tracefilename))
-    # Save comments into txt file
-    commentfilename = "comments.txt"
-    commentfile = codecs.open(commentfilename, 'w', encoding="utf-8")
-    # Comments[-1] is comment on whole Session
-    Ckeys = list(Infodict["Comments"].keys())
-    try:
-        Ckeys.remove("Session")
-    except ValueError:
-        pass
-    Ckeys.sort()
-    for key in Ckeys:
-        if key != "Session":
-            commentfile.write(Infodict["Comments"][key]+"\r\n")
-    commentfile.write(Infodict["Comments"]["Session"])
-    commentfile.close()
-    Arc.write(commentfilename)
-    os.remove(os.path.join(tempdir, commentfilename))
+        traces = Infodict["Traces"][pageid]
+        if traces is None or len(traces) == 0:
+            continue
+        if Parms[pageid][7] is True:
+            # We have cross correlation: save two traces
+            # (B only if it exists...)
+            tracefilenames = ["trace"+number+"A.csv",
+                              "trace"+number+"B.csv"]
+        else:
+            # Save one single trace
+            tracefilenames = ["trace"+number+".csv"]
+        for tracefilename, trace in zip(tracefilenames, traces):
+            members.append((tracefilename, _table_member(
+                np.column_stack((trace[:, 0], trace[:, 1])),
+                '# time,count rate')))
     # Save Background information:
     Background = Infodict["Backgrounds"]
     if len(Background) > 0:
-        # We do not use a comma separated, but a tab separated file,
-        # because a comma might be in the name of a bg.
-        bgfilename = "backgrounds.csv"
-        bgfile = open(bgfilename, 'w')
-        bgwriter = csv.writer(bgfile, delimiter='\t')
+        bgrows = list()
         for i in np.arange(len(Background)):
-            bgwriter.writerow(
-                [str(Background[i].countrate), Background[i].name])
+            bgrows.append([str(Background[i].countrate), Background[i].name])
             # Traces
-            bgtracefilename = "bg_trace"+str(i)+".csv"
-            bgtracefile = open(bgtracefilename, 'w')
-            bgtraceWriter = csv.writer(bgtracefile, delimiter=',')
-            bgtraceWriter.writerow(['# time', 'count rate'])
-            # Actual Data
-            time = Background[i][:, 0]
-            rate = Background[i][:, 1]
-            for j in np.arange(len(time)):
-                bgtraceWriter.writerow(["%.20e" % time[j],
-                                        "%.20e" % rate[j]])
-            bgtracefile.close()
-            # Add to archive
-            Arc.write(bgtracefilename)
-            os.remove(os.path.join(tempdir, bgtracefilename))
-        bgfile.close()
-        Arc.write(bgfilename)
-        os.remove(os.path.join(tempdir, bgfilename))
+            members.append(("bg_trace"+str(i)+".csv", _table_member(
+                np.column_stack((Background[i][:, 0], Background[i][:, 1])),
+                '# time,count rate')))
+        # We do not use a comma separated, but a tab separated file,
+        # because a comma might be in the name of a bg.
+        members.append(("backgrounds.csv",
+                        _csv_member(bgrows, delimiter='\t')))
     # Save External Weights information
     WeightedPageID = list(Infodict["External Weights"].keys())
     WeightedPageID.sort()
-    WeightFilename = "externalweights.txt"
-    WeightFile = open(WeightFilename, 'w')
-    WeightWriter = csv.writer(WeightFile, delimiter='\t')
+    weightrows = list()
     for pageid in WeightedPageID:
         number = str(pageid)
         NestWeights = list(Infodict["External Weights"][pageid].keys())
@@ -549,48 +727,77 @@ def SaveSessionData(sessionfile, Infodict):
         # sorted in the frontend and upon import. We sort them here, anyhow.
         NestWeights.sort()
         for Nkey in NestWeights:
-            WeightWriter.writerow([number, str(Nkey).strip()])
+            weightrows.append([number, str(Nkey).strip()])
             # Add data to a File
             WeightDataFilename = "externalweights_data"+number +\
                                  "_"+str(Nkey).strip()+".csv"
-            WeightDataFile = open(WeightDataFilename, 'w')
-            WeightDataWriter = csv.writer(WeightDataFile)
             wdata = Infodict["External Weights"][pageid][Nkey]
-            for jw in np.arange(len(wdata)):
-                WeightDataWriter.writerow([str(wdata[jw])])
-            WeightDataFile.close()
-            Arc.write(WeightDataFilename)
-            os.remove(os.path.join(tempdir, WeightDataFilename))
-    WeightFile.close()
-    Arc.write(WeightFilename)
-    os.remove(os.path.join(tempdir, WeightFilename))
-    # Preferences
-    preferencesname = "preferences.cfg"
-    with codecs.open(preferencesname, 'w', encoding="utf-8") as fd:
-        for key in Infodict["Preferences"]:
-            value = Infodict["Preferences"][key]
-            if isinstance(value, list):
-                value = " ".join("{}".format(it) for it in value)
+            members.append((WeightDataFilename,
+                            _csv_member([[str(w)] for w in wdata])))
+    members.append(("externalweights.txt",
+                    _csv_member(weightrows, delimiter='\t')))
+    return members
+
+
+def _array_members_v2(Infodict):
+    """Archive members of the correlations, traces, backgrounds, and
+    external weights as .npy files (version 2)
+
+    The member names are stored in "Manifest.yaml".
+    """
+    members = list()
+
+    def add_array(name, array):
+        members.append((name, _npy_member(np.asarray(array, dtype=float))))
+        return name
+
+    pages = dict()
+    pageids = sorted(set(Infodict["Correlations"].keys()) |
+                     set(Infodict["Traces"].keys()))
+    for pageid in pageids:
+        number = str(pageid)
+        page = dict()
+        if pageid in Infodict["Correlations"]:
+            tau, exp = Infodict["Correlations"][pageid]
+            if exp is not None:
+                # Save the complete (not cropped) experimental data
+                page["correlation"] = add_array(
+                    "arrays/data"+number+".npy", exp)
             else:
-                value = "{}".format(value)
-            fd.write("{} = {}\n".format(key, value))
-    Arc.write(preferencesname)
-    os.remove(os.path.join(tempdir, preferencesname))
-    # Readme
-    rmfilename = "Readme.txt"
-    rmfile = codecs.open(rmfilename, 'w', encoding="utf-8")
-    rmfile.write(ReadmeSession)
-    rmfile.close()
-    Arc.write(rmfilename)
-    os.remove(os.path.join(tempdir, rmfilename))
-    # Close the archive
-    Arc.close()
-    # Move archive to destination directory
-    shutil.move(os.path.join(tempdir, filename),
-                os.path.join(dirname, filename))
-    # Go to destination directory
-    os.chdir(returnWD)
-    os.rmdir(tempdir)
+                page["tau"] = add_array("arrays/tau"+number+".npy", tau)
+        traces = Infodict["Traces"].get(pageid)
+        if traces is not None and len(traces) != 0:
+            page["traces"] = [
+                add_array("arrays/trace{}_{}.npy".format(number, ii),
+                          np.column_stack((tr[:, 0], tr[:, 1])))
+                for ii, tr in enumerate(traces)]
+        pages[pageid] = page
+    for pageid in sorted(Infodict["External Weights"].keys()):
+        weights = Infodict["External Weights"][pageid]
+        if len(weights) == 0:
+            continue
+        page = pages.setdefault(pageid, dict())
+        page["weights"] = dict()
+        for ii, Nkey in enumerate(sorted(weights.keys())):
+            page["weights"][str(Nkey).strip()] = add_array(
+                "arrays/externalweights{}_{}.npy".format(pageid, ii),
+                weights[Nkey])
+    backgrounds = list()
+    for ii, bg in enumerate(Infodict["Backgrounds"]):
+        backgrounds.append({
+            "name": bg.name,
+            "countrate": float(bg.countrate),
+            "trace": add_array("arrays/bg_trace{}.npy".format(ii),
+                               np.column_stack((bg[:, 0], bg[:, 1]))),
+        })
+    manifest = {"format": "pcfs",
+                "version": 2,
+                "pages": pages,
+                "backgrounds": backgrounds,
+                }
+    members.append(("Manifest.yaml",
+                    _text_member(yaml.safe_dump(manifest))))
+    return members
 
 
 def ExportCorrelation(exportfile, correlation, page_info, savetrace=True):
@@ -760,6 +967,16 @@ calculated.
 
 There are a number of files within this archive,
 depending on what was done during the session.
+Since version 2 of the session file format (PyCorrFit 1.4.0),
+all arrays are stored as NumPy binary files in the "arrays"
+directory and are listed in Manifest.yaml. The *.csv files and
+externalweights.txt described below are only present in older
+session files (version 1).
+
+arrays/*.npy
+ - Binary NumPy arrays (correlations, traces, backgrounds and
+   external weights, see Manifest.yaml); the columns and units
+   are the same as in the respective *.csv files of version 1
 
 backgrounds.csv
  - Contains the list of backgrounds used and
@@ -788,6 +1005,23 @@ externalweights.txt
 externalweights_data_*PageID*_*Type*.csv
  - Contains weighting information of Page *PageID* of type *Type*
 
+Manifest.yaml
+ - Session file format version and the names of the files
+   in the "arrays" directory:
+    format: pcfs
+    version: 2
+    pages:
+      (Number of page):
+        correlation: (experimental data: lag time, correlation)
+        tau: (lag times, only for pages without experimental data)
+        traces: [(one trace per channel: time, countrate)]
+        weights:
+          (Type): (external weights)
+    backgrounds:
+     - name: (name of background)
+       countrate: (averaged intensity in [kHz])
+       trace: (background trace: time, countrate)
+
 model_*ModelID*.txt
  - An external (user-defined) model file with internal ID *ModelID*
 
@@ -1,6 +1,8 @@
 """Module readfiles: Import correlation data from data files"""
-import csv
-import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import importlib
+import inspect
+import os
 import pathlib
 import shutil
 import sys
@@ -9,18 +11,51 @@ import warnings
 import zipfile
 
 import numpy as np
-import yaml
+
+from ..trace import Trace
+
+from .cache import ParsedFileCache, get_cache_dir
+
+
+class LazyReader(object):
+    """A file format reader that is imported on first use
+
+    The reader modules pull in heavy dependencies (e.g. the TTTR
+    correlator and ptufile for pt3/ptu files). `LazyReader` behaves
+    like the reader function `name` in the module
+    `pycorrfit.readfiles.<module>`, but imports it only when it is
+    called.
+    """
+
+    def __init__(self, module, name):
+        self.__module__ = __name__ + "." + module
+        self.__name__ = name
+        self._func = None
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        return "<LazyReader {}.{}>".format(self.__module__, self.__name__)
+
+    def load(self):
+        """Import and return the reader function"""
+        if self._func is None:
+            module = importlib.import_module(self.__module__)
+            self._func = getattr(module, self.__name__)
+        return self._func
+
 
 # To add a filetype add it here and in the
-# dictionaries at the end of this file.
-from .read_ASC_ALV import openASC
-from .read_cor_PicoQuant import openCOR
-from .read_CSV_PyCorrFit import openCSV
-from .read_SIN_correlator_com import openSIN
-from .read_FCS_Confocor3 import openFCS
-from .read_mat_ries import openMAT
-from .read_pt3_PicoQuant import openPT3
-from .read_ptu_PicoQuant import openPTU
+# dictionaries at the end of this file (or use `register_filetype`).
+openASC = LazyReader("read_ASC_ALV", "openASC")
+openCOR = LazyReader("read_cor_PicoQuant", "openCOR")
+openCSV = LazyReader("read_CSV_PyCorrFit", "openCSV")
+openSIN = LazyReader("read_SIN_correlator_com", "openSIN")
+openFCS = LazyReader("read_FCS_Confocor3", "openFCS")
+openMAT = LazyReader("read_mat_ries", "openMAT")
+openPT3 = LazyReader("read_pt3_PicoQuant", "openPT3")
+openPTU = LazyReader("read_ptu_PicoQuant", "openPTU")
 
 
 def add_all_supported_filetype_entry(adict):
@@ -37,6 +72,22 @@ def add_all_supported_filetype_entry(adict):
     adict[ALL_SUP_STRING+"|"+wildcard] = open_any
 
 
+def get_extension_map(adict):
+    """Map the file extensions (e.g. ".SIN") in the wildcards of
+    the filetype dictionary `adict` to the readers
+    """
+    extmap = {}
+    for key, reader in adict.items():
+        # Recurse into the wildcards
+        wildcardstring = key.split("|")
+        # We do not want to recurse
+        if wildcardstring[0] != ALL_SUP_STRING:
+            for wc in wildcardstring[1].split(";"):
+                # The first reader of an extension is used
+                extmap.setdefault(wc.strip("*"), reader)
+    return extmap
+
+
 def get_supported_extensions():
     """
     Returns list of extensions of currently supported file types.
@@ -55,7 +106,7 @@ def get_supported_extensions():
 
 # To increase user comfort, we will now create a file opener thingy that
 # knows how to open all files we know.
-def open_any(path, filename=None):
+def open_any(path, filename=None, cache=None, **kwargs):
     """Open a supported data file
 
     Parameters
@@ -64,25 +115,102 @@ def open_any(path, filename=None):
         Full path to file or directory containing `filename`
     filename : str
         The name of the file if not given in path (optional).
+    cache : ParsedFileCache or None
+        If given, the parsed data are loaded from this on-disk
+        cache or stored in it after reading the file.
+    kwargs : dict
+        Additional keyword arguments for the reader of the file
+        format (e.g. `n_workers` for `openPT3`).
     """
     path = pathlib.Path(path)
     if filename is not None:
         warnings.warn("Using `filename` is deprecated.", DeprecationWarning)
         path = path / filename
-    wildcard = path.suffix
-    for key in filetypes_dict.keys():
-        # Recurse into the wildcards
-        wildcardstring = key.split("|")
-        # We do not want to recurse
-        if wildcardstring[0] != ALL_SUP_STRING:
-            otherwcs = wildcardstring[1].split(";")
-            for wc in otherwcs:
-                if wc.strip("*") == wildcard:
-                    return filetypes_dict[key](path)
-    else:
+    reader = _extensions.get(path.suffix)
+    if reader is None:
         # If we could not find the correct function in filetypes_dict,
         # try again in filetypes_bg_dict:
         return open_any_bg(path)
+    elif cache is not None:
+        return cache.open(path, reader, **kwargs)
+    else:
+        return reader(path, **kwargs)
+
+
+def open_many(paths, n_workers=None, cache=None, **kwargs):
+    """Open several data files in a process pool
+
+    Parameters
+    ----------
+    paths : list of str or pathlib.Path
+        Paths of the data files
+    n_workers : int or None
+        Number of processes; defaults to the number of CPUs. With
+        ``n_workers=1``, the files are opened one after another in
+        the current process.
+    cache : ParsedFileCache or None
+        On-disk cache of the parsed data (see `open_any`)
+    kwargs : dict
+        Additional keyword arguments for the file format readers.
+        Each reader only receives the arguments it accepts, e.g.
+        `segment_length` is only passed to the pt3/ptu readers.
+
+    Yields
+    ------
+    path, data, error : pathlib.Path, dict or None, Exception or None
+        For each file in the order in which they finished, the data
+        returned by `open_any` or the exception that was raised
+        while reading the file (`data` is None in that case).
+    """
+    paths = [pathlib.Path(pp) for pp in paths]
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(int(n_workers), len(paths)))
+    if n_workers == 1:
+        for path in paths:
+            try:
+                data = _open_any_accepted(path, cache=cache, **kwargs)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException as excpt:
+                # (some readers raise subclasses of BaseException)
+                yield path, None, excpt
+            else:
+                yield path, data, None
+        return
+
+    executor = ProcessPoolExecutor(max_workers=n_workers)
+    try:
+        futures = {executor.submit(_open_any_accepted, path, cache=cache,
+                                   **kwargs):
+                   path for path in paths}
+        for future in as_completed(futures):
+            excpt = future.exception()
+            if excpt is None:
+                yield futures[future], future.result(), None
+            else:
+                yield futures[future], None, excpt
+    finally:
+        # Do not wait for the remaining files if the caller stopped
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _open_any_accepted(path, cache=None, **kwargs):
+    """`open_any` with the items of `kwargs` that the reader accepts"""
+    reader = _extensions.get(pathlib.Path(path).suffix)
+    if isinstance(reader, LazyReader):
+        reader = reader.load()
+    try:
+        params = inspect.signature(reader).parameters
+    except (TypeError, ValueError):
+        # no reader or no signature available
+        pass
+    else:
+        if not any(pp.kind == inspect.Parameter.VAR_KEYWORD
+                   for pp in params.values()):
+            kwargs = {key: val for key, val in kwargs.items()
+                      if key in params}
+    return open_any(path, cache=cache, **kwargs)
 
 
 def open_any_bg(path, filename=None):
@@ -91,19 +219,28 @@ def open_any_bg(path, filename=None):
         warnings.warn("Using `filename` is deprecated.", DeprecationWarning)
         path = path / filename
 
-    wildcard = path.suffix
-    for key in filetypes_bg_dict.keys():
-        # Recurse into the wildcards
-        wildcardstring = key.split("|")
-        # We do not want to recurse
-        if wildcardstring[0] != ALL_SUP_STRING:
-            otherwcs = wildcardstring[1].split(";")
-            for wc in otherwcs:
-                if wc.strip("*") == wildcard:
-                    return filetypes_bg_dict[key](path)
-    else:
+    reader = _extensions_bg.get(path.suffix)
+    if reader is None:
         # For convenience in openZIP
         return None
+    return reader(path)
+
+
+def get_traces(data):
+    """Traces of the curves in `data` as returned by `open_any`
+
+    If the reader provides the key "Trace Pyramid", the traces are
+    instances of `Trace` that keep the full resolution of the
+    measurement (see `Trace.zoom`). Otherwise, `data["Trace"]` is
+    returned.
+    """
+    if "Trace Pyramid" not in data:
+        return data["Trace"]
+    traces = []
+    for trs, pyrs in zip(data["Trace"], data["Trace Pyramid"]):
+        traces.append([Trace(trace=tr, pyramid=pyr)
+                       for tr, pyr in zip(trs, pyrs)])
+    return traces
 
 
 def openZIP(path, filename=None):
@@ -111,18 +248,12 @@ def openZIP(path, filename=None):
 
     Will use any wildcard in `filetypes_dict`.
     """
-    #    It's a rather lengthy import of the session file. The code is copied
-    #    from openfile.OpenSession. The usual zip file packed curves are
-    #    imported on the few code lines after the else statement.
-
     path = pathlib.Path(path)
     if filename is not None:
         warnings.warn("Using `filename` is deprecated.", DeprecationWarning)
         path = path / filename
     filename = path.name
 
-    # Open the archive:
-    Arc = zipfile.ZipFile(path, mode='r')
     Correlations = []  # Correlation information
     Curvelist = []    # Type information
     Filelist = []     # List of filenames corresponding to *Curvelist*
@@ -130,90 +261,38 @@ def openZIP(path, filename=None):
     # First test, if we are opening a session file
     sessionwc = [".fcsfit-session.zip", ".pcfs"]
     if filename.endswith(sessionwc[0]) or filename.endswith(sessionwc[1]):
-        # Get the yaml parms dump:
-        yamlfile = Arc.open("Parameters.yaml")
-        # Parms: Fitting and drawing parameters of the correlation curve
-        # The *yamlfile* is responsible for the order of the Pages #i.
-        # The parameters are actually useless to us right now.
-        Parms = yaml.safe_load(yamlfile)
-        yamlfile.close()
-        # Get the correlation arrays
-        ImportedNum = list()
-        for i in np.arange(len(Parms)):
-            # The *number* is used to identify the correct file
-            number = str(Parms[i][0])
-            expfilename = "data"+number[1:len(number)-2]+".csv"
-            expfile = Arc.open(expfilename, 'r')
-            readdata = csv.reader(io.StringIO(
-                expfile.read().decode()), delimiter=',')
-            dataexp = list()
-            if str(readdata.__next__()[0]) == "# tau only":
+        from ..openfile import LoadSessionData, LazySessionData
+        Infodict = LoadSessionData(path)
+        # The parameters define the order of the pages.
+        for Parms in Infodict["Parameters"]:
+            number = str(Parms[0]).strip().strip(":").strip("#")
+            pageid = int(number)
+            dataexp = Infodict["Correlations"][pageid][1]
+            if dataexp is None:
                 # We do not have a curve here
-                pass
-            else:
-                Filelist.append(filename+"/#"+number[1:len(number)-2])
-                for row in readdata:
-                    # Exclude commentaries
-                    if (str(row[0])[0:1] != '#'):
-                        dataexp.append((float(row[0]), float(row[1])))
-                dataexp = np.array(dataexp)
-                Correlations.append(dataexp)
-                ImportedNum.append(i)
-            del readdata
-            expfile.close()
-        # Get the Traces
-        for i in ImportedNum:
-            # Make sure we only import those traces that had a corresponding
-            # correlation curve. (ImportedNum)
-            #
-            # The *number* is used to identify the correct file
-            number = str(Parms[i][0])
+                continue
+            Filelist.append(filename+"/#"+number)
+            Correlations.append(dataexp)
             # Find out, if we have a cross correlation data type
-            IsCross = False
-            try:
-                IsCross = Parms[i][7]
-            except IndexError:
-                # No Cross correlation
-                pass
-            if IsCross is False:
-                tracefilenames = ["trace"+number[1:len(number)-2]+".csv"]
-                Curvelist.append("AC")
-            else:
-                # Cross correlation uses two traces
-                tracefilenames = ["trace"+number[1:len(number)-2]+"A.csv",
-                                  "trace"+number[1:len(number)-2]+"B.csv"]
+            if len(Parms) > 7 and Parms[7]:
                 Curvelist.append("CC")
-            thistrace = list()
-            for tracefilename in tracefilenames:
-                try:
-                    Arc.getinfo(tracefilename)
-                except KeyError:
-                    # No correlation curve, but add a None
-                    pass
-                else:
-                    tracefile = Arc.open(tracefilename, 'r')
-                    traceread = csv.reader(io.StringIO(
-                        tracefile.read().decode()), delimiter=',')
-                    singletrace = list()
-                    for row in traceread:
-                        # Exclude commentaries
-                        if (str(row[0])[0:1] != '#'):
-                            singletrace.append((float(row[0]), float(row[1])))
-                    singletrace = np.array(singletrace)
-                    thistrace.append(singletrace)
-                    del traceread
-                    del singletrace
-                    tracefile.close()
+            else:
+                Curvelist.append("AC")
+            thistrace = Infodict["Traces"].get(pageid) or []
             if len(thistrace) == 1:
                 Trace.append(thistrace[0])
             elif len(thistrace) == 2:
-                Trace.append(thistrace)
+                Trace.append(list(thistrace))
             else:
                 Trace.append(None)
+        if isinstance(Infodict["Correlations"], LazySessionData):
+            # Release the session file (external weights are not used)
+            Infodict["Correlations"].close()
     else:
         # We are not importing from a session but from a zip file with
         # probably a mix of all filetypes we know. This works
         # recursively (e.g. a zip file in a zipfile).
+        Arc = zipfile.ZipFile(path, mode='r')
         allfiles = Arc.namelist()
         # Extract data to temporary folder
         tempdir = pathlib.Path(tempfile.mkdtemp())
@@ -227,7 +306,7 @@ def openZIP(path, filename=None):
                 fnames = data["Filename"]
                 Filelist += [filename+"/"+fs for fs in fnames]
         shutil.rmtree(path=tempdir, ignore_errors=True)
-    Arc.close()
+        Arc.close()
     dictionary = {}
     dictionary["Correlation"] = Correlations
     dictionary["Trace"] = Trace
@@ -267,3 +346,35 @@ filetypes_bg_dict = {"Correlator.com (*.SIN)|*.SIN;*.sin": openSIN,
                      "PyCorrFit session (*.pcfs)|*.pcfs": openZIP
                      }
 add_all_supported_filetype_entry(filetypes_bg_dict)
+
+# Readers of the file extensions (see `register_filetype`)
+_extensions = get_extension_map(filetypes_dict)
+_extensions_bg = get_extension_map(filetypes_bg_dict)
+
+
+def register_filetype(wildcard, reader, background=False):
+    """Add a file format reader
+
+    Parameters
+    ----------
+    wildcard : str
+        Description and wildcards of the format as used in file
+        dialogs, e.g. "Correlator.com (*.SIN)|*.SIN;*.sin"
+    reader : callable
+        Function that opens a file (see e.g. `openCSV`)
+    background : bool
+        Whether the format contains intensity traces that may be
+        used for background correction (`filetypes_bg_dict`)
+    """
+    global _extensions, _extensions_bg
+    adicts = [filetypes_dict]
+    if background:
+        adicts.append(filetypes_bg_dict)
+    for adict in adicts:
+        for key in list(adict.keys()):
+            if key.startswith(ALL_SUP_STRING + "|"):
+                adict.pop(key)
+        adict[wildcard] = reader
+        add_all_supported_filetype_entry(adict)
+    _extensions = get_extension_map(filetypes_dict)
+    _extensions_bg = get_extension_map(filetypes_bg_dict)
@@ -0,0 +1,273 @@
+"""On-disk cache for parsed data files
+
+Importing and correlating large photon arrival time files (pt3/ptu)
+or long Zeiss .fcs files takes a long time. `ParsedFileCache` stores
+the dictionary returned by a reader in an uncompressed `.npz` file,
+so that opening the same file again only requires loading the arrays.
+"""
+import importlib
+from importlib.metadata import PackageNotFoundError, version
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+
+try:
+    _version = version("pycorrfit")
+except PackageNotFoundError:
+    _version = "unknown"
+
+
+#: classes (besides arrays and builtin types) that may be cached and
+#: their modules; the instances are restored from their `__dict__`
+CACHEABLE_CLASSES = {"TracePyramid": "pycorrfit.trace",
+                     "CorrelationSegments":
+                         "pycorrfit.readfiles.read_pt3_PicoQuant",
+                     }
+
+
+def get_cache_dir():
+    """Default directory of the parsed-file cache
+
+    The environment variable "PYCORRFIT_CACHE_DIR" takes precedence
+    over the user cache directory of the platform.
+    """
+    if os.environ.get("PYCORRFIT_CACHE_DIR"):
+        return pathlib.Path(os.environ["PYCORRFIT_CACHE_DIR"])
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA",
+                              pathlib.Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        base = pathlib.Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME",
+                              pathlib.Path.home() / ".cache")
+    return pathlib.Path(base) / "pycorrfit" / "parsed"
+
+
+class ParsedFileCache(object):
+    """Least-recently-used on-disk cache of parsed data files
+
+    The cache entries are keyed by the resolved path, size, and
+    modification time of the file, a hash of its content, the name
+    of the reader, the reader parameters, and the PyCorrFit version.
+    To keep lookups of large files fast, only the first and the
+    last `sample_size` bytes of the file are hashed.
+
+    Parameters
+    ----------
+    directory : str or pathlib.Path or None
+        Cache directory, defaults to `get_cache_dir()`
+    max_size : int
+        Maximum total size of the cache [bytes]. The least recently
+        used entries are removed when the cache grows larger.
+    sample_size : int
+        Number of bytes at the beginning and the end of a file that
+        are used for the content hash.
+    """
+
+    def __init__(self, directory=None, max_size=1024**3,
+                 sample_size=1024**2):
+        if directory is None:
+            directory = get_cache_dir()
+        self.directory = pathlib.Path(directory)
+        self.max_size = int(max_size)
+        self.sample_size = int(sample_size)
+
+    def __repr__(self):
+        return "ParsedFileCache('{}', max_size={})".format(self.directory,
+                                                          self.max_size)
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        return list(self.directory.glob("*.npz"))
+
+    @property
+    def size(self):
+        """Total size of the cache entries [bytes]"""
+        return sum(ff.stat().st_size for ff in self._entries())
+
+    def clear(self):
+        """Remove all cache entries"""
+        for ff in self._entries():
+            ff.unlink()
+
+    def evict(self):
+        """Remove least recently used entries beyond `max_size`"""
+        entries = []
+        for ff in self._entries():
+            try:
+                stat = ff.stat()
+            except OSError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, ff))
+        entries.sort()
+        total = sum(ee[1] for ee in entries)
+        for _mtime, size, ff in entries:
+            if total <= self.max_size:
+                break
+            try:
+                ff.unlink()
+            except OSError:
+                pass
+            total -= size
+
+    def get_key(self, path, reader, params=None):
+        """Cache key of the file `path` opened with `reader(**params)`"""
+        path = pathlib.Path(path).resolve()
+        stat = path.stat()
+        hasher = hashlib.sha256()
+        _hash_update(hasher, [str(path), stat.st_size, stat.st_mtime_ns,
+                              getattr(reader, "__module__", ""),
+                              getattr(reader, "__name__", str(reader)),
+                              params or {}, _version])
+        with path.open("rb") as fd:
+            hasher.update(fd.read(self.sample_size))
+            if stat.st_size > self.sample_size:
+                fd.seek(max(self.sample_size,
+                            stat.st_size - self.sample_size))
+                hasher.update(fd.read())
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """Return the cached dictionary for `key` or None"""
+        entry = self.directory / (key + ".npz")
+        try:
+            with np.load(entry, allow_pickle=False) as arc:
+                arrays = dict(arc.items())
+            manifest = json.loads(str(arrays.pop("manifest")))
+            data = _decode(manifest, arrays)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, ImportError, AttributeError,
+                EOFError, zipfile.BadZipFile):
+            # corrupt or stale cache entry (e.g. truncated file or
+            # a class that is not in `CACHEABLE_CLASSES` anymore)
+            entry.unlink(missing_ok=True)
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Store the dictionary `data` for `key`
+
+        Returns False if `data` contains objects that cannot be
+        cached (nothing is stored in that case).
+        """
+        arrays = {}
+        try:
+            manifest = _encode(data, arrays)
+        except TypeError:
+            return False
+        arrays["manifest"] = np.array(json.dumps(manifest))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that other processes
+        # never see incomplete entries.
+        fd, tmp = tempfile.mkstemp(suffix=".npz.tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as fobj:
+                np.savez(fobj, **arrays)
+            os.replace(tmp, self.directory / (key + ".npz"))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+        return True
+
+    def open(self, path, reader, **kwargs):
+        """Return `reader(path, **kwargs)`, using the cache if possible"""
+        key = self.get_key(path, reader, kwargs)
+        data = self.get(key)
+        if data is None:
+            data = reader(path, **kwargs)
+            if data is not None:
+                self.put(key, data)
+        return data
+
+
+def _hash_update(hasher, obj):
+    """Update `hasher` with a (nested) parameter object"""
+    if isinstance(obj, np.ndarray):
+        hasher.update("{}{}".format(obj.dtype, obj.shape).encode())
+        hasher.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        hasher.update(b"{")
+        for key in sorted(obj, key=str):
+            _hash_update(hasher, key)
+            _hash_update(hasher, obj[key])
+        hasher.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(b"[")
+        for item in obj:
+            _hash_update(hasher, item)
+        hasher.update(b"]")
+    else:
+        hasher.update(repr(obj).encode())
+
+
+def _encode(obj, arrays):
+    """Convert `obj` to a JSON-compatible manifest
+
+    Arrays are added to the dictionary `arrays` and referenced by
+    name. Raises TypeError for objects that cannot be cached.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    elif isinstance(obj, (np.ndarray, np.generic)):
+        arr = np.asarray(obj)
+        if arr.dtype.hasobject:
+            raise TypeError("Cannot cache object arrays!")
+        name = "a{}".format(len(arrays))
+        arrays[name] = arr
+        if isinstance(obj, np.generic):
+            return {"scalar": name}
+        return {"array": name}
+    elif isinstance(obj, list):
+        return [_encode(item, arrays) for item in obj]
+    elif isinstance(obj, tuple):
+        return {"tuple": [_encode(item, arrays) for item in obj]}
+    elif isinstance(obj, dict):
+        return {"dict": [[_encode(key, arrays), _encode(val, arrays)]
+                         for key, val in obj.items()]}
+    elif (CACHEABLE_CLASSES.get(obj.__class__.__name__)
+          == obj.__class__.__module__):
+        return {"object": obj.__class__.__name__,
+                "state": _encode(obj.__dict__, arrays)}
+    else:
+        raise TypeError("Cannot cache object of type {}!".format(type(obj)))
+
+
+def _decode(node, arrays):
+    """Inverse of `_encode`"""
+    if isinstance(node, list):
+        return [_decode(item, arrays) for item in node]
+    elif isinstance(node, dict):
+        if "array" in node:
+            return arrays[node["array"]]
+        elif "scalar" in node:
+            return arrays[node["scalar"]][()]
+        elif "tuple" in node:
+            return tuple(_decode(item, arrays) for item in node["tuple"])
+        elif "dict" in node:
+            return {_decode(key, arrays): _decode(val, arrays)
+                    for key, val in node["dict"]}
+        else:
+            module = importlib.import_module(
+                CACHEABLE_CLASSES[node["object"]])
+            cls = getattr(module, node["object"])
+            obj = cls.__new__(cls)
+            obj.__dict__.update(_decode(node["state"], arrays))
+            return obj
+    else:
+        return node
@@ -5,14 +5,19 @@ import warnings
 
 import numpy as np
 
+from . import util
+
 
 class LoadALVError(BaseException):
     pass
 
 
-def openASC(path, filename=None):
+def openASC(path, filename=None, trace_decimation="mean"):
     """
     Read data from a ALV .ASC files.
+
+    The traces are downsampled with the method `trace_decimation`
+    (see `util.downsample_trace`).
     """
     path = pathlib.Path(path)
     if filename is not None:
@@ -25,13 +30,13 @@ def openASC(path, filename=None):
     # Open special format?
     filetype = first.strip()
     if filetype.count("ALV-7004"):
-        return openASC_ALV_7004(path)
+        return openASC_ALV_7004(path, trace_decimation)
     else:
         # last resort
-        return openASC_old(path)
+        return openASC_old(path, trace_decimation)
 
 
-def openASC_old(path):
+def openASC_old(path, trace_decimation="mean"):
     """ Read data from a .ASC file, created by
         some ALV-6000 correlator.
 
@@ -113,36 +118,44 @@ def openASC_old(path):
     filename = path.name
     with path.open("r", encoding="iso8859_15") as openfile:
         Alldata = openfile.readlines()
+    # Find the sections in one pass
+    sections = util.find_sections(Alldata, {
+        "mode": lambda line: line.startswith('Mode'),
+        "correlation": lambda line: line.startswith('"Correlation'),
+        # takes care of "Count Rate" and "Countrate"
+        "countrate": lambda line: (line.replace(" ", "").lower().strip()
+                                   == '"countrate"'),
+        "monitor": lambda line: line.startswith('Monitor Diode'),
+    })
     # End of trace
     EndT = Alldata.__len__()
     # Correlation function
     # Find out where the correlation function is
-    for i in np.arange(len(Alldata)):
-        if Alldata[i].startswith('Mode'):
-            mode = Alldata[i][5:].strip(' ":').strip().strip('"')
-            single_strings = ["a-ch0", "a-ch1", "auto ch0", "auto ch1",
-                              "fast auto ch0", "fast auto ch1",
-                              ]
-            if (mode.lower().count('single') or
-                    mode.lower().strip() in single_strings):
-                single = True
-                channel = mode.split(" ")[-1]
-            else:
-                # dual
-                single = False
-            # accc ?
-            if mode.lower().count("cross") == 1:
-                accc = "CC"
-            else:
-                accc = "AC"
-        if Alldata[i].startswith('"Correlation'):
-            # This tells us if there is only one curve or if there are
-            # multiple curves with an average.
-            if (Alldata[i].strip().lower() ==
-                    '"correlation (multi, averaged)"'):
-                multidata = True
-            else:
-                multidata = False
+    for i in sections["mode"]:
+        mode = Alldata[i][5:].strip(' ":').strip().strip('"')
+        single_strings = ["a-ch0", "a-ch1", "auto ch0", "auto ch1",
+                          "fast auto ch0", "fast auto ch1",
+                          ]
+        if (mode.lower().count('single') or
+                mode.lower().strip() in single_strings):
+            single = True
+            channel = mode.split(" ")[-1]
+        else:
+            # dual
+            single = False
+        # accc ?
+        if mode.lower().count("cross") == 1:
+            accc = "CC"
+        else:
+            accc = "AC"
+    for i in sections["correlation"]:
+        # This tells us if there is only one curve or if there are
+        # multiple curves with an average.
+        if (Alldata[i].strip().lower() ==
+                '"correlation (multi, averaged)"'):
+            multidata = True
+        else:
+            multidata = False
         if Alldata[i].startswith('"Correlation"'):
             # Start of correlation function
             StartC = i+1
@@ -150,14 +163,13 @@ def openASC_old(path):
             # Start of AVERAGED correlation function !!!
             # There are several curves now.
             StartC = i+2
-        if Alldata[i].replace(" ", "").lower().strip() == '"countrate"':
-            # takes care of "Count Rate" and "Countrate"
-            # End of correlation function
-            EndC = i-1
-            # Start of trace (goes until end of file)
-            StartT = i+1
-        if Alldata[i].startswith('Monitor Diode'):
-            EndT = i-1
+    for i in sections["countrate"]:
+        # End of correlation function
+        EndC = i-1
+        # Start of trace (goes until end of file)
+        StartT = i+1
+    for i in sections["monitor"]:
+        EndT = i-1
     # Get the header
     Namedata = Alldata[StartC-1: StartC]
     # Define *curvelist*
@@ -173,48 +185,28 @@ def openASC_old(path):
         # Last column is empty
         curvelist.remove(curvelist[-1])
     # Correlation function
-    Truedata = Alldata[StartC: EndC]
-    readdata = csv.reader(Truedata, delimiter='\t')
-    # Add lists to *data* according to the length of *curvelist*
-    data = [[]]*len(curvelist)
-    # Work through the rows in the read data
-    for row in readdata:
-        for i in np.arange(len(curvelist)):
-            if len(row) > 0:
-                data[i].append((np.float64(row[0]), np.float64(row[i+1])))
+    # 1st column: lag time, then one column for each curve
+    corrdata = util.parse_numeric_block(Alldata[StartC: EndC])
+    data = [corrdata[:, [0, i+1]] for i in range(len(curvelist))]
     # Trace
     # Trace is stored in two columns
     # 1st column: time [s]
     # 2nd column: trace [kHz]
     # Get the trace
-    Tracedata = Alldata[StartT: EndT]
+    tracedata = util.parse_numeric_block(Alldata[StartT: EndT])
     timefactor = 1000  # because we want ms instead of s
-    readtrace = csv.reader(Tracedata, delimiter='\t')
-    trace = list()
-    trace2 = list()
-    # Work through the rows
-    for row in readtrace:
+    # time in ms, countrate
+    trace = np.zeros((tracedata.shape[0], 2))
+    trace[:, 0] = tracedata[:, 0]*timefactor
+    trace[:, 1] = tracedata[:, 1]
+    if not single:
+        k = len(curvelist)/2
+        if int(k) != k:
+            print("Problem with ALV data. Single mode not recognized.")
+        # presumably dual mode. There is a second trace
         # time in ms, countrate
-        trace.append(list())
-        trace[0].append((np.float64(row[0])*timefactor,
-                         np.float64(row[1])))
-        # Only trace[0] contains the trace!
-        for i in np.arange(len(curvelist)-1):
-            trace.append(list())
-            trace[i+1].append((np.float64(row[0])*timefactor, 0))
-        if not single:
-            k = len(curvelist)/2
-            if int(k) != k:
-                print("Problem with ALV data. Single mode not recognized.")
-            # presumably dual mode. There is a second trace
-            # time in ms, countrate
-            trace2.append(list())
-            trace2[0].append((np.float64(row[0])*timefactor,
-                              np.float64(row[2])))
-            # Only trace2[0] contains the trace!
-            for i in np.arange(len(curvelist)-1):
-                trace2.append(list())
-                trace2[i+1].append((np.float64(row[0])*timefactor, 0))
+        trace2 = trace.copy()
+        trace2[:, 1] = tracedata[:, 2]
 
     # group the resulting curves
     corrlist = list()
@@ -228,14 +220,14 @@ def openASC_old(path):
             nav = 1
         else:
             nav = 0
-        splittrace = mysplit(trace[0], len(curvelist)-nav)
+        splittrace = mysplit(trace, len(curvelist)-nav)
         i = 0
         for t in range(len(curvelist)):
             typ = curvelist[t]
             if typ.lower()[:7] == "average":
                 typelist.append("{} average".format(channel))
                 corrlist.append(np.array(data[t]))
-                tracelist.append(np.array(trace[0]))
+                tracelist.append(np.array(trace))
             else:
                 typelist.append("{} {}".format(accc, channel))
                 corrlist.append(np.array(data[t]))
@@ -256,14 +248,14 @@ def openASC_old(path):
         else:
             nav = 0
         channel = "CH0"
-        splittrace = mysplit(trace[0], len(curvelist)/2-nav)
+        splittrace = mysplit(trace, len(curvelist)/2-nav)
         i = 0
         for t in range(int(len(curvelist)/2)):
             typ = curvelist[t]
             if typ.lower()[:7] == "average":
                 typelist.append("{} average".format(channel))
                 corrlist.append(np.array(data[t]))
-                tracelist.append(np.array(trace[0]))
+                tracelist.append(np.array(trace))
             else:
                 typelist.append("{} {}".format(accc, channel))
                 corrlist.append(np.array(data[t]))
@@ -271,14 +263,14 @@ def openASC_old(path):
                 i += 1
         # CHANNEL 1
         channel = "CH1"
-        splittrace2 = mysplit(trace2[0], len(curvelist)/2-nav)
+        splittrace2 = mysplit(trace2, len(curvelist)/2-nav)
         i = 0
         for t in range(int(len(curvelist)/2), int(len(curvelist))):
             typ = curvelist[t]
             if typ.lower()[:7] == "average":
                 typelist.append("{} average".format(channel))
                 corrlist.append(np.array(data[t]))
-                tracelist.append(np.array(trace2[0]))
+                tracelist.append(np.array(trace2))
             else:
                 typelist.append("{} {}".format(accc, channel))
                 corrlist.append(np.array(data[t]))
@@ -291,16 +283,16 @@ def openASC_old(path):
             nav = 0
         # Dual mode, cross-correlation
         channel = "CC01"
-        splittrace = mysplit(trace[0], len(curvelist)/2-nav)
-        splittrace2 = mysplit(trace2[0], len(curvelist)/2-nav)
+        splittrace = mysplit(trace, len(curvelist)/2-nav)
+        splittrace2 = mysplit(trace2, len(curvelist)/2-nav)
         i = 0
         for t in range(int(len(curvelist)/2)):
             typ = curvelist[t]
             if typ.lower()[:7] == "average":
                 typelist.append("{} average".format(channel))
                 corrlist.append(np.array(data[t]))
-                tracelist.append([np.array(trace[0]),
-                                  np.array(trace2[0])])
+                tracelist.append([np.array(trace),
+                                  np.array(trace2)])
             else:
                 typelist.append("{} {}".format(accc, channel))
                 corrlist.append(np.array(data[t]))
@@ -315,8 +307,8 @@ def openASC_old(path):
                 typelist.append("{} average".format(channel))
                 corrlist.append(np.array(data[t]))
                 # order must be the same as above
-                tracelist.append([np.array(trace[0]),
-                                  np.array(trace2[0])])
+                tracelist.append([np.array(trace),
+                                  np.array(trace2)])
             else:
                 typelist.append("{} {}".format(accc, channel))
                 corrlist.append(np.array(data[t]))
@@ -329,6 +321,11 @@ def openASC_old(path):
         tracelist = np.array(trace)
         typelist = curvelist
 
+    if isinstance(tracelist, list):
+        # If the traces are too big, we need to bin them.
+        tracelist = util.downsample_traces(tracelist,
+                                           method=trace_decimation)
+
     dictionary = dict()
     dictionary["Correlation"] = corrlist
     dictionary["Trace"] = tracelist
@@ -341,7 +338,7 @@ def openASC_old(path):
     return dictionary
 
 
-def openASC_ALV_7004(path):
+def openASC_ALV_7004(path, trace_decimation="mean"):
     """
     Opens ALV file format with header information "ALV-7004/USB"
 
@@ -386,29 +383,24 @@ def openASC_ALV_7004(path):
     # Find the different arrays
     # correlation array: "  "
     # trace array: "       "
-    allcorr = []
-    alltrac = []
-    i = 0
-    intrace = False
+    sections = util.find_sections(Alldata, {
+        "countrate": lambda line: (line.lower().strip().strip('"')
+                                   == "count rate"),
+        "mode": lambda line: line.count("Mode"),
+        "data": lambda line: line.count("\t") == 4,
+    })
     mode = False
-    for item in Alldata:
-        if item.lower().strip().strip('"') == "count rate":
-            intrace = True
-            continue
-        elif item.count("Mode"):
-            mode = item.split(":")[1].strip().strip('" ').lower()
-        i += 1
-        if item.count("\t") == 4:
-            if intrace:
-                it = item.split("\t")
-                it = [float(t.strip()) for t in it]
-                alltrac.append(it)
-            else:
-                ic = item.split("\t")
-                ic = [float(c.strip()) for c in ic]
-                allcorr.append(ic)
-    allcorr = np.array(allcorr)
-    alltrac = np.array(alltrac)
+    for i in sections["mode"]:
+        mode = Alldata[i].split(":")[1].strip().strip('" ').lower()
+    # The trace follows the "Count Rate" line
+    if sections["countrate"]:
+        StartT = sections["countrate"][0]
+    else:
+        StartT = len(Alldata)
+    allcorr = util.parse_numeric_block(
+        [Alldata[i] for i in sections["data"] if i < StartT])
+    alltrac = util.parse_numeric_block(
+        [Alldata[i] for i in sections["data"] if i > StartT])
 
     tau = allcorr[:, 0]
     time = alltrac[:, 0] * 1000
@@ -522,6 +514,9 @@ def openASC_ALV_7004(path):
         msg = "ALV mode '{}' not implemented yet.".format(mode)
         raise NotImplementedError(msg)
 
+    # If the traces are too big, we need to bin them.
+    tracelist = util.downsample_traces(tracelist, method=trace_decimation)
+
     dictionary = dict()
     dictionary["Correlation"] = corrlist
     dictionary["Trace"] = tracelist
@@ -540,7 +535,7 @@ def mysplit(a, n):
         return [np.array(a)]
     a = np.array(a)
     N = len(a)
-    lensplit = np.int(np.ceil(N/n))
+    lensplit = int(np.ceil(N/n))
 
     # xp is actually rounded -> recalculate
     xp = np.linspace(a[:, 0][0], a[:, 0][-1], N,  endpoint=True)
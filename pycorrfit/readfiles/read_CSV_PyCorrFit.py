@@ -1,10 +1,11 @@
 """CSV files"""
-import csv
 import pathlib
 import warnings
 
 import numpy as np
 
+from . import util
+
 
 def openCSV(path, filename=None):
     """
@@ -70,79 +71,80 @@ def openCSV(path, filename=None):
         warnings.warn("Using `filename` is deprecated.", DeprecationWarning)
         path = path / filename
     filename = path.name
-    # Check if the file is correlation data
     with path.open("r", encoding='utf-8') as fd:
-        firstline = fd.readline()
-        if firstline.lower().count("this is not correlation data") > 0:
-            return None
+        Alldata = fd.readlines()
+    # Check if the file is correlation data
+    if Alldata and Alldata[0].lower().count("this is not correlation data"):
+        return None
 
     # Define what will happen to the file
     timefactor = 1000  # because we want ms instead of s
-    csvfile = path.open('r', encoding='utf-8')
-    readdata = csv.reader(csvfile, delimiter=',')
-    data = list()
     weights = list()
     weightname = "external"
     trace = None
     traceA = None
     DataType = "AC"  # May be changed
     numtraces = 0
-    prev_row = None
-    for row in readdata:
-        if len(row) == 0 or len(str(row[0]).strip()) == 0:
-            # Do nothing with empty/whitespace lines
+    sections = util.find_sections(Alldata, {
+        "type": lambda line: line[:12].lower() == "# Type AC/CC".lower(),
+        "trace": lambda line: line[:13].upper() == "# BEGIN TRACE",
+        "second": lambda line: line[:20].upper() == "# BEGIN SECOND TRACE",
+    })
+    for i in sections["type"]:
+        corrtype = Alldata[i].split(",")[0][12:].strip().strip(":").strip()
+        if corrtype[:17].lower() == "cross-correlation":
+            # We will later try to import a second trace
+            DataType = "CC"
+            DataType += corrtype[17:].strip()
+        elif corrtype[0:15].lower() == "autocorrelation":
+            DataType = "AC"
+            DataType += corrtype[15:].strip()
+
+    def get_data(start, stop):
+        """Parse the data lines (excluding commentaries)"""
+        lines = [line for line in Alldata[start:stop]
+                 if line.strip() and line[0] != "#"]
+        # As of version 0.7.8 we are supporting white space
+        # separated values as well
+        if lines and lines[0].count(","):
+            delimiter = ","
+            # ignore empty trailing columns
+            lines = [line.rstrip().rstrip(",") for line in lines]
+        else:
+            delimiter = None
+        return util.parse_numeric_block(lines, delimiter=delimiter)
+
+    StartT = StartT2 = len(Alldata)
+    if sections["trace"]:
+        # Correlation is over. We have a trace
+        StartT = sections["trace"][0]
+        numtraces = 1
+    if sections["second"]:
+        # First trace is over. We have a second trace
+        StartT2 = sections["second"][0]
+        numtraces = 2
+    corrdata = get_data(0, StartT)
+    if numtraces >= 1:
+        trace = get_data(StartT+1, StartT2)[:, :2]
+        trace[:, 0] *= timefactor
+    if numtraces == 2:
+        traceA = trace
+        trace = get_data(StartT2+1, len(Alldata))[:, :2]
+        trace[:, 0] *= timefactor
+    corr = corrdata[:, :2].copy()
+    corr[:, 0] *= timefactor
+    if corrdata.shape[1] == 5:
+        # this has to be correlation with weights
+        weights = corrdata[:, 4]
+        # the weight name is in the line preceding the data
+        first = [i for i, line in enumerate(Alldata[:StartT])
+                 if line.strip() and line[0] != "#"][0]
+        try:
+            weightname = "ext. " + \
+                Alldata[first-1].split(",")[0].split("Weights")[1].split(
+                    "[")[1].split("]")[0]
+        except:
             pass
-            # Beware that the len(row) statement has to be called first
-            # (before the len(str(row[0]).strip()) ). Otherwise some
-            # error would be raised.
-        elif str(row[0])[:12].lower() == "# Type AC/CC".lower():
-            corrtype = str(row[0])[12:].strip().strip(":").strip()
-            if corrtype[:17].lower() == "cross-correlation":
-                # We will later try to import a second trace
-                DataType = "CC"
-                DataType += corrtype[17:].strip()
-            elif corrtype[0:15].lower() == "autocorrelation":
-                DataType = "AC"
-                DataType += corrtype[15:].strip()
-        elif str(row[0])[0:13].upper() == '# BEGIN TRACE':
-            # Correlation is over. We have a trace
-            corr = np.array(data)
-            data = list()
-            numtraces = 1
-        elif str(row[0])[0:20].upper() == '# BEGIN SECOND TRACE':
-            # First trace is over. We have a second trace
-            traceA = np.array(data)
-            data = list()
-            numtraces = 2
-        # Exclude commentaries
-        elif str(row[0])[0:1] != '#':
-            # Read the 1st section
-            # On Windows we had problems importing nan values that
-            # had some white-spaces around them. Therefore: strip()
-            # As of version 0.7.8 we are supporting white space
-            # separated values as well
-            if len(row) == 1:
-                row = row[0].split()
-            data.append((np.float64(row[0].strip())*timefactor,
-                         np.float64(row[1].strip())))
-            if len(row) == 5:
-                # this has to be correlation with weights
-                weights.append(np.float64(row[4].strip()))
-                if weightname == "external":
-                    try:
-                        weightname = "ext. " + \
-                            prev_row[0].split("Weights")[1].split(
-                                "[")[1].split("]")[0]
-                    except:
-                        pass
-        prev_row = row
-    # Collect the rest of the trace, if there is any:
-    rest = np.array(data)
-    if numtraces == 0:
-        corr = rest
-    elif numtraces >= 1:
-        trace = rest
-    del data
     # Remove any NaN numbers from thearray
     # Explanation:
     # np.isnan(data)
@@ -155,7 +157,6 @@ def openCSV(path, filename=None):
     corr = corr[~np.isnan(corr).any(1)]
     # Also check for infinities.
     corr = corr[~np.isinf(corr).any(1)]
-    csvfile.close()
     Traces = list()
     # Set correct trace data for import
     if numtraces == 1 and DataType[:2] == "AC":
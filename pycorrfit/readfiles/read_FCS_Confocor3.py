@@ -1,5 +1,4 @@
 """Confocor .fcs files"""
-import csv
 import pathlib
 import warnings
 
@@ -8,7 +7,7 @@ import numpy as np
 from . import util
 
 
-def openFCS(path, filename=None):
+def openFCS(path, filename=None, trace_decimation="mean"):
     """
         Load data from Zeiss Confocor3
         Data is imported sequenially from the file.
@@ -22,7 +21,8 @@ def openFCS(path, filename=None):
         files created from the newer ZEN Software.
 
         This function is a wrapper combining *openFCS_Single* and
-        *openFCS_Multiple*
+        *openFCS_Multiple*. The traces are downsampled with the
+        method `trace_decimation` (see `util.downsample_trace`).
     """
     path = pathlib.Path(path)
     if filename is not None:
@@ -33,12 +33,12 @@ def openFCS(path, filename=None):
         identitystring = fd.readline().strip()[:20]
 
     if identitystring == "Carl Zeiss ConfoCor3":
-        return openFCS_Multiple(path)
+        return openFCS_Multiple(path, trace_decimation)
     else:
-        return openFCS_Single(path)
+        return openFCS_Single(path, trace_decimation)
 
 
-def openFCS_Multiple(path):
+def openFCS_Multiple(path, trace_decimation="mean"):
     """ Load data from Zeiss Confocor3
         Data is imported sequenially from the file.
         PyCorrFit will give each curve an id which corresponds to the
@@ -52,13 +52,6 @@ def openFCS_Multiple(path):
     # match curves with their timestamp
     # (actimelist and cctimelist)
     #
-    with path.open("r", encoding="iso8859_15") as fd:
-        Alldata = fd.readlines()
-    # Start progressing through the file. i is the line index.
-    # We are searching for "FcsDataSet" sections that contain
-    # all the information we want.
-    # index i for linenumber
-    i = 0
     # A parameter to check whether we are in a "FcsDataSet" section
     # and should import something
     fcsset = False
@@ -77,19 +70,22 @@ def openFCS_Multiple(path):
     # The names of the correlation channels
     channels = {}
     ac_count = 0
-    while i <= len(Alldata)-1:
-        if Alldata[i].count("FcsDataSet") == 1:
-            # We are in a "FcsDataSet" section
-            fcsset = True
-            gottrace = False
-        if fcsset == True:
-            # Check key-value
-            if Alldata[i].count("="):
-                current_key = Alldata[i].split("=")[0].strip()
-                current_value = Alldata[i].split("=")[1].strip()
-            else:
-                i = i + 1
+    # Start progressing through the file line by line. The data
+    # blocks are read and parsed as a whole, so that only one block
+    # is in memory at a time.
+    # We are searching for "FcsDataSet" sections that contain
+    # all the information we want.
+    with path.open("r", encoding="iso8859_15") as fd:
+        for line in fd:
+            if line.count("FcsDataSet") == 1:
+                # We are in a "FcsDataSet" section
+                fcsset = True
+                gottrace = False
+            if fcsset == False or line.count("=") == 0:
                 continue
+            # Check key-value
+            current_key = line.split("=")[0].strip()
+            current_value = line.split("=")[1].strip()
             # Extract data
             if current_key == "AcquisitionTime":
                 thistime = current_value
@@ -135,20 +131,16 @@ def openFCS_Multiple(path):
                 # the trace and import a lighter version of it.
                 tracelength = int(current_value.split()[0])
                 if tracelength != 0:
-                    tracedata = Alldata[i+1: i+tracelength+1]
-                    # Jump foward in the index
-                    i = i + tracelength
-                    readtrace = csv.reader(tracedata, delimiter='\t')
-
-                    trace = []
-                    for row in readtrace:
-                        # tau in ms, trace in kHz
-                        # So we need to put some factors here
-                        trace.append((np.float64(row[3])*1000,
-                                      np.float64(row[4])/1000))
-                    trace = np.array(trace)
+                    # The trace follows in the next lines.
+                    data = util.read_numeric_block(fd, tracelength)
+                    # tau in ms, trace in kHz
+                    # So we need to put some factors here
+                    trace = np.zeros((data.shape[0], 2))
+                    trace[:, 0] = data[:, 0]*1000
+                    trace[:, 1] = data[:, 1]/1000
                     # If the trace is too big. Wee need to bin it.
-                    newtrace = util.downsample_trace(trace)
+                    newtrace = util.downsample_trace(
+                        trace, method=trace_decimation)
                     # Finally add the trace to the list
                     traces.append(newtrace)
                     if FoundType[:2] != "AC":
@@ -165,19 +157,16 @@ def openFCS_Multiple(path):
                     if gottrace == False and FoundType[:2] == "AC":
                         # We think we know that there is no trace in CC curves
                         traces.append(None)
-                    corrdata = Alldata[i + 2: i + corrlength + 2]
-                    # Jump foward
-                    i = i + corrlength
-                    readcorr = csv.reader(corrdata, delimiter='\t')
-                    corr = []
-                    for row in readcorr:
-                        # tau in ms, corr-function
-                        corr.append((np.float64(row[3])*1000,
-                                     np.float64(row[4])-1))
+                    # The data follows after the "CorrelationArray" line.
+                    data = util.read_numeric_block(fd, corrlength, skip=1)
+                    # tau in ms, corr-function
+                    corr = np.zeros((data.shape[0], 2))
+                    corr[:, 0] = data[:, 0]*1000
+                    corr[:, 1] = data[:, 1]-1
                     if FoundType[:2] == "AC":
-                        ac_correlations.append(np.array(corr))
+                        ac_correlations.append(corr)
                     elif FoundType[:2] == "CC":
-                        cc_correlations.append(np.array(corr))
+                        cc_correlations.append(corr)
                 else:
                     # There is no correlation data in the file
                     # Fill in some dummy data. These will be removed.
@@ -193,7 +182,6 @@ def openFCS_Multiple(path):
                         cc_correlations.append(None)
                 # We reached the end of this "FcsDataSet" section.
                 fcsset = False
-        i = i + 1
     # We now have:
     #  aclist: a list of AC curve names mentioned in the file.
     #  cclist: a list of CC curve names mentioned in the file.
@@ -311,7 +299,7 @@ def openFCS_Multiple(path):
     return dictionary
 
 
-def openFCS_Single(path):
+def openFCS_Single(path, trace_decimation="mean"):
     """
         Load data from Zeiss Confocor3 files containing only one curve.
 
@@ -319,68 +307,55 @@ def openFCS_Single(path):
         files created from the newer ZEN Software.
     """
     filename = path.name
-    with path.open("r", encoding="iso8859_15") as fd:
-        Alldata = fd.readlines()
-    # Start progressing through the file. i is the line index.
-    # We are searching for "FcsDataSet" sections that contain
-    # all the information we want.
-    # index i for linenumber
-    i = 0
     # Indicates if trace or FCS curve should be imported in loop
     fcscurve = False
     tracecurve = False
-    while i <= len(Alldata)-1:
-        if Alldata[i].partition("=")[0].strip() == "##DATA TYPE":
-            # Find out what type of correlation curve we have.
-            # Might be interesting to the user.
-            Type = Alldata[i].partition("=")[2].strip()
-            if Type == "FCS Correlogram":
-                fcscurve = True
-                tracecurve = False
-            elif Type == "FCS Count Rates":
-                tracecurve = True
-                fcscurve = False
-            else:
-                raise SyntaxError("Unknown file syntax: "+Type)
-        i = i + 1
-        if tracecurve == True:
-            if Alldata[i].partition("=")[0].strip() == "##NPOINTS":
+    # Start progressing through the file line by line, the data
+    # blocks are read and parsed as a whole.
+    with path.open("r", encoding="iso8859_15") as fd:
+        for line in fd:
+            key, _, value = line.partition("=")
+            if key.strip() == "##DATA TYPE":
+                # Find out what type of correlation curve we have.
+                # Might be interesting to the user.
+                Type = value.strip()
+                if Type == "FCS Correlogram":
+                    fcscurve = True
+                    tracecurve = False
+                elif Type == "FCS Count Rates":
+                    tracecurve = True
+                    fcscurve = False
+                else:
+                    raise SyntaxError("Unknown file syntax: "+Type)
+            elif key.strip() == "##NPOINTS" and tracecurve == True:
                 # Start importing the trace. This is a little difficult, since
                 # traces in those files are usually very large. We will bin
                 # the trace and import a lighter version of it.
-                tracelength = int(Alldata[i].partition("=")[2].strip())
-                # Trace starts 3 lines after this.
-                i = i + 3
+                tracelength = int(value.strip())
                 if tracelength != 0:
-                    tracedata = Alldata.__getslice__(i, i+tracelength)
-                    # Jump foward in the index
-                    i = i + tracelength
-                    readtrace = csv.reader(tracedata, delimiter=',')
-                    trace = []
-                    for row in readtrace:
-                        # tau in ms, trace in kHz
-                        # So we need to put some factors here
-                        trace.append(
-                            (np.float64(row[0])*1000, np.float64(row[1])))
-                    trace = np.array(trace)
+                    # Trace starts 3 lines after this.
+                    data = util.read_numeric_block(fd, tracelength,
+                                                   delimiter=",", skip=2)
+                    # tau in ms, trace in kHz
+                    # So we need to put some factors here
+                    trace = np.zeros((data.shape[0], 2))
+                    trace[:, 0] = data[:, 0]*1000
+                    trace[:, 1] = data[:, 1]
                     # If the trace is too big. Wee need to bin it.
-                    newtrace = util.downsample_trace(trace)
+                    newtrace = util.downsample_trace(
+                        trace, method=trace_decimation)
                 tracecurve = False
-        if fcscurve == True:
-            if Alldata[i].partition("=")[0].strip() == "##NPOINTS":
+            elif key.strip() == "##NPOINTS" and fcscurve == True:
                 # Get the correlation information
-                corrlength = int(Alldata[i].partition("=")[2].strip())
-                i = i + 2
+                corrlength = int(value.strip())
                 if corrlength != 0:
-                    corrdata = Alldata.__getslice__(i, i+corrlength)
-                    # Jump foward
-                    i = i + corrlength
-                    readcorr = csv.reader(corrdata, delimiter=',')
-                    corr = []
-                    for row in readcorr:
-                        # tau in ms, corr-function
-                        corr.append((np.float64(row[0]), np.float64(row[1])-1))
-                    corr = np.array(corr)
+                    # Correlation starts 2 lines after this.
+                    data = util.read_numeric_block(fd, corrlength,
+                                                   delimiter=",", skip=1)
+                    # tau in ms, corr-function
+                    corr = np.zeros((data.shape[0], 2))
+                    corr[:, 0] = data[:, 0]
+                    corr[:, 1] = data[:, 1]-1
                 fcscurve = False
 
     # Check for correlation at lag-time zero, which lead to a bug (#64)
@@ -1,17 +1,22 @@
 """correlator.com .sin files"""
-import csv
 import pathlib
 import warnings
 
 import numpy as np
 
+from . import util
+
 
 class OpenSINError(BaseException):
     pass
 
 
-def openSIN(path, filename=None):
-    """Parse .sin files (correlator.com)"""
+def openSIN(path, filename=None, trace_decimation="mean"):
+    """Parse .sin files (correlator.com)
+
+    The traces are downsampled with the method `trace_decimation`
+    (see `util.downsample_trace`).
+    """
     path = pathlib.Path(path)
     if filename is not None:
         warnings.warn("Using `filename` is deprecated.", DeprecationWarning)
@@ -31,12 +36,12 @@ def openSIN(path, filename=None):
             # consists of single characters separated
             # by empty spaces, then we have integer mode.
             if len(mode) - np.sum([len(m) for m in mode]) == 0:
-                return openSIN_integer_mode(path)
+                return openSIN_integer_mode(path, trace_decimation)
             else:
-                return openSIN_old(path)
+                return openSIN_old(path, trace_decimation)
 
 
-def openSIN_integer_mode(path):
+def openSIN_integer_mode(path, trace_decimation="mean"):
     """Integer mode file format of e.g. flex03lq-1 correlator (correlator.com)
 
     This is a file format where the type (AC/CC) of the curve is
@@ -64,30 +69,23 @@ def openSIN_integer_mode(path):
                 msg = "mode must be multiples of two: {}".format(path)
                 raise OpenSINError(msg)
 
-    # build up the lists
-    corr_func = []
-    intensity = []
-    section = ""
-
-    # loop through lines
-    for line in data:
-        line = line.strip().lower()
-        if line.startswith("["):
-            section = line
-            continue
-        elif (len(line) == 0 or
-              line.count("=")):
-            continue
-
-        if section.count("[correlationfunction]"):
-            corr_func.append(line.split())
-        elif section.count("[intensityhistory]"):
-            intensity.append(line.split())
+    # find the sections "[...]"
+    starts = util.find_sections(
+        data, {"section": lambda line: line.strip().startswith("[")}
+    )["section"]
+    blocks = {}
+    for start, stop in zip(starts, starts[1:] + [len(data)]):
+        section = data[start].strip().lower()
+        # skip parameters (e.g. "TraceNumber= 300")
+        blocks[section] = [line for line in data[start+1:stop]
+                           if not line.count("=")]
 
     # corr_func now contains lag time, and correlations according
     # to the mode parameters.
-    corr_func = np.array(corr_func, dtype=float)
-    intensity = np.array(intensity, dtype=float)
+    corr_func = util.parse_numeric_block(
+        blocks.get("[correlationfunction]", []))
+    intensity = util.parse_numeric_block(
+        blocks.get("[intensityhistory]", []))
 
     timefactor = 1000  # because we want ms instead of s
     timedivfac = 1000  # because we want kHz instead of Hz
@@ -134,6 +132,9 @@ def openSIN_integer_mode(path):
         corr[:, 1] = corr_func[:, ii+1]
         correlations.append(corr)
 
+    # If the traces are too big, we need to bin them.
+    traces = util.downsample_traces(traces, method=trace_decimation)
+
     dictionary = {}
     dictionary["Correlation"] = correlations
     dictionary["Trace"] = traces
@@ -145,7 +146,7 @@ def openSIN_integer_mode(path):
     return dictionary
 
 
-def openSIN_old(path):
+def openSIN_old(path, trace_decimation="mean"):
     """Parses the simple sin file format (correlator.com)
 
     Read data from a .SIN file, usually created by
@@ -255,136 +256,75 @@ def openSIN_old(path):
     correlations = []
     traces = []
     # Get the correlation function
-    Truedata = Alldata[StartC:EndC]
+    corrdata = util.parse_numeric_block(Alldata[StartC:EndC])
     timefactor = 1000  # because we want ms instead of s
-    readcorr = csv.reader(Truedata, delimiter='\t')
     # Trace
     # Trace is stored in three columns
     # 1st column: time [s]
     # 2nd column: trace [Hz]
     # 3rd column: trace [Hz] - Single Auto: equivalent to 2nd
     # Get the trace
-    Tracedata = Alldata[StartT:EndT]
+    tracedata = util.parse_numeric_block(Alldata[StartT:EndT])
     # timefactor = 1000 # because we want ms instead of s
     timedivfac = 1000  # because we want kHz instead of Hz
-    readtrace = csv.reader(Tracedata, delimiter='\t')
+
+    def get_corr(column):
+        # tau in ms, corr-function minus "1"
+        corr = np.zeros((corrdata.shape[0], 2))
+        corr[:, 0] = corrdata[:, 0]*timefactor
+        corr[:, 1] = corrdata[:, column]-1
+        return corr
+
+    def get_trace(column):
+        # time in ms, count rate in kHz
+        trace = np.zeros((tracedata.shape[0], 2))
+        trace[:, 0] = tracedata[:, 0]*timefactor
+        trace[:, 1] = tracedata[:, column]/timedivfac
+        return trace
+
     # Process all Data:
     if Mode == "Single Auto":
         curvelist.append("AC")
-        corrdata = []
-        for row in readcorr:
-            # tau in ms, corr-function minus "1"
-            corrdata.append(
-                (np.float64(row[0])*timefactor, np.float64(row[1])-1))
-        correlations.append(np.array(corrdata))
-        trace = []
-        for row in readtrace:
-            # tau in ms, corr-function minus "1"
-            trace.append((np.float64(row[0])*timefactor,
-                          np.float64(row[1])/timedivfac))
-        traces.append(np.array(trace))
+        correlations.append(get_corr(1))
+        traces.append(get_trace(1))
     elif Mode == "Single Cross":
         curvelist.append("CC")
-        corrdata = []
-        for row in readcorr:
-            # tau in ms, corr-function minus "1"
-            corrdata.append(
-                (np.float64(row[0])*timefactor, np.float64(row[1])-1))
-        correlations.append(np.array(corrdata))
-        trace1 = []
-        trace2 = []
-        for row in readtrace:
-            # tau in ms, corr-function minus "1"
-            trace1.append((np.float64(row[0])*timefactor,
-                           np.float64(row[1])/timedivfac))
-            trace2.append((np.float64(row[0])*timefactor,
-                           np.float64(row[2])/timedivfac))
-        traces.append([np.array(trace1), np.array(trace2)])
+        correlations.append(get_corr(1))
+        traces.append([get_trace(1), get_trace(2)])
     elif Mode == "Dual Auto":
         curvelist.append("AC1")
         curvelist.append("AC2")
-        corrdata1 = []
-        corrdata2 = []
-        for row in readcorr:
-            # tau in ms, corr-function minus "1"
-            corrdata1.append(
-                (np.float64(row[0])*timefactor, np.float64(row[1])-1))
-            corrdata2.append(
-                (np.float64(row[0])*timefactor, np.float64(row[2])-1))
-        correlations.append(np.array(corrdata1))
-        correlations.append(np.array(corrdata2))
-        trace1 = []
-        trace2 = []
-        for row in readtrace:
-            # tau in ms, corr-function minus "1"
-            trace1.append((np.float64(row[0])*timefactor,
-                           np.float64(row[1])/timedivfac))
-            trace2.append((np.float64(row[0])*timefactor,
-                           np.float64(row[2])/timedivfac))
-        traces.append(np.array(trace1))
-        traces.append(np.array(trace2))
+        correlations.append(get_corr(1))
+        correlations.append(get_corr(2))
+        traces.append(get_trace(1))
+        traces.append(get_trace(2))
     elif Mode == "Dual Cross":
         curvelist.append("CC12")
         curvelist.append("CC21")
-        corrdata1 = []
-        corrdata2 = []
-        for row in readcorr:
-            # tau in ms, corr-function minus "1"
-            corrdata1.append(
-                (np.float64(row[0])*timefactor, np.float64(row[1])-1))
-            corrdata2.append(
-                (np.float64(row[0])*timefactor, np.float64(row[2])-1))
-        correlations.append(np.array(corrdata1))
-        correlations.append(np.array(corrdata2))
-        trace1 = []
-        trace2 = []
-        for row in readtrace:
-            # tau in ms, corr-function minus "1"
-            trace1.append((np.float64(row[0])*timefactor,
-                           np.float64(row[1])/timedivfac))
-            trace2.append((np.float64(row[0])*timefactor,
-                           np.float64(row[2])/timedivfac))
-        traces.append([np.array(trace1), np.array(trace2)])
-        traces.append([np.array(trace1), np.array(trace2)])
+        correlations.append(get_corr(1))
+        correlations.append(get_corr(2))
+        traces.append([get_trace(1), get_trace(2)])
+        traces.append([get_trace(1), get_trace(2)])
     elif Mode == "Quad":
         curvelist.append("AC1")
         curvelist.append("AC2")
         curvelist.append("CC12")
         curvelist.append("CC21")
-        corrdata1 = []
-        corrdata2 = []
-        corrdata12 = []
-        corrdata21 = []
-        for row in readcorr:
-            # tau in ms, corr-function minus "1"
-            corrdata1.append(
-                (np.float64(row[0])*timefactor, np.float64(row[1])-1))
-            corrdata2.append(
-                (np.float64(row[0])*timefactor, np.float64(row[2])-1))
-            corrdata12.append(
-                (np.float64(row[0])*timefactor, np.float64(row[3])-1))
-            corrdata21.append(
-                (np.float64(row[0])*timefactor, np.float64(row[4])-1))
-        correlations.append(np.array(corrdata1))
-        correlations.append(np.array(corrdata2))
-        correlations.append(np.array(corrdata12))
-        correlations.append(np.array(corrdata21))
-        trace1 = []
-        trace2 = []
-        for row in readtrace:
-            # tau in ms, corr-function minus "1"
-            trace1.append((np.float64(row[0])*timefactor,
-                           np.float64(row[1])/timedivfac))
-            trace2.append((np.float64(row[0])*timefactor,
-                           np.float64(row[2])/timedivfac))
-        traces.append(np.array(trace1))
-        traces.append(np.array(trace2))
-        traces.append([np.array(trace1), np.array(trace2)])
-        traces.append([np.array(trace1), np.array(trace2)])
+        correlations.append(get_corr(1))
+        correlations.append(get_corr(2))
+        correlations.append(get_corr(3))
+        correlations.append(get_corr(4))
+        traces.append(get_trace(1))
+        traces.append(get_trace(2))
+        traces.append([get_trace(1), get_trace(2)])
+        traces.append([get_trace(1), get_trace(2)])
     else:
-        raise NotImplemented(
-            "'Mode' type '{}' in {} not supported by this method!".
-            Mode, format(path))
+        raise NotImplementedError(
+            "'Mode' type '{}' in {} not supported by this method!".format(
+                Mode, path))
+
+    # If the traces are too big, we need to bin them.
+    traces = util.downsample_traces(traces, method=trace_decimation)
 
     dictionary = {}
     dictionary["Correlation"] = correlations
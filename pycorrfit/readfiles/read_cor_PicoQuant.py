@@ -1,10 +1,11 @@
 """PicoQuant .cor files"""
-import csv
 import pathlib
 import warnings
 
 import numpy as np
 
+from . import util
+
 
 class LoadCORError(BaseException):
     pass
@@ -68,19 +69,19 @@ def openCOR(path, filename=None):
 
     s_to_ms = 1000  # cor provides seconds, we want ms
 
-    corfile = path.open('r', encoding='utf-8')
-    header = list()
-    for line in corfile:
-        header.append(line.strip())
-        if header[-1] == '':
-            break
+    with path.open('r', encoding='utf-8') as corfile:
+        header = list()
+        for line in corfile:
+            header.append(line.strip())
+            if header[-1] == '':
+                break
 
-    if header[0] != 'TTTR Correlator Export':
-        raise ValueError(
-            f'Error while reading {path.name}. Expected the first line to be "TTTR Correlator Export"')
+        if header[0] != 'TTTR Correlator Export':
+            raise ValueError(
+                f'Error while reading {path.name}. Expected the first line to be "TTTR Correlator Export"')
 
-    data_header = next(corfile).split()
-    data = np.loadtxt(corfile)
+        data_header = next(corfile).split()
+        data = util.parse_numeric_block(corfile.readlines())
 
     tau = data[:, get_header_index(data_header, 'tau/s')]*s_to_ms
     correlation_names = ['G(A,A)', 'G(A,B)', 'G(B,B)']
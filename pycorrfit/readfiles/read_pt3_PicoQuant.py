@@ -8,6 +8,7 @@ import warnings
 
 import numpy as np
 
+from ..trace import TracePyramid
 from .read_pt3_scripts.correlation_objects import picoObject
 from . import util
 
@@ -23,14 +24,142 @@ class ParameterClass():
         self.colors = ['blue', 'green', 'red',
                        'cyan', 'magenta', 'yellow', 'black']
         self.numOfLoaded = 0
+        # Correlator cascades: lags 1 to Nsub*(2**NcascEnd-1) ns
+        # with Nsub lags per cascade (octave)
         self.NcascStart = 0
         self.NcascEnd = 25
         self.Nsub = 6
+        # Range of the lag times [ms] (None: automatic)
+        self.minLag = None
+        self.maxLag = None
+        # Without maxLag, cascades whose lags start beyond this
+        # fraction of the measurement duration are skipped
+        # (None: only cascades beyond the duration are skipped).
+        self.maxLagFraction = None
         self.winInt = 10
         self.photonCountBin = 25
+        # Number of records imported and correlated at once
+        # (None imports the whole file)
+        self.chunkSize = None
+        # Number of processes for the correlation (1 is serial)
+        self.nWorkers = 1
+        # Correlated (detector channel, micro time gate) pairs
+        # (None correlates all detector channels)
+        self.virtualChannels = None
+        # Length of the correlation segments [ns] (None: no segments)
+        self.segmentLength = None
 
 
-def getTrace(picoObject, number):
+class CorrelationSegments(object):
+    """Correlation curve from the sums of consecutive time segments
+
+    The correlator stores the (not normalized) correlation sums and
+    photon counts of each time segment. Segments disturbed by e.g.
+    aggregates or bleaching can be excluded and the correlation of
+    the remaining segments is computed without correlating the
+    photons again.
+    """
+
+    def __init__(self, segments, ch1, ch2):
+        """
+        Parameters
+        ----------
+        segments: dict
+            Segment data of a `picoObject` (`tttr2xfcsSegments.segments`
+            with the normalization time "maxY")
+        ch1, ch2: int
+            The indices of the correlated channels
+        """
+        self.auto = segments["auto"][:, :, ch1, ch2]
+        self.count1 = segments["counts"][:, ch1]
+        self.count2 = segments["counts"][:, ch2]
+        self.duration = np.array(segments["duration"], dtype=float)
+        self.start = np.array(segments["start"], dtype=float)
+        # lag times [ns]
+        self.lag = np.array(segments["autotime"], dtype=float)
+        self.dt = float(segments["dt"])
+        self.maxy = float(segments["maxY"])
+
+    def __len__(self):
+        return self.auto.shape[0]
+
+    @property
+    def lag_time(self):
+        """Lag times [ms]"""
+        return self.lag / 1000000
+
+    @property
+    def segment_start(self):
+        """Start times of the segments [ms]"""
+        return self.start / 1000000
+
+    @property
+    def segment_duration(self):
+        """Durations of the segments [ms]"""
+        return self.duration / 1000000
+
+    def _included(self, exclude):
+        incl = np.ones(len(self), dtype=bool)
+        if exclude is not None:
+            incl[np.asarray(exclude, dtype=int)] = False
+        if not np.any(incl):
+            raise ValueError("Cannot exclude all segments!")
+        return incl
+
+    def correlation(self, exclude=None):
+        """Correlation curve (lag time [ms], G) of the included segments
+
+        Parameters
+        ----------
+        exclude: list of int
+            Indices of the segments that are excluded
+
+        Without excluded segments, this is the correlation of the
+        complete measurement.
+        """
+        incl = self._included(exclude)
+        excluded = np.sum(self.duration[~incl])
+        dt = self.dt - excluded
+        maxy = self.maxy - excluded
+        auto = np.sum(self.auto[incl], axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            auto = auto*dt/(dt-self.lag)
+            corr = (auto*maxy)/(np.sum(self.count1[incl])
+                                * np.sum(self.count2[incl]))-1
+        corr[self.lag >= dt] = 0
+        return np.hstack((self.lag_time.reshape(-1, 1),
+                          corr.reshape(-1, 1)))
+
+    def segment_correlation(self):
+        """Correlation (S, L) of each segment
+
+        Lag times that exceed the duration of a segment and segments
+        without photons are NaN.
+        """
+        dur = self.duration.reshape(-1, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = self.auto*dur/(dur-self.lag)*dur \
+                / (self.count1*self.count2).reshape(-1, 1) - 1
+        corr[(dur <= self.lag) | ~np.isfinite(corr)] = np.nan
+        return corr
+
+    def standard_error(self, exclude=None):
+        """Standard error of the mean of the segment correlations
+
+        Can be used as fit weights (`Correlation.set_weights`).
+        Lag times that are defined in less than two segments
+        have zero weight (not used for fitting).
+        """
+        corr = self.segment_correlation()[self._included(exclude)]
+        num = np.sum(np.isfinite(corr), axis=0)
+        sem = np.zeros(corr.shape[1])
+        valid = num > 1
+        sem[valid] = np.nanstd(corr[:, valid], axis=0, ddof=1) \
+            / np.sqrt(num[valid])
+        return sem
+
+
+def getTrace(picoObject, number, method="mean"):
     """
     Extracts trace `number` from a `picoObject`.
 
@@ -39,7 +168,9 @@ def getTrace(picoObject, number):
     picoObject: instance of picoObject
         The data retreived from a pt3 file
     number:
-        The id of the trace, can be 1 or 2.
+        The id of the trace, from 1 to the number of channels.
+    method: str
+        Decimation method of the trace (see `util.downsample_trace`)
     """
 
     attrint = "timeSeries{}".format(number)
@@ -57,16 +188,97 @@ def getTrace(picoObject, number):
     trace[:, 1] = intensity / deltat  # kHz
 
     # If the trace is too big. Wee need to bin it.
-    newtrace = util.downsample_trace(trace)
+    newtrace = util.downsample_trace(trace, method=method)
 
     return newtrace
 
 
-def openPT3(path, filename=None):
+def getTracePyramid(picoObject, number):
+    """
+    Multi-resolution trace `number` of a `picoObject`.
+
+    The pyramid keeps the full resolution of the photon counts
+    (bins of `photonCountBin`) that is lost in `getTrace`.
+
+    Parameters
+    ----------
+    picoObject: instance of picoObject
+        The data retreived from a pt3 file
+    number:
+        The id of the trace, from 1 to the number of channels.
+    """
+    counts = getattr(picoObject, "timeSeries{}".format(number))
+    return TracePyramid(counts, picoObject.photonCountBin)
+
+
+def openPT3(path, filename=None, chunk_size=None, n_workers=1,
+            virtual_channels=None, segment_length=None, min_lag=None,
+            max_lag=None, points_per_octave=6, trace_bin=None,
+            trace_decimation="mean", max_lag_fraction=None):
     """ Retreive correlation curves from PicoQuant data files 
 
     This function is a wrapper around the PicoQuant capability of
-    FCS_Viewer by Dominic Waithe.
+    FCS_Viewer by Dominic Waithe. All detector channels are
+    correlated in one pass; the curves are returned as "AC0" to
+    "ACn" (autocorrelation of channel i) and "CCij" (cross-correlation
+    of channel i with channel j), numbered in the order of the
+    detector channels in the file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the .pt3 or .ptu file
+    filename : str
+        The name of the file if not given in path (deprecated).
+    chunk_size : int or None
+        If set, the photon records are imported and correlated in
+        blocks of `chunk_size` records, which limits the memory
+        usage for long measurements. The result is identical to
+        importing the whole file at once (default).
+    n_workers : int
+        Number of processes used for correlating the photon
+        arrival times. The lags of the correlator cascades are
+        distributed across a process pool; the photon arrays are
+        shared via shared memory. The result is identical to the
+        serial computation (default, ``n_workers=1``). Ignored if
+        `chunk_size` is set.
+    virtual_channels : list of tuples or None
+        Correlate virtual channels instead of the detector channels.
+        Each entry is a tuple ``(channel, gate)`` of the detector
+        channel number (as stored in the file) and a micro time gate,
+        which is either None (all photons), a TCSPC bin window
+        ``(start, stop)`` for pulsed interleaved excitation (PIE), or
+        a 1D array of filter weights for each TCSPC bin (FLCS). All
+        curves "ACi" and "CCij" then refer to the index `i` in this
+        list and are computed in one pass.
+    segment_length : float or None
+        If set, the correlation sums of consecutive segments of
+        `segment_length` seconds are kept. The returned dictionary
+        then contains a `CorrelationSegments` instance for each curve
+        (key "Segments"), which allows to exclude segments, and the
+        standard error of the segment correlations as fit weights
+        (keys "Weight" and "Weight Name").
+    min_lag, max_lag : float or None
+        Range of the lag times [ms]. Only the correlator cascades
+        required for this range are computed. By default, the lag
+        times start at 1 ns and the cascades whose lag times exceed
+        the measurement duration are skipped.
+    max_lag_fraction : float or None
+        If set and `max_lag` is not given, the cascades whose lag
+        times exceed this fraction of the measurement duration are
+        skipped as well (e.g. 0.1 for a tenth of the duration).
+    points_per_octave : int
+        Number of lag times per cascade of the multiple-tau
+        correlator, i.e. per doubling of the lag time.
+    trace_bin : float or None
+        Time bin of the intensity traces [ms], by default 25 ms.
+        The traces (key "Trace") are downsampled to about 500
+        points; the full resolution is kept in a `TracePyramid`
+        for each trace (key "Trace Pyramid").
+    trace_decimation : str
+        Method for downsampling the traces (see
+        `util.downsample_trace`): "mean" (default), "minmax" (keeps
+        spikes visible), or "lttb".
     """
     path = pathlib.Path(path)
     if filename is not None:
@@ -75,6 +287,23 @@ def openPT3(path, filename=None):
     filename = path.name
 
     par_obj = ParameterClass()
+    par_obj.chunkSize = chunk_size
+    par_obj.nWorkers = n_workers
+    par_obj.virtualChannels = virtual_channels
+    if int(points_per_octave) < 1:
+        raise ValueError("`points_per_octave` must be at least 1, "
+                         "got {}!".format(points_per_octave))
+    par_obj.Nsub = int(points_per_octave)
+    par_obj.minLag = min_lag
+    par_obj.maxLag = max_lag
+    par_obj.maxLagFraction = max_lag_fraction
+    if trace_bin is not None:
+        if trace_bin <= 0:
+            raise ValueError("`trace_bin` must be positive, "
+                             "got {}!".format(trace_bin))
+        par_obj.photonCountBin = trace_bin
+    if segment_length is not None:
+        par_obj.segmentLength = int(np.round(segment_length*1e9))
 
     pt3file = picoObject(str(path), par_obj, None)
 
@@ -87,51 +316,58 @@ def openPT3(path, filename=None):
     corrlist = list()
     typelist = list()
     tracelist = list()
+    pyramidlist = list()
+    segmentlist = list()
     # Some data points are zero for some reason
     id1 = np.where(autotime != 0)
 
-    # AC0 - autocorrelation CH0
-    corrac0 = auto[:, 0, 0]
-    if np.sum(np.abs(corrac0[id1])) != 0:
-        typelist.append("AC0")
-        # autotime,auto[:,0,0]
-        corrlist.append(np.hstack((autotime[id1].reshape(-1, 1),
-                                   corrac0[id1].reshape(-1, 1))))
-        tracelist.append([getTrace(po, 1)])
-
-    # AC1 - autocorrelation CH1
-    corrac1 = auto[:, 1, 1]
-    if np.sum(np.abs(corrac1[id1])) != 0:
-        typelist.append("AC1")
-        # autotime,auto[:,1,1]
-        corrlist.append(np.hstack((autotime[id1].reshape(-1, 1),
-                                   corrac1[id1].reshape(-1, 1))))
-        tracelist.append([getTrace(po, 2)])
-
-    # CC01 - Cross-Correlation CH0-CH1
-    corrcc01 = auto[:, 0, 1]
-    if np.sum(np.abs(corrcc01[id1])) != 0:
-        typelist.append("CC01")
-        # autotime,auto[:,0,1]
-        corrlist.append(np.hstack((autotime[id1].reshape(-1, 1),
-                                   corrcc01[id1].reshape(-1, 1))))
-        tracelist.append([getTrace(po, 1), getTrace(po, 2)])
-
-    # CC10 - Cross-Correlation CH1-CH0
-    corrcc10 = auto[:, 1, 0]
-    if np.sum(np.abs(corrcc10[id1])) != 0:
-        typelist.append("CC10")
-        # autotime,auto[:,1,0]
+    # ACi - autocorrelation of channel i, followed by
+    # CCij - Cross-Correlation of channel i with channel j
+    numch = auto.shape[1]
+    pyramids = dict()
+
+    def pyramid(ii):
+        if ii not in pyramids:
+            pyramids[ii] = getTracePyramid(po, ii+1)
+        return pyramids[ii]
+
+    pairs = [(ii, ii) for ii in range(numch)]
+    pairs += [(ii, jj) for ii in range(numch) for jj in range(numch)
+              if ii != jj]
+    for ii, jj in pairs:
+        corr = auto[:, ii, jj]
+        if np.sum(np.abs(corr[id1])) == 0:
+            continue
+        if ii == jj:
+            typelist.append("AC{}".format(ii))
+            tracelist.append([getTrace(po, ii+1, trace_decimation)])
+            pyramidlist.append([pyramid(ii)])
+        else:
+            typelist.append("CC{}{}".format(ii, jj))
+            # traces in the order of the channels
+            tracelist.append([
+                getTrace(po, min(ii, jj)+1, trace_decimation),
+                getTrace(po, max(ii, jj)+1, trace_decimation)])
+            pyramidlist.append([pyramid(min(ii, jj)),
+                                pyramid(max(ii, jj))])
+        # autotime,auto[:,i,j]
         corrlist.append(np.hstack((autotime[id1].reshape(-1, 1),
-                                   corrcc10[id1].reshape(-1, 1))))
-        tracelist.append([getTrace(po, 1), getTrace(po, 2)])
+                                   corr[id1].reshape(-1, 1))))
+        if po.segments is not None:
+            segmentlist.append(CorrelationSegments(po.segments, ii, jj))
 
     filelist = [filename] * len(typelist)
 
     dictionary = dict()
     dictionary["Correlation"] = corrlist
     dictionary["Trace"] = tracelist
+    dictionary["Trace Pyramid"] = pyramidlist
     dictionary["Type"] = typelist
     dictionary["Filename"] = filelist
+    if segmentlist:
+        dictionary["Segments"] = segmentlist
+        dictionary["Weight"] = [seg.standard_error()[id1]
+                                for seg in segmentlist]
+        dictionary["Weight Name"] = ["segments"] * len(segmentlist)
 
     return dictionary
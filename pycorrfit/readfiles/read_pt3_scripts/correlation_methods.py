@@ -1,4 +1,9 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np
+from . import fib4
 from .fib4 import dividAndConquer
 
 
@@ -22,82 +27,302 @@ from .fib4 import dividAndConquer
 """
 
 
-def tttr2xfcs(y, num, NcascStart, NcascEnd, Nsub):
+def integerTime(y):
+    """Photon times as int64 ticks (float times are rounded)"""
+    y = np.asarray(y)
+    if not np.issubdtype(y.dtype, np.integer):
+        y = np.round(y, 0)
+    return y.astype(np.int64, copy=False)
+
+
+def mergeTimes(y, num):
+    """Merges photons with identical times in one linear pass
+
+    `y` must be sorted. Returns the unique times and the summed
+    weights of the photons of each time.
+
+    The original implementation took the differences of the cumulative
+    weights at the first index of each unique time, which attributed
+    the repeated photons of a time to the next time. With several
+    channels, the weights thus spilled over to the photon times of
+    other channels.
+    """
+    if y.shape[0] == 0:
+        return y, num
+    first = np.empty(y.shape[0], dtype=bool)
+    first[0] = True
+    np.not_equal(y[1:], y[:-1], out=first[1:])
+    k1 = np.flatnonzero(first)
+    if k1.shape[0] == y.shape[0]:
+        # nothing to merge
+        return y, num
+    return y[k1], np.add.reduceat(num, k1, axis=0)
+
+
+def lagProduct(y, num, lag):
+    """Weighted coincidences (C, C) of the photons `y` and `y+lag`
+
+    Returns None if no photon times coincide.
+    """
+    # Old method
+    # i1= np.in1d(y,y+lag,assume_unique=True)
+    # i2= np.in1d(y+lag,y,assume_unique=True)
+
+    # New method, cython
+    i1, i2 = dividAndConquer(y, y+lag)
+
+    # If the weights (num) are one as in the first Ncasc round, then the correlation is equal to np.sum(i1)
+    i1 = np.where(i1.astype(bool))[0]
+    i2 = np.where(i2.astype(bool))[0]
+
+    # `dividAndConquer` never matches the last photon time. Its pair is
+    # added, so that the correlation does not depend on which other
+    # photons (channels) are in `y`.
+    last = y.shape[0] - 1
+    if last > 0:
+        m = np.searchsorted(y, y[last]-lag)
+        if m < last and y[m] == y[last]-lag:
+            i1 = np.append(i1, last)
+            i2 = np.append(i2, m)
+
+    # Now we want to weight each photon corectly.
+    # Faster dot product method, faster than converting to matrix.
+    if i1.size and i2.size:
+        return np.dot((num[i1, :]).T, num[i2, :])
+    return None
+
+
+def shareCascade(y, num):
+    """Copy the photons of a cascade to a shared memory block"""
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(1, y.nbytes + num.nbytes))
+    np.ndarray(y.shape, np.int64, buffer=shm.buf)[:] = y
+    np.ndarray(num.shape, np.float64, buffer=shm.buf,
+               offset=y.nbytes)[:] = num
+    return shm
+
+
+def lagBlock(name, size, numCh, lags):
+    """Worker function: `lagProduct` for the cascade in shared memory
+
+    The photon times and weights of the cascade are read from the
+    shared memory block `name` (see `shareCascade`) without copying.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        y = np.ndarray((size,), np.int64, buffer=shm.buf)
+        num = np.ndarray((size, numCh), np.float64, buffer=shm.buf,
+                         offset=8*size)
+        products = [lagProduct(y, num, lag) for lag in lags]
+        del y, num
+    finally:
+        shm.close()
+    return products
+
+
+class cascadePool():
+    """Evaluates the lags of the cascades in a process pool
+
+    The photons of each cascade are placed in shared memory, so
+    that only the name of the memory block is sent to the
+    workers. The lags of a cascade are split into blocks of
+    about equal size. At most `depth` cascades are kept in shared
+    memory at the same time; the next cascade is coarse-grained
+    while the workers evaluate the previous ones.
+    """
+
+    def __init__(self, n_workers, Nsub):
+        self.n_workers = int(n_workers)
+        self.nblocks = max(1, min(self.n_workers, Nsub))
+        self.depth = max(2, -(-self.n_workers // Nsub))
+        self.pending = deque()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=fib4.set_backend,
+            initargs=(fib4.get_backend(),))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        try:
+            for _ in range(len(self.pending)):
+                self._release(self.pending.popleft())
+        finally:
+            self.executor.shutdown()
+
+    def submit(self, y, num, lags, rows):
+        """Queue the lags of a cascade, returns finished results
+
+        Returns a list of (row, product) for the cascades that were
+        completed to make room for the new cascade.
+        """
+        done = []
+        while len(self.pending) >= self.depth:
+            done += self._collect(self.pending.popleft())
+        shm = shareCascade(y, num)
+        futures = []
+        for block in np.array_split(np.arange(len(lags)), self.nblocks):
+            if block.size:
+                futures.append((
+                    [rows[ii] for ii in block],
+                    self.executor.submit(lagBlock, shm.name, y.shape[0],
+                                         num.shape[1],
+                                         [lags[ii] for ii in block])))
+        self.pending.append((shm, futures))
+        return done
+
+    def results(self):
+        """Wait for all cascades, returns a list of (row, product)"""
+        done = []
+        while self.pending:
+            done += self._collect(self.pending.popleft())
+        return done
+
+    def _collect(self, item):
+        try:
+            done = []
+            for rows, future in item[1]:
+                done += list(zip(rows, future.result()))
+            return done
+        finally:
+            self._release(item)
+
+    @staticmethod
+    def _release(item):
+        shm, futures = item
+        for _, future in futures:
+            future.cancel()
+        # wait until no worker uses the memory block anymore
+        for _, future in futures:
+            if not future.cancelled():
+                future.exception()
+        shm.close()
+        shm.unlink()
+
+
+def cascadeLevels(Nsub, NcascEnd, minLag=None, maxLag=None, duration=None,
+                  maxFraction=None):
+    """NcascStart, NcascEnd for a range of lag times
+
+    Cascade `j` contains the `Nsub` lags Nsub*(2**j-1) + k*2**j
+    (k = 1..Nsub) in ticks, i.e. `Nsub` points per octave.
+
+    - minLag: cascades whose lags are all shorter are skipped
+    - maxLag: the cascades up to the first lag >= maxLag are
+      computed (instead of `NcascEnd` cascades)
+    - duration: cascades whose first lag exceeds the `duration`
+      of the measurement (or `maxFraction` of it, if `maxLag` is
+      not given) are skipped
+    """
+    def firstLag(j):
+        return Nsub*(2**j-1) + 2**j
+
+    def lastLag(j):
+        return Nsub*(2**(j+1)-1)
+
+    start = 0
+    if minLag is not None:
+        while lastLag(start) < minLag:
+            start += 1
+    limit = duration
+    if maxLag is not None:
+        end = start + 1
+        while lastLag(end-1) < maxLag:
+            end += 1
+    else:
+        end = NcascEnd
+        if duration is not None and maxFraction is not None:
+            limit = duration*maxFraction
+    if limit is not None:
+        while end > start + 1 and firstLag(end-1) > limit:
+            end -= 1
+    return start, max(end, start + 1)
+
+
+def tttr2xfcs(y, num, NcascStart, NcascEnd, Nsub, n_workers=1, dt=None):
     """autocorr, autotime = tttr2xfcs(y,num,10,20)
      Translation into python of:
      Fast calculation of fluorescence correlation data with asynchronous time-correlated single-photon counting.
      Michael Wahl, Ingo Gregor, Matthias Patting, Jorg Enderlein
-     """
 
-    dt = np.max(y)-np.min(y)
-    y = np.round(y[:], 0)
+     The photon times `y` are integer nanoseconds (int64); the
+     coarse-graining of the cascades is exact integer arithmetic.
+     If `n_workers` is larger than one, the lags are evaluated in a
+     process pool (`cascadePool`) with an identical result.
+     `dt` is the duration of the measurement [ticks] for the
+     correction of the finite measurement time; it defaults to
+     the range of `y`.
+     """
+    if n_workers is not None and n_workers > 1:
+        with cascadePool(n_workers, Nsub) as pool:
+            return _tttr2xfcs(y, num, NcascStart, NcascEnd, Nsub, pool, dt)
+    return _tttr2xfcs(y, num, NcascStart, NcascEnd, Nsub, None, dt)
+
+
+def _tttr2xfcs(y, num, NcascStart, NcascEnd, Nsub, pool, dt=None):
+
+    y = integerTime(y)
+    if np.any(y[1:] < y[:-1]):
+        # The cascades require sorted photon times.
+        order = np.argsort(y, kind='stable')
+        y = y[order]
+        num = num[order]
+    if dt is None:
+        dt = np.max(y)-np.min(y)
     numshape = num.shape[0]
 
     autotime = np.zeros(((NcascEnd+1)*(Nsub+1), 1))
     auto = np.zeros(
         ((NcascEnd+1)*(Nsub+1), num.shape[1], num.shape[1])).astype(np.float64)
+    # bin width of the cascade of each lag
+    deltas = np.ones(autotime.shape[0])
     shift = float(0)
     delta = float(1)
 
     for j in range(0, NcascEnd):
 
-        # Finds the unique photon times and their indices. The division of 'y' by '2' each cycle makes this more likely.
-
-        y, k1 = np.unique(y, 1)
-        k1shape = k1.shape[0]
-
-        # Sums up the photon times in each bin.
-        cs = np.cumsum(num, 0).T
-
-        # Prepares difference array so starts with zero.
-        diffArr1 = np.zeros((k1shape+1))
-        diffArr2 = np.zeros((k1shape+1))
-
-        # Takes the cumulative sum of the unique photon arrivals
-        diffArr1[1:] = cs[0, k1].reshape(-1)
-        diffArr2[1:] = cs[1, k1].reshape(-1)
-
-        # del k1
-        # del cs
-        num = np.zeros((k1shape, 2))
-
-        # Finds the total photons in each bin. and represents as count.
-        # This is achieved because we have the indices of each unique time photon and cumulative total at each point.
-        num[:, 0] = np.diff(diffArr1)
-        num[:, 1] = np.diff(diffArr2)
-        # diffArr1 = [];
-        # diffArr2 = [];
+        # Merges photons with identical times. The division of 'y' by '2' each cycle makes this more likely.
+        y, num = mergeTimes(y, num)
 
+        lags = []
+        rows = []
         for k in range(0, Nsub):
             shift = shift + delta
-            lag = np.round(shift/delta, 0)
+            lag = int(np.round(shift/delta, 0))
 
             # Allows the script to be sped up.
             if j >= NcascStart:
-
-                # Old method
-                # i1= np.in1d(y,y+lag,assume_unique=True)
-                # i2= np.in1d(y+lag,y,assume_unique=True)
-
-                # New method, cython
-                i1, i2 = dividAndConquer(y, y+lag)
-
-                # If the weights (num) are one as in the first Ncasc round, then the correlation is equal to np.sum(i1)
-                i1 = np.where(i1.astype(bool))[0]
-                i2 = np.where(i2.astype(bool))[0]
-
-                # Now we want to weight each photon corectly.
-                # Faster dot product method, faster than converting to matrix.
-                if i1.size and i2.size:
-                    auto[(k+(j)*Nsub), :, :] = np.dot((num[i1, :]).T,
-                                                      num[i2, :])/delta
+                lags.append(lag)
+                rows.append(k+(j)*Nsub)
 
             autotime[k+(j)*Nsub] = shift
+            deltas[k+(j)*Nsub] = delta
+
+        if pool is None:
+            products = [(row, lagProduct(y, num, lag))
+                        for row, lag in zip(rows, lags)]
+        elif lags:
+            products = pool.submit(y, num, lags, rows)
+        else:
+            products = []
+        for row, product in products:
+            if product is not None:
+                auto[row, :, :] = product/deltas[row]
 
         # Equivalent to matlab round when numbers are %.5
-        y = np.ceil(np.array(0.5*y))
+        # (ceil(y/2) for non-negative integers)
+        y = (y + 1) >> 1
         delta = 2*delta
 
+    if pool is not None:
+        for row, product in pool.results():
+            if product is not None:
+                auto[row, :, :] = product/deltas[row]
+
     for j in range(0, auto.shape[0]):
         auto[j, :, :] = auto[j, :, :]*dt/(dt-autotime[j])
     autotime = autotime/1000000
@@ -109,15 +334,287 @@ def tttr2xfcs(y, num, NcascStart, NcascEnd, Nsub):
     return auto, autotime
 
 
-def delayTime2bin(dTimeArr, chanArr, chanNum, winInt):
+class tttr2xfcsStream():
+    """Chunk-wise computation of `tttr2xfcs`
+
+    Photons are passed to `add` in blocks of sorted arrival times `y`
+    with the corresponding weights `num`. Every cascade level keeps
+    the last (not yet complete) time bin and the photons that are
+    within its largest lag of the next block, so memory is bounded
+    by the block size. `result` returns exactly what `tttr2xfcs`
+    returns for the concatenated blocks.
+    """
+
+    def __init__(self, numCh, NcascStart, NcascEnd, Nsub):
+        self.numCh = numCh
+        self.NcascStart = NcascStart
+        self.NcascEnd = NcascEnd
+        self.Nsub = Nsub
+
+        self.autotime = np.zeros(((NcascEnd+1)*(Nsub+1), 1))
+        self.auto = np.zeros(
+            ((NcascEnd+1)*(Nsub+1), numCh, numCh)).astype(np.float64)
+        # Lag times of each cascade (same arithmetic as in `tttr2xfcs`).
+        self.lags = []
+        self.delta = []
+        shift = float(0)
+        delta = float(1)
+        for j in range(0, NcascEnd):
+            lags = []
+            for k in range(0, Nsub):
+                shift = shift + delta
+                lags.append(int(np.round(shift/delta, 0)))
+                self.autotime[k+(j)*Nsub] = shift
+            self.lags.append(lags)
+            self.delta.append(delta)
+            delta = 2*delta
+
+        empty = (np.zeros(0, dtype=np.int64), np.zeros((0, numCh)))
+        # Last time bin of each cascade (may still grow)
+        self.pending = [empty] * NcascEnd
+        # Completed time bins that the next block may correlate with
+        self.history = [empty] * NcascEnd
+        self.ymin = None
+        self.ymax = None
+
+    def addChannels(self, numCh):
+        """Extend the weights to `numCh` channels
+
+        Channels that first appear in a later block had zero weight
+        in all previous blocks, so the result is still exact.
+        """
+        extra = numCh - self.numCh
+        if extra <= 0:
+            return
+        self.auto = np.pad(self.auto, ((0, 0), (0, extra), (0, extra)))
+        self.pending = [(y, np.pad(num, ((0, 0), (0, extra))))
+                        for y, num in self.pending]
+        self.history = [(y, np.pad(num, ((0, 0), (0, extra))))
+                        for y, num in self.history]
+        self.numCh = numCh
+
+    def add(self, y, num, span=None):
+        """Correlate the next block of photons
+
+        `span` is the (first, last) time of the block, which may
+        include photons of channels that are not correlated. It
+        defaults to the range of `y`; the range of all blocks is
+        the duration of the measurement.
+        """
+        y = integerTime(y)
+        if span is None and y.shape[0]:
+            span = (np.min(y), np.max(y))
+        if span is not None:
+            self.extendSpan(*span)
+        if y.shape[0]:
+            self._cascade(0, y, num)
+
+    def extendSpan(self, first, last):
+        """Extend the duration of the measurement to `first`, `last`"""
+        first, last = integerTime([first, last])
+        self.ymin = first if self.ymin is None else min(self.ymin, first)
+        self.ymax = last if self.ymax is None else max(self.ymax, last)
+
+    def result(self):
+        """Finish the stream and return autocorr, autotime"""
+        # Correlate and pass on the last time bin of each cascade.
+        for j in range(0, self.NcascEnd):
+            y, num = self.pending[j]
+            self.pending[j] = (y[:0], num[:0])
+            if y.shape[0]:
+                self._correlate(j, y, num)
+                if j+1 < self.NcascEnd:
+                    self._cascade(j+1, (y + 1) >> 1, num)
+
+        auto = self.auto.copy()
+        autotime = self.autotime.copy()
+        dt = self.ymax-self.ymin
+        for j in range(0, auto.shape[0]):
+            auto[j, :, :] = auto[j, :, :]*dt/(dt-autotime[j])
+        autotime = autotime/1000000
+
+        # Removes the trailing zeros.
+        idauto = np.where(autotime != 0)[0]
+        autotime = autotime[idauto]
+        auto = auto[idauto, :, :]
+        return auto, autotime
+
+    def _cascade(self, j, y, num):
+        # Continue the pending time bin of this cascade.
+        y = np.concatenate((self.pending[j][0], y))
+        num = np.concatenate((self.pending[j][1], num))
+        y, num = mergeTimes(y, num)
+
+        # The last bin may still be joined by the next block.
+        self.pending[j] = (y[-1:], num[-1:])
+        y = y[:-1]
+        num = num[:-1]
+        if y.shape[0] == 0:
+            return
+
+        self._correlate(j, y, num)
+
+        if j+1 < self.NcascEnd:
+            # Equivalent to matlab round when numbers are %.5
+            self._cascade(j+1, (y + 1) >> 1, num)
+
+    def _correlate(self, j, y, num):
+        """Pair the completed time bins `y` of cascade `j`"""
+        hy, hnum = self.history[j]
+        ally = np.concatenate((hy, y))
+        allnum = np.concatenate((hnum, num))
+        if j >= self.NcascStart:
+            for k, lag in enumerate(self.lags[j]):
+                # Pair each new bin with the earlier bin `lag` before it.
+                idx = np.searchsorted(ally, y-lag)
+                idx[idx == ally.shape[0]] = ally.shape[0] - 1
+                i1 = np.where(ally[idx] == y-lag)[0]
+                if i1.size:
+                    self.auto[(k+(j)*self.Nsub), :, :] += np.dot(
+                        (num[i1, :]).T, allnum[idx[i1], :])/self.delta[j]
+
+        keep = ally >= ally[-1] + 1 - max(self.lags[j])
+        self.history[j] = (ally[keep], allnum[keep])
+
+
+class tttr2xfcsSegments(tttr2xfcsStream):
+    """`tttr2xfcsStream` that also keeps the sums of time segments
+
+    The photon times are divided into consecutive segments of
+    `segLength` ticks, starting at the beginning of the measurement.
+    After each segment, the increase of the (not normalized)
+    correlation sums is stored, so that the sums of all segments add
+    up to the correlation of the complete stream. Pairs of photons
+    that cross a segment border are attributed to the later segment.
+    """
+
+    def __init__(self, numCh, NcascStart, NcascEnd, Nsub, segLength):
+        super(tttr2xfcsSegments, self).__init__(numCh, NcascStart,
+                                                NcascEnd, Nsub)
+        self.segLength = int(segLength)
+        if self.segLength <= 0:
+            raise ValueError("Segment length must be positive, "
+                             "got {}!".format(segLength))
+        self.segAuto = []
+        self.segCounts = []
+        self.lastAuto = self.auto.copy()
+        self.counts = np.zeros(numCh)
+        self.y0 = None
+
+    def addChannels(self, numCh):
+        extra = numCh - self.numCh
+        super(tttr2xfcsSegments, self).addChannels(numCh)
+        if extra <= 0:
+            return
+        self.segAuto = [np.pad(auto, ((0, 0), (0, extra), (0, extra)))
+                        for auto in self.segAuto]
+        self.segCounts = [np.pad(counts, (0, extra))
+                          for counts in self.segCounts]
+        self.lastAuto = np.pad(self.lastAuto, ((0, 0), (0, extra), (0, extra)))
+        self.counts = np.pad(self.counts, (0, extra))
+
+    def add(self, y, num, span=None):
+        """Correlate the next block of photons (see `tttr2xfcsStream`)"""
+        y = integerTime(y)
+        if span is not None:
+            self.extendSpan(*span)
+        if y.shape[0] == 0:
+            return
+        if self.y0 is None:
+            # The segments start at the beginning of the measurement.
+            self.y0 = y[0] if self.ymin is None else min(self.ymin, y[0])
+        seg = (y - self.y0) // self.segLength
+        splits = np.concatenate(([0], np.flatnonzero(np.diff(seg)) + 1,
+                                 [y.shape[0]]))
+        for start, stop in zip(splits[:-1], splits[1:]):
+            while len(self.segAuto) < seg[start]:
+                self._closeSegment()
+            super(tttr2xfcsSegments, self).add(y[start:stop],
+                                               num[start:stop])
+            self.counts += np.sum(num[start:stop], 0)
+
+    def result(self):
+        """Finish the stream and return autocorr, autotime"""
+        auto, autotime = super(tttr2xfcsSegments, self).result()
+        if self.y0 is not None:
+            self._closeSegment()
+        return auto, autotime
+
+    def segments(self):
+        """Segment data after `result`
+
+        Returns a dictionary with the correlation sums "auto"
+        (S, L, C, C) of the S segments (divided by the bin width,
+        without the correction for the measurement duration), the
+        photon weights "counts" (S, C), the segment start times
+        "start" and durations "duration" (S,), the lag times
+        "autotime" (L,) and the duration "dt" of the stream. All
+        times are in ticks.
+        """
+        idauto = np.where(self.autotime[:, 0] != 0)[0]
+        start = self.y0 + self.segLength*np.arange(len(self.segAuto))
+        stop = np.minimum(start + self.segLength, self.ymax)
+        return {"auto": np.array(self.segAuto)[:, idauto],
+                "counts": np.array(self.segCounts),
+                "start": start,
+                "duration": stop - start,
+                "autotime": self.autotime[idauto, 0],
+                "dt": self.ymax - self.ymin,
+                }
+
+    def _closeSegment(self):
+        self.segAuto.append(self.auto - self.lastAuto)
+        self.segCounts.append(self.counts)
+        self.lastAuto = self.auto.copy()
+        self.counts = np.zeros(self.numCh)
+
+
+def gateWeights(chanArr, dTimeArr, chanNum, gate=None):
+    """Photon weights of a (virtual) channel
+
+    `gate` selects the photons of channel `chanNum` by their TCSPC
+    micro time `dTimeArr`:
+
+    - None: all photons of the channel (weight one)
+    - (start, stop): micro time window start <= dTimeArr < stop (PIE)
+    - 1D array: filter weight for each micro time bin (FLCS);
+      photons beyond the end of the filter get zero weight
+    """
+    chanArr = np.asarray(chanArr)
+    dTimeArr = np.asarray(dTimeArr)
+    weights = (chanArr == chanNum).astype(np.float64)
+    if gate is None:
+        return weights
+    if isinstance(gate, tuple):
+        if len(gate) != 2:
+            raise ValueError("Micro time gate must be (start, stop), "
+                             "got {}!".format(gate))
+        weights *= (dTimeArr >= gate[0]) & (dTimeArr < gate[1])
+    else:
+        filt = np.asarray(gate, dtype=np.float64)
+        if filt.ndim != 1:
+            raise ValueError("Filter weights must be one-dimensional!")
+        inrange = dTimeArr < filt.shape[0]
+        weights[~inrange] = 0
+        weights[inrange] *= filt[dTimeArr[inrange].astype(np.int64)]
+    return weights
+
+
+def delayTime2bin(dTimeArr, chanArr, chanNum, winInt, weights=None):
 
     decayTime = np.array(dTimeArr)
     # This is the point and which each channel is identified.
     decayTimeCh = decayTime[chanArr == chanNum]
+    if weights is not None:
+        # Photon weights of a gated or filtered channel (`gateWeights`)
+        weights = np.asarray(weights)[chanArr == chanNum]
+    if decayTimeCh.shape[0] == 0:
+        # no photons in this channel
+        return [], []
 
     # Find the first and last entry
     firstDecayTime = 0  # np.min(decayTimeCh).astype(np.int32)
-    tempLastDecayTime = np.max(decayTimeCh).astype(np.int32)
+    tempLastDecayTime = np.max(decayTimeCh).astype(np.int64)
 
     # We floor this as the last bin is always incomplete and so we discard photons.
     numBins = np.floor((tempLastDecayTime-firstDecayTime)/winInt)
@@ -125,7 +622,7 @@ def delayTime2bin(dTimeArr, chanArr, chanNum, winInt):
 
     bins = np.linspace(firstDecayTime, lastDecayTime, int(numBins)+1)
 
-    photonsInBin, jnk = np.histogram(decayTimeCh, bins)
+    photonsInBin, jnk = np.histogram(decayTimeCh, bins, weights=weights)
 
     # bins are valued as half their span.
     decayScale = bins[:-1]+(winInt/2)
@@ -133,3 +630,142 @@ def delayTime2bin(dTimeArr, chanArr, chanNum, winInt):
     # decayScale =  np.arange(0,decayTimeCh.shape[0])
 
     return list(photonsInBin), list(decayScale)
+
+
+def delayTime2binChannels(dTimeArr, chanArr, chanNums, winInt,
+                          blockSize=65536):
+    """`delayTime2bin` for several channels in a single pass
+
+    Returns a list with the result of `delayTime2bin` for each
+    channel in `chanNums`. The photons are processed in blocks of
+    `blockSize` without copying the input arrays; the bins of all
+    channels are counted with `np.bincount` on `channel*nbins + bin`.
+    """
+    values = np.asarray(dTimeArr)
+    chanArr = np.asarray(chanArr)
+    unique = np.unique(np.asarray(chanNums))
+    if values.shape[0] == 0 or unique.shape[0] == 0:
+        return [delayTime2bin(values, chanArr, ch, winInt) for ch in chanNums]
+
+    # Lookup table from channel number to index (-1 for other channels)
+    chmin = int(min(np.min(chanArr), unique[0]))
+    chmax = int(max(np.max(chanArr), unique[-1]))
+    lut = np.full(chmax-chmin+1, -1, dtype=np.int64)
+    lut[unique.astype(np.int64)-chmin] = np.arange(unique.shape[0])
+
+    # Bin index with the same edges as `np.histogram`
+    exact = (np.issubdtype(values.dtype, np.integer)
+             and float(winInt).is_integer())
+    # (one spare bin protects the other channels from rounding errors)
+    nbins = int(np.max(values)//winInt) + (1 if exact else 2)
+    counts = np.zeros(unique.shape[0]*nbins, dtype=np.int64)
+    # Values on a bin edge (the last bin of np.histogram is closed)
+    onEdge = np.zeros(unique.shape[0]*nbins, dtype=np.int64)
+    for start in range(0, values.shape[0], blockSize):
+        chanIdx = lut[chanArr[start:start+blockSize].astype(np.int64)-chmin]
+        valid = chanIdx >= 0
+        decayTime = values[start:start+blockSize][valid]
+        if exact:
+            idx = (decayTime // int(winInt)).astype(np.int64)
+        else:
+            idx = np.floor(decayTime/winInt).astype(np.int64)
+            idx -= decayTime < idx*winInt
+            idx += decayTime >= (idx+1)*winInt
+        flat = chanIdx[valid]*nbins + idx
+        counts += np.bincount(flat, minlength=counts.shape[0])
+        onEdge += np.bincount(flat[decayTime == idx*winInt],
+                              minlength=onEdge.shape[0])
+    counts = counts.reshape(unique.shape[0], nbins)
+    onEdge = onEdge.reshape(unique.shape[0], nbins)
+
+    results = []
+    for ch in chanNums:
+        ii = np.searchsorted(unique, ch)
+        nonzero = np.flatnonzero(counts[ii])
+        if nonzero.shape[0] == 0:
+            # no photons in this channel
+            results.append(delayTime2bin(values, chanArr, ch, winInt))
+            continue
+        firstDecayTime = 0
+        # The bin of the last photon; we discard the photons in this
+        # bin as the last bin is always incomplete.
+        numBins = int(nonzero[-1])
+        bins = np.linspace(firstDecayTime, numBins*winInt, numBins+1)
+        photonsInBin = counts[ii, :numBins].copy()
+        if numBins:
+            photonsInBin[-1] += onEdge[ii, numBins]
+        # bins are valued as half their span.
+        decayScale = bins[:-1]+(winInt/2)
+        results.append((list(photonsInBin), list(decayScale)))
+    return results
+
+
+class delayTime2binStream():
+    """Chunk-wise computation of `delayTime2bin`
+
+    The histogram is accumulated per block with `np.bincount` on the
+    bin index; `result` crops it to the bins `delayTime2bin` would
+    have used for the complete array.
+    """
+
+    def __init__(self, chanNum, winInt):
+        self.chanNum = chanNum
+        self.winInt = winInt
+        self.counts = np.zeros(0, dtype=np.int64)
+        # Values on a bin edge (the last bin of np.histogram is closed)
+        self.onEdge = np.zeros(0, dtype=np.int64)
+        self.maxTime = None
+
+    def add(self, dTimeArr, chanArr, weights=None):
+        decayTimeCh = np.asarray(dTimeArr)[np.asarray(chanArr) == self.chanNum]
+        if decayTimeCh.shape[0] == 0:
+            return
+        if weights is not None:
+            weights = np.asarray(weights)[np.asarray(chanArr) == self.chanNum]
+            onEdgeWeights = weights
+        else:
+            onEdgeWeights = 1
+        maxTime = np.max(decayTimeCh)
+        if self.maxTime is None or maxTime > self.maxTime:
+            self.maxTime = maxTime
+
+        idx = np.floor(decayTimeCh/self.winInt).astype(np.int64)
+        # Use the same bin edges as np.histogram.
+        idx -= decayTimeCh < idx*self.winInt
+        idx += decayTimeCh >= (idx+1)*self.winInt
+        length = max(self.counts.shape[0], np.max(idx)+1)
+        counts = np.bincount(idx, weights=weights, minlength=length)
+        onEdge = np.bincount(
+            idx, weights=(decayTimeCh == idx*self.winInt)*onEdgeWeights,
+            minlength=length)
+        if weights is None:
+            onEdge = onEdge.astype(np.int64)
+        self.counts = self._grow(self.counts, length) + counts
+        self.onEdge = self._grow(self.onEdge, length) + onEdge
+
+    def result(self):
+        if self.maxTime is None:
+            # no photons in this channel
+            return [], []
+        firstDecayTime = 0
+        tempLastDecayTime = np.array(self.maxTime).astype(np.int64)
+        numBins = np.floor((tempLastDecayTime-firstDecayTime)/self.winInt)
+        lastDecayTime = numBins*self.winInt
+
+        bins = np.linspace(firstDecayTime, lastDecayTime, int(numBins)+1)
+
+        photonsInBin = self._grow(self.counts, int(numBins))[:int(numBins)].copy()
+        if int(numBins) and self.onEdge.shape[0] > int(numBins):
+            photonsInBin[-1] += self.onEdge[int(numBins)]
+
+        # bins are valued as half their span.
+        decayScale = bins[:-1]+(self.winInt/2)
+
+        return list(photonsInBin), list(decayScale)
+
+    @staticmethod
+    def _grow(arr, length):
+        if arr.shape[0] >= length:
+            return arr
+        return np.concatenate((arr, np.zeros(length-arr.shape[0],
+                                             dtype=arr.dtype)))
@@ -68,85 +68,128 @@ class picoObject():
         self.winInt = self.par_obj.winInt
         self.photonCountBin = self.par_obj.photonCountBin
 
-        # File import
-
-        if self.ext == 'pt3':
-            self.subChanArr, self.trueTimeArr, self.dTimeArr, self.resolution = pt3import(
-                self.filepath)
-        if self.ext == 'ptu':
-            self.subChanArr, self.trueTimeArr, self.dTimeArr, self.resolution = ptuimport(
-                self.filepath)
-        if self.ext == 'csv':
-            self.subChanArr, self.trueTimeArr, self.dTimeArr, self.resolution = csvimport(
-                self.filepath)
-            # If the file is empty.
-            if self.subChanArr == None:
-                # Undoes any preparation of resource.
-                self.par_obj.data.pop(-1)
-                self.par_obj.objectRef.pop(-1)
-                self.exit = True
-                self.par_obj.image_status_text.showMessage(
-                    "Your sample is not in the correct format.")
-                self.par_obj.fit_obj.app.processEvents()
-                return
-
-        # Colour assigned to file.
-        self.color = self.par_obj.colors[self.unqID % len(self.par_obj.colors)]
-
-        # How many channels there are in the files.
-        # Minus 1 because not interested in channel 15.
-        self.numOfCH = np.unique(np.array(self.subChanArr)).__len__()-1
-
-        # Finds the numbers which address the channels.
-        self.ch_present = np.unique(np.array(self.subChanArr[0:100]))
-
-        # Calculates decay function for both channels.
-        self.photonDecayCh1, self.decayScale1 = delayTime2bin(np.array(
-            self.dTimeArr), np.array(self.subChanArr), self.ch_present[0], self.winInt)
-
-        if self.numOfCH == 2:
-            self.photonDecayCh2, self.decayScale2 = delayTime2bin(np.array(
-                self.dTimeArr), np.array(self.subChanArr), self.ch_present[1], self.winInt)
-
-        # Time series of photon counts. For visualisation.
-        self.timeSeries1, self.timeSeriesScale1 = delayTime2bin(np.array(
-            self.trueTimeArr)/1000000, np.array(self.subChanArr), self.ch_present[0], self.photonCountBin)
-
-        unit = self.timeSeriesScale1[-1]/self.timeSeriesScale1.__len__()
+        self.chunkSize = getattr(self.par_obj, 'chunkSize', None)
+        self.nWorkers = getattr(self.par_obj, 'nWorkers', 1)
+        self.virtualChannels = getattr(self.par_obj, 'virtualChannels', None)
+        # Length of the correlation segments [ns] (None: no segments)
+        self.segmentLength = getattr(self.par_obj, 'segmentLength', None)
+        self.segments = None
+        # Range of the lag times [ms] (None: automatic)
+        self.minLag = getattr(self.par_obj, 'minLag', None)
+        self.maxLag = getattr(self.par_obj, 'maxLag', None)
+        # Without maxLag, cascades starting beyond this fraction of
+        # the measurement duration are skipped.
+        self.maxLagFraction = getattr(self.par_obj, 'maxLagFraction', None)
 
-        # Converts to counts per
-        self.kcount_CH1 = np.average(self.timeSeries1)
-
-        # This is the unnormalised intensity count for int_time duration (the first moment)
-        raw_count = np.average(self.timeSeries1)
-        var_count = np.var(self.timeSeries1)
+        # File import
 
-        self.brightnessNandBCH0 = (
-            ((var_count - raw_count)/(raw_count))/(float(unit)))
-        if (var_count-raw_count) == 0:
-            self.numberNandBCH0 = 0
+        if self.chunkSize and self.ext in ['pt3', 'ptu']:
+            # Decays, time series and correlation block by block.
+            self.processDataStream()
         else:
-            self.numberNandBCH0 = (raw_count**2/(var_count-raw_count))
-
-        if self.numOfCH == 2:
+            if self.ext == 'pt3':
+                self.subChanArr, self.trueTimeArr, self.dTimeArr, self.resolution = pt3import(
+                    self.filepath)
+            if self.ext == 'ptu':
+                self.subChanArr, self.trueTimeArr, self.dTimeArr, self.resolution = ptuimport(
+                    self.filepath)
+            if self.ext == 'csv':
+                self.subChanArr, self.trueTimeArr, self.dTimeArr, self.resolution = csvimport(
+                    self.filepath)
+                # If the file is empty.
+                if self.subChanArr == None:
+                    # Undoes any preparation of resource.
+                    self.par_obj.data.pop(-1)
+                    self.par_obj.objectRef.pop(-1)
+                    self.exit = True
+                    self.par_obj.image_status_text.showMessage(
+                        "Your sample is not in the correct format.")
+                    self.par_obj.fit_obj.app.processEvents()
+                    return
+
+            # Colour assigned to file.
+            self.color = self.par_obj.colors[self.unqID % len(self.par_obj.colors)]
+
+            # Finds the numbers which address the detector channels.
+            self.ch_present = self.photonChannels(self.subChanArr)
+            # The correlated channels (detector channel, micro time gate)
+            if self.virtualChannels:
+                self.channels = list(self.virtualChannels)
+            else:
+                self.channels = [(ch, None) for ch in self.ch_present]
+            # How many channels there are in the files.
+            self.numOfCH = self.channels.__len__()
+
+            # Views of the photon arrays (no copies)
+            subChanArr = np.asarray(self.subChanArr)
+            dTimeArr = np.asarray(self.dTimeArr)
+            trueTimeArr = np.asarray(self.trueTimeArr)
+
+            # Decays and time series of all channels without micro
+            # time gate in one pass each.
+            plain = [ch for ch, gate in self.channels if gate is None]
+            decays = iter(delayTime2binChannels(
+                dTimeArr, subChanArr, plain, self.winInt))
+            series = iter(delayTime2binChannels(
+                trueTimeArr, subChanArr, plain, self.photonCountBin*1000000))
+            for ii, (ch, gate) in enumerate(self.channels):
+                if gate is None:
+                    # Calculates decay function for each channel.
+                    photonDecay, decayScale = next(decays)
+                    # Time series of photon counts. For visualisation.
+                    # (integer nanoseconds, the time axis is converted to ms)
+                    timeSeries, timeSeriesScale = next(series)
+                else:
+                    weights = gateWeights(subChanArr, dTimeArr, ch, gate)
+                    photonDecay, decayScale = delayTime2bin(
+                        dTimeArr, subChanArr, ch, self.winInt, weights)
+                    timeSeries, timeSeriesScale = delayTime2bin(
+                        trueTimeArr, subChanArr, ch,
+                        self.photonCountBin*1000000, weights)
+                setattr(self, 'photonDecayCh{}'.format(ii+1), photonDecay)
+                setattr(self, 'decayScale{}'.format(ii+1), decayScale)
+                setattr(self, 'timeSeries{}'.format(ii+1), timeSeries)
+                setattr(self, 'timeSeriesScale{}'.format(ii+1),
+                        list(np.array(timeSeriesScale)/1000000))
+
+            # Calculates the Auto and Cross-correlation functions.
+            self.crossAndAuto(trueTimeArr, subChanArr, dTimeArr)
+
+            self.dTimeMax = np.max(self.dTimeArr)
+            del self.subChanArr
+            del self.trueTimeArr
+            del self.dTimeArr
+            del subChanArr, dTimeArr, trueTimeArr
+
+        for ii in range(self.numOfCH):
+            timeSeries = getattr(self, 'timeSeries{}'.format(ii+1))
+            timeSeriesScale = getattr(self, 'timeSeriesScale{}'.format(ii+1))
+            if len(timeSeries) == 0:
+                # detector channel without photons
+                setattr(self, 'kcount_CH{}'.format(ii+1), 0)
+                setattr(self, 'brightnessNandBCH{}'.format(ii), 0)
+                setattr(self, 'numberNandBCH{}'.format(ii), 0)
+                continue
+            unit = timeSeriesScale[-1]/timeSeriesScale.__len__()
+
+            # Converts to counts per
+            setattr(self, 'kcount_CH{}'.format(ii+1), np.average(timeSeries))
 
-            self.timeSeries2, self.timeSeriesScale2 = delayTime2bin(np.array(
-                self.trueTimeArr)/1000000, np.array(self.subChanArr), self.ch_present[1], self.photonCountBin)
-            unit = self.timeSeriesScale2[-1]/self.timeSeriesScale2.__len__()
-            self.kcount_CH2 = np.average(self.timeSeries2)
             # This is the unnormalised intensity count for int_time duration (the first moment)
-            raw_count = np.average(self.timeSeries2)
-            var_count = np.var(self.timeSeries2)
-            self.brightnessNandBCH1 = (
-                ((var_count - raw_count)/(raw_count))/(float(unit)))
+            raw_count = np.average(timeSeries)
+            var_count = np.var(timeSeries)
+
+            if raw_count == 0:
+                # e.g. a micro time gate without photons
+                setattr(self, 'brightnessNandBCH{}'.format(ii), 0)
+            else:
+                setattr(self, 'brightnessNandBCH{}'.format(ii),
+                        ((var_count - raw_count)/(raw_count))/(float(unit)))
             if (var_count-raw_count) == 0:
-                self.numberNandBCH1 = 0
+                setattr(self, 'numberNandBCH{}'.format(ii), 0)
             else:
-                self.numberNandBCH1 = (raw_count**2/(var_count-raw_count))
-
-        # Calculates the Auto and Cross-correlation functions.
-        self.crossAndAuto(np.array(self.trueTimeArr),
-                          np.array(self.subChanArr))
+                setattr(self, 'numberNandBCH{}'.format(ii),
+                        raw_count**2/(var_count-raw_count))
 
         if self.fit_obj != None:
             # If fit object provided then creates fit objects.
@@ -165,7 +208,7 @@ class picoObject():
             self.objId1.autotime = np.array(self.autotime).reshape(-1)
             self.objId1.param = copy.deepcopy(self.fit_obj.def_param)
 
-            if self.numOfCH == 2:
+            if self.numOfCH >= 2:
                 if self.objId3 == None:
                     corrObj = corrObject(self.filepath, self.fit_obj)
                     self.objId3 = corrObj.objId
@@ -214,61 +257,236 @@ class picoObject():
 
             self.fit_obj.fill_series_list()
         self.dTimeMin = 0
-        self.dTimeMax = np.max(self.dTimeArr)
         self.subDTimeMin = self.dTimeMin
         self.subDTimeMax = self.dTimeMax
         self.exit = False
-        del self.subChanArr
-        del self.trueTimeArr
-        del self.dTimeArr
 
-    def crossAndAuto(self, trueTimeArr, subChanArr):
-        # For each channel we loop through and find only those in the correct time gate.
-        # We only want photons in channel 1 or two.
-        y = trueTimeArr[subChanArr < 3]
-        validPhotons = subChanArr[subChanArr < 3]
+    def processDataStream(self):
+        """Imports and correlates the file in blocks of `chunkSize` records
 
-        # Creates boolean for photon events in either channel.
-        num = np.zeros((validPhotons.shape[0], 2))
-        num[:, 0] = (np.array([np.array(validPhotons) ==
-                               self.ch_present[0]])).astype(np.int32)
-        if self.numOfCH == 2:
-            num[:, 1] = (np.array([np.array(validPhotons) ==
-                                   self.ch_present[1]])).astype(np.int32)
+        Gives the same result as the complete import, but peak memory
+        is bounded by the block size instead of the file size.
+        """
+        # Very small blocks only add overhead.
+        chunkSize = max(int(self.chunkSize), 100)
+        if self.ext == 'pt3':
+            chunks = pt3import_chunks(self.filepath, chunkSize)
+        else:
+            chunks = ptuimport_chunks(self.filepath, chunkSize)
 
-        self.count0 = np.sum(num[:, 0])
-        self.count1 = np.sum(num[:, 1])
+        # Colour assigned to file.
+        self.color = self.par_obj.colors[self.unqID % len(self.par_obj.colors)]
+
+        # The correlated channels (detector channel, micro time gate).
+        # Without virtual channels, the detector channels are added
+        # in the order of their first appearance; channels that appear
+        # later get zero weights before.
+        channels = list(self.virtualChannels or [])
+        detectors = set()
+        decays = []
+        series = []
+        counts = np.zeros(len(channels))
+        # The duration is only known at the end.
+        self.NcascStart, self.NcascEnd = self.lagLevels()
+        if self.segmentLength:
+            corr = tttr2xfcsSegments(len(channels), self.NcascStart,
+                                     self.NcascEnd, self.Nsub,
+                                     self.segmentLength)
+        else:
+            corr = tttr2xfcsStream(len(channels), self.NcascStart,
+                                   self.NcascEnd, self.Nsub)
+        maxY = None
+        selected = False
+        for subChanArr, trueTimeArr, dTimeArr, self.resolution in chunks:
+            if subChanArr.shape[0] == 0:
+                continue
+            for ch in self.photonChannels(subChanArr):
+                if ch not in detectors:
+                    detectors.add(ch)
+                    if not self.virtualChannels:
+                        channels.append((ch, None))
+            for ch, _ in channels[len(decays):]:
+                decays.append(delayTime2binStream(ch, self.winInt))
+                series.append(delayTime2binStream(
+                    ch, self.photonCountBin*1000000))
+            corr.addChannels(len(channels))
+            counts = np.pad(counts, (0, len(channels)-counts.shape[0]))
+            if maxY is None:
+                maxY = np.max(trueTimeArr)
+                self.dTimeMax = np.max(dTimeArr)
+            maxY = max(maxY, np.max(trueTimeArr))
+            self.dTimeMax = max(self.dTimeMax, np.max(dTimeArr))
+
+            for (ch, gate), dec, ser in zip(channels, decays, series):
+                weights = None if gate is None else gateWeights(
+                    subChanArr, dTimeArr, ch, gate)
+                dec.add(dTimeArr, subChanArr, weights)
+                ser.add(trueTimeArr, subChanArr, weights)
+
+            y, num = self.channelWeights(trueTimeArr, subChanArr, dTimeArr,
+                                         channels)
+            counts += np.sum(num, 0)
+            selected = selected or y.shape[0] > 0
+            corr.add(y, num, self.photonSpan(trueTimeArr, subChanArr))
+
+        # Finds the numbers which address the detector channels.
+        self.ch_present = np.array(sorted(detectors))
+        if self.virtualChannels:
+            order = np.arange(len(channels))
+        else:
+            order = np.argsort([ch for ch, _ in channels], kind='stable')
+        self.channels = [channels[ii] for ii in order]
+        # How many channels there are in the files.
+        self.numOfCH = self.channels.__len__()
+
+        for ii, jj in enumerate(order):
+            photonDecay, decayScale = decays[jj].result()
+            setattr(self, 'photonDecayCh{}'.format(ii+1), photonDecay)
+            setattr(self, 'decayScale{}'.format(ii+1), decayScale)
+            timeSeries, timeSeriesScale = series[jj].result()
+            setattr(self, 'timeSeries{}'.format(ii+1), timeSeries)
+            setattr(self, 'timeSeriesScale{}'.format(ii+1),
+                    list(np.array(timeSeriesScale)/1000000))
+
+        if not selected:
+            raise ValueError("No photons in the selected channels {} of "
+                             "'{}'!".format(self.channels, self.filepath))
+        auto, self.autotime = corr.result()
+        auto = auto[:, order][:, :, order]
+        self.counts = counts[order]
+        if self.segmentLength:
+            self.segments = corr.segments()
+            self.segments["auto"] = self.segments["auto"][:, :, order][:, :, :, order]
+            self.segments["counts"] = self.segments["counts"][:, order]
+            self.segments["maxY"] = np.ceil(maxY)
+        self.NcascStart, self.NcascEnd = self.lagLevels(corr.ymax-corr.ymin)
+        auto = self.cropLags(auto)
+        self.normalizeAuto(auto, np.ceil(maxY))
+
+    def photonChannels(self, subChanArr):
+        """Sorted numbers of the detector channels in `subChanArr`
+
+        Channel 15 of .pt3 records holds overflows and markers; the
+        markers of .ptu files are already removed during import.
+        """
+        channels = np.unique(np.asarray(subChanArr))
+        if self.ext in ['pt3', 'csv']:
+            channels = channels[channels != 15]
+        return channels
+
+    def photonSpan(self, trueTimeArr, subChanArr):
+        """First and last arrival time of all detector photons
+
+        The duration of the measurement must not depend on the
+        correlated channels. Returns None if there are no photons.
+        """
+        trueTimeArr = np.asarray(trueTimeArr)
+        if self.ext in ['pt3', 'csv']:
+            trueTimeArr = trueTimeArr[np.asarray(subChanArr) != 15]
+        if trueTimeArr.shape[0] == 0:
+            return None
+        return np.min(trueTimeArr), np.max(trueTimeArr)
+
+    def channelWeights(self, trueTimeArr, subChanArr, dTimeArr, channels):
+        """Photon times and weights (N, C) of the correlated `channels`
+
+        `channels` is a list of (detector channel, micro time gate),
+        see `gateWeights`. Column `i` of the weights holds the photon
+        weights of `channels[i]`, so that `tttr2xfcs` computes all
+        auto- and cross-correlations of the channels in one pass.
+        """
+        subChanArr = np.asarray(subChanArr)
+        valid = np.isin(subChanArr, [ch for ch, _ in channels])
+        y = trueTimeArr[valid]
+        validPhotons = subChanArr[valid]
+        validDTime = np.asarray(dTimeArr)[valid]
+
+        # Creates (weighted) boolean for photon events in each channel.
+        num = np.zeros((validPhotons.shape[0], len(channels)))
+        for ii, (ch, gate) in enumerate(channels):
+            num[:, ii] = gateWeights(validPhotons, validDTime, ch, gate)
+        return y, num
+
+    def crossAndAuto(self, trueTimeArr, subChanArr, dTimeArr):
+        # Only photons of the correlated channels are used.
+        y, num = self.channelWeights(trueTimeArr, subChanArr, dTimeArr,
+                                     self.channels)
+
+        # (Weighted) photons per channel
+        self.counts = np.sum(num, 0)
 
         t1 = time.time()
-        auto, self.autotime = tttr2xfcs(
-            y, num, self.NcascStart, self.NcascEnd, self.Nsub)
+        if y.shape[0] == 0:
+            raise ValueError("No photons in the selected channels {} of "
+                             "'{}'!".format(self.channels, self.filepath))
+        first, last = self.photonSpan(trueTimeArr, subChanArr)
+        self.NcascStart, self.NcascEnd = self.lagLevels(last-first)
+        if self.segmentLength:
+            # One pass for the correlation and its segments
+            if np.any(y[1:] < y[:-1]):
+                order = np.argsort(y, kind='stable')
+                y = y[order]
+                num = num[order]
+            corr = tttr2xfcsSegments(num.shape[1], self.NcascStart,
+                                     self.NcascEnd, self.Nsub,
+                                     self.segmentLength)
+            corr.add(y, num, (first, last))
+            auto, self.autotime = corr.result()
+            self.segments = corr.segments()
+            self.segments["maxY"] = np.ceil(np.max(trueTimeArr))
+        else:
+            auto, self.autotime = tttr2xfcs(
+                y, num, self.NcascStart, self.NcascEnd, self.Nsub,
+                n_workers=self.nWorkers, dt=last-first)
         t2 = time.time()
 
+        auto = self.cropLags(auto)
+        self.normalizeAuto(auto, np.ceil(np.max(trueTimeArr)))
+
+    def lagLevels(self, duration=None):
+        """NcascStart, NcascEnd for the lag range and duration [ns]"""
+        start, end = cascadeLevels(
+            self.Nsub, self.par_obj.NcascEnd,
+            minLag=None if self.minLag is None else self.minLag*1000000,
+            maxLag=None if self.maxLag is None else self.maxLag*1000000,
+            duration=duration,
+            maxFraction=self.maxLagFraction)
+        start = max(start, self.par_obj.NcascStart)
+        return start, max(end, start+1)
+
+    def cropLags(self, auto):
+        """Removes lags beyond `NcascEnd` and outside the lag range"""
+        autotime = self.autotime.reshape(-1)
+        keep = np.arange(autotime.shape[0]) < self.NcascEnd*self.Nsub
+        if self.minLag is not None:
+            keep &= autotime >= self.minLag
+        if self.maxLag is not None:
+            keep &= autotime <= self.maxLag
+        self.autotime = self.autotime[keep]
+        if self.segments is not None:
+            self.segments["auto"] = self.segments["auto"][:, keep]
+            self.segments["autotime"] = self.segments["autotime"][keep]
+        return auto[keep]
+
+    def normalizeAuto(self, auto, maxY):
         # Normalisation of the TCSPC data:
-        maxY = np.ceil(max(self.trueTimeArr))
         self.autoNorm = np.zeros((auto.shape))
-        self.autoNorm[:, 0, 0] = (
-            (auto[:, 0, 0]*maxY)/(self.count0*self.count0))-1
-
-        if self.numOfCH == 2:
-            self.autoNorm[:, 1, 1] = (
-                (auto[:, 1, 1]*maxY)/(self.count1*self.count1))-1
-            self.autoNorm[:, 1, 0] = (
-                (auto[:, 1, 0]*maxY)/(self.count1*self.count0))-1
-            self.autoNorm[:, 0, 1] = (
-                (auto[:, 0, 1]*maxY)/(self.count0*self.count1))-1
+        for ii in range(self.numOfCH):
+            for jj in range(self.numOfCH):
+                if not self.counts[ii] or not self.counts[jj]:
+                    # e.g. a micro time gate without photons
+                    continue
+                self.autoNorm[:, ii, jj] = (
+                    (auto[:, ii, jj]*maxY)/(self.counts[ii]*self.counts[jj]))-1
 
         # Normalisaation of the decay functions.
-        self.photonDecayCh1Min = np.array(self.photonDecayCh1) - \
-            (np.min(self.photonDecayCh1) if len(self.photonDecayCh1) > 0 else 0)
-        self.photonDecayCh1Norm = self.photonDecayCh1Min / \
-            (np.max(self.photonDecayCh1Min) if len(self.photonDecayCh1) > 0 else 1)
-
-        if self.numOfCH == 2:
-            self.photonDecayCh2Min = np.array(self.photonDecayCh2) - \
-                np.min(self.photonDecayCh2)
-            self.photonDecayCh2Norm = self.photonDecayCh2Min / \
-                np.max(self.photonDecayCh2Min)
+        for ii in range(self.numOfCH):
+            photonDecay = getattr(self, 'photonDecayCh{}'.format(ii+1))
+            photonDecayMin = np.array(photonDecay) - \
+                (np.min(photonDecay) if len(photonDecay) > 0 else 0)
+            setattr(self, 'photonDecayCh{}Min'.format(ii+1), photonDecayMin)
+            setattr(self, 'photonDecayCh{}Norm'.format(ii+1), photonDecayMin /
+                    (np.max(photonDecayMin) or 1 if len(photonDecay) > 0 else 1))
 
         return
 
@@ -343,14 +561,16 @@ class subPicoObject():
 
        # Time series of photon counts. For visualisation.
         self.timeSeries1, self.timeSeriesScale1 = delayTime2bin(np.array(
-            self.trueTimeArr)/1000000, np.array(self.subChanArr), self.ch_present[0], self.photonCountBin)
+            self.trueTimeArr), np.array(self.subChanArr), self.ch_present[0], self.photonCountBin*1000000)
+        self.timeSeriesScale1 = list(np.array(self.timeSeriesScale1)/1000000)
 
         unit = self.timeSeriesScale1[-1]/self.timeSeriesScale1.__len__()
         self.kcount_CH1 = np.average(self.timeSeries1)
         if self.numOfCH == 2:
 
             self.timeSeries2, self.timeSeriesScale2 = delayTime2bin(np.array(
-                self.trueTimeArr)/1000000, np.array(self.subChanArr), self.ch_present[1], self.photonCountBin)
+                self.trueTimeArr), np.array(self.subChanArr), self.ch_present[1], self.photonCountBin*1000000)
+            self.timeSeriesScale2 = list(np.array(self.timeSeriesScale2)/1000000)
             unit = self.timeSeriesScale2[-1]/self.timeSeriesScale2.__len__()
             self.kcount_CH2 = np.average(self.timeSeries2)
 
@@ -1,10 +1,47 @@
+"""Intersection kernels for `tttr2xfcs`
+
+`dividAndConquer` finds the coincident photon times of `y` and
+`y + lag`. It dispatches to one of several interchangeable backends
+that all return identical masks:
+
+- "numba": compiled two-pointer loop (only if numba is installed)
+- "searchsorted": binary search of each array in the other
+- "merge": stable merge of both sorted arrays
+
+The first available backend in `BACKEND_PREFERENCE` is selected at
+import time; use `set_backend` to choose another one. The order is
+based on `benchmarks/bench_intersection.py`.
+"""
 import numpy as np
 import numpy.typing as npt
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+#: Order in which the backends are selected at import time
+BACKEND_PREFERENCE = ["numba", "merge", "searchsorted"]
+
 
 def dividAndConquer(
     arr1: npt.NDArray[np.integer | np.floating],
     arr2: npt.NDArray[np.integer | np.floating],
+) -> tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+    """divide and conquer fast intersection algorithm
+
+    Returns float masks of the elements of `arr1[:-1]` that are in
+    `arr2[:-1]` and vice versa. Both arrays must be sorted and must
+    not contain duplicates. The computation is performed by the
+    backend selected with `set_backend`.
+    """
+    return _backend(arr1, arr2)
+
+
+def dividAndConquer_searchsorted(
+    arr1: npt.NDArray[np.integer | np.floating],
+    arr2: npt.NDArray[np.integer | np.floating],
 ) -> tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
     """
     Pure numpy implementation of the original
@@ -87,3 +124,84 @@ def dividAndConquer(
     mask2 = (a2 == a1[idx2]).astype(np.float64)
 
     return mask1, mask2
+
+
+def dividAndConquer_merge(
+    arr1: npt.NDArray[np.integer | np.floating],
+    arr2: npt.NDArray[np.integer | np.floating],
+) -> tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+    """Intersection by merging the two sorted arrays
+
+    The stable sort of the concatenation of two sorted runs is a
+    linear merge (timsort). Since there are no duplicates within
+    the arrays, every pair of equal neighbors is a match.
+    """
+    a1 = arr1[:-1]
+    a2 = arr2[:-1]
+    n1 = a1.shape[0]
+
+    merged = np.concatenate((a1, a2))
+    order = np.argsort(merged, kind="stable")
+    equal = np.flatnonzero(merged[order[1:]] == merged[order[:-1]])
+
+    # With a stable sort, the element of `a1` comes first.
+    mask1 = np.zeros(n1, dtype=np.float64)
+    mask2 = np.zeros(a2.shape[0], dtype=np.float64)
+    mask1[order[equal]] = 1
+    mask2[order[equal + 1] - n1] = 1
+    return mask1, mask2
+
+
+if numba is not None:
+    @numba.njit(cache=True, nogil=True)
+    def _two_pointer(a1, a2, mask1, mask2):  # pragma: no cover
+        i = 0
+        j = 0
+        while i < a1.shape[0] and j < a2.shape[0]:
+            if a1[i] < a2[j]:
+                i += 1
+            elif a2[j] < a1[i]:
+                j += 1
+            else:
+                mask1[i] = 1
+                mask2[j] = 1
+                i += 1
+
+    def dividAndConquer_numba(
+        arr1: npt.NDArray[np.integer | np.floating],
+        arr2: npt.NDArray[np.integer | np.floating],
+    ) -> tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """Two-pointer loop of the original Cython code, compiled with numba
+        """
+        a1 = np.ascontiguousarray(arr1[:-1])
+        a2 = np.ascontiguousarray(arr2[:-1])
+        mask1 = np.zeros(a1.shape[0], dtype=np.float64)
+        mask2 = np.zeros(a2.shape[0], dtype=np.float64)
+        _two_pointer(a1, a2, mask1, mask2)
+        return mask1, mask2
+
+
+#: All backends that can be used in this environment
+BACKENDS = {"searchsorted": dividAndConquer_searchsorted,
+            "merge": dividAndConquer_merge,
+            }
+if numba is not None:
+    BACKENDS["numba"] = dividAndConquer_numba
+
+
+def get_backend() -> str:
+    """Return the name of the current `dividAndConquer` backend"""
+    return _backend_name
+
+
+def set_backend(name: str) -> None:
+    """Select the `dividAndConquer` backend (a key of `BACKENDS`)"""
+    global _backend, _backend_name
+    if name not in BACKENDS:
+        raise ValueError("Unknown or unavailable backend '{}', ".format(name)
+                         + "choose from {}.".format(sorted(BACKENDS)))
+    _backend = BACKENDS[name]
+    _backend_name = name
+
+
+set_backend([name for name in BACKEND_PREFERENCE if name in BACKENDS][0])
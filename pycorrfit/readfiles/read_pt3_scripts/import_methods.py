@@ -57,7 +57,52 @@ def csvimport(filepath):
 
 def pt3import(filepath):
     """The file import for the .pt3 file"""
-    f = open(filepath, 'rb')
+    Records, Resolution, syncperiod, records = pt3memmap(filepath)
+    chanArr, trueTimeArr, dTimeArr, ofltime = pt3records(
+        records, 0, syncperiod, Resolution)
+    del records
+
+    return chanArr, trueTimeArr, dTimeArr, Resolution
+
+
+def pt3import_chunks(filepath, chunkSize):
+    """Chunk-wise file import for the .pt3 file
+
+    Yields the same arrays as `pt3import` for consecutive blocks of
+    at most `chunkSize` records. The overflow time is carried across
+    the block boundaries.
+    """
+    Records, Resolution, syncperiod, records = pt3memmap(filepath)
+    ofltime = 0
+    for start in range(0, Records, chunkSize):
+        chanArr, trueTimeArr, dTimeArr, ofltime = pt3records(
+            records[start:start+chunkSize], ofltime, syncperiod, Resolution)
+        yield chanArr, trueTimeArr, dTimeArr, Resolution
+
+
+def pt3memmap(filepath):
+    """Reads the .pt3 header and memory-maps the T3 records
+
+    Returns the number of records, the TCSPC resolution [ns], the
+    sync period [ns] and the records as a read-only uint32 array.
+    """
+    with open(filepath, 'rb') as f:
+        Records, Resolution, syncperiod = pt3header(f)
+        offset = f.tell()
+    if Records == 0:
+        records = np.zeros(0, dtype='<u4')
+    else:
+        records = np.memmap(filepath, dtype='<u4', mode='r',
+                            offset=offset, shape=(Records,))
+    return Records, Resolution, syncperiod, records
+
+
+def pt3header(f):
+    """Reads the .pt3 file header, leaves `f` at the first T3 record
+
+    Returns the number of records, the TCSPC resolution [ns] and
+    the sync period [ns].
+    """
     Ident = f.read(16)
     FormatVersion = f.read(6)
     CreatorName = f.read(18)
@@ -166,71 +211,45 @@ def pt3import(filepath):
     # Special Header for imaging.
     if ImgHdrSize > 0:
         ImgHdr = struct.unpack('i', f.read(ImgHdrSize))[0]
-    ofltime = 0
-
-    cnt_1 = 0
-    cnt_2 = 0
-    cnt_3 = 0
-    cnt_4 = 0
-    cnt_Ofl = 0
-    cnt_M = 0
-    cnt_Err = 0  # just counters
-    WRAPAROUND = 65536
 
     # Put file Save info here.
 
     syncperiod = 1e9/CntRate0
-    # outfile stuff here.
-    # fpout.
-    # T3RecordArr = [];
-
-    chanArr = [0]*Records
-    trueTimeArr = [0]*Records
-    dTimeArr = [0]*Records
-    # f1=open('./testfile', 'w+')
-    for b in range(0, Records):
-        T3Record = struct.unpack('I', f.read(4))[0]
-
-        # T3RecordArr.append(T3Record)
-        nsync = T3Record & 65535
-        chan = ((T3Record >> 28) & 15)
-        chanArr[b] = chan
-        # f1.write(str(i)+" "+str(T3Record)+" "+str(nsync)+" "+str(chan)+" ")
-        dtime = 0
-
-        if chan == 1:
-            cnt_1 = cnt_1+1
-            dtime = ((T3Record >> 16) & 4095)  # f1.write(str(dtime)+" ")
-        elif chan == 2:
-            cnt_2 = cnt_2+1
-            dtime = ((T3Record >> 16) & 4095)  # f1.write(str(dtime)+" ")
-        elif chan == 3:
-            cnt_3 = cnt_3+1
-            dtime = ((T3Record >> 16) & 4095)  # f1.write(str(dtime)+" ")
-        elif chan == 4:
-            cnt_4 = cnt_4+1
-            dtime = ((T3Record >> 16) & 4095)  # f1.write(str(dtime)+" ")
-        elif chan == 15:
-            markers = ((T3Record >> 16) & 15)
-
-            if markers == 0:
-                ofltime = ofltime + WRAPAROUND
-                cnt_Ofl = cnt_Ofl+1
-                # f1.write("Ofl "+" ")
-            else:
-                cnt_M = cnt_M+1
-                # f1.write("MA:%1u "+markers+" ")
-
-        truensync = ofltime + nsync
-        truetime = (truensync * syncperiod) + (dtime*Resolution)
-        trueTimeArr[b] = truetime
-        dTimeArr[b] = dtime
-
-        # f1.write(str(truensync)+" "+str(truetime)+"\n")
-    f.close()
-    # f1.close();
-
-    return np.array(chanArr), np.array(trueTimeArr), np.array(dTimeArr), Resolution
+
+    return Records, Resolution, syncperiod
+
+
+def pt3records(records, ofltime, syncperiod, Resolution):
+    """Decodes an array of T3 records of a .pt3 file
+
+    Returns the channels, the arrival times in integer nanoseconds
+    (int64) and the TCSPC micro times of the records.
+    `ofltime` is the overflow time before the first record;
+    the overflow time after the last decoded record is returned
+    as the last item.
+    """
+    WRAPAROUND = 65536
+
+    T3Record = np.asarray(records, dtype=np.uint32)
+    nsync = (T3Record & 65535).astype(np.int64)
+    chanArr = ((T3Record >> 28) & 15).astype(np.uint8)
+    dTimeArr = ((T3Record >> 16) & 4095).astype(np.uint16)
+    # Only photon records (channel 1 to 4) have a dtime.
+    dTimeArr[(chanArr < 1) | (chanArr > 4)] = 0
+
+    # Overflow markers (channel 15, markers 0) shift all following records.
+    markers = (T3Record >> 16) & 15
+    overflow = (chanArr == 15) & (markers == 0)
+    oflArr = ofltime + np.cumsum(overflow, dtype=np.int64)*WRAPAROUND
+
+    # Arrival times in integer nanoseconds
+    truensync = oflArr + nsync
+    trueTimeArr = np.round((truensync * syncperiod)
+                           + (dTimeArr*Resolution)).astype(np.int64)
+    if oflArr.shape[0]:
+        ofltime = int(oflArr[-1])
+
+    return chanArr, trueTimeArr, dTimeArr, ofltime
 
 
 def ptuimport(path):
@@ -240,19 +259,48 @@ def ptuimport(path):
     records = ptu.decode_records()
     records = records[records["channel"] >= 0] # remove all markers
 
+    return ptuconvert(ptu, records, 0)
+
+
+def ptuimport_chunks(path, chunkSize):
+    """Chunk-wise version of `ptuimport`
+
+    The encoded records are memory-mapped and decoded in blocks of
+    at most `chunkSize` records. ptufile starts counting overflows
+    at zero for every block, so the global time of the last overflow
+    record of each block is carried over to the next one.
+    """
+    with PtuFile(path) as ptu:
+        encoded = ptu.read_records(memmap=True)
+        offset = 0
+        for start in range(0, encoded.size, chunkSize):
+            records = ptu.decode_records(encoded[start:start+chunkSize])
+            overflows = records["time"][(records["channel"] < 0)
+                                        & (records["marker"] == 0)]
+            records = records[records["channel"] >= 0] # remove all markers
+            yield ptuconvert(ptu, records, offset)
+            if overflows.size:
+                offset += int(overflows[-1])
+
+
+def ptuconvert(ptu, records, offset):
+    """Convert decoded photon records to the t3 arrays of `ptuimport`
+
+    `offset` is added to the global time (in sync periods).
+    """
     # either convert our t3 data to t2 or load the t2 data directly
-    # time is in units of ns
+    # time is in units of ns (int64)
     if ptu.is_t3:
         channel = records["channel"]
         dtime = records["dtime"]
         sync_time = (1e9 / ptu.syncrate)
         resolution = ptu.tcspc_resolution
-        time = (records["time"] * sync_time) + (dtime * resolution)
+        time = ((records["time"] + offset) * sync_time) + (dtime * resolution)
     else:
         channel = records["channel"]
-        dtime = np.zeros_like(channel, dtype=np.uint32)
+        dtime = np.zeros_like(channel, dtype=np.uint16)
         resolution = ptu.global_resolution
-        time = records["time"] * 1e9 * resolution
+        time = (records["time"] + offset) * 1e9 * resolution
+    time = np.round(time).astype(np.int64)
 
     return channel, time, dtime, resolution
-
@@ -4,5 +4,13 @@
 from .read_pt3_PicoQuant import openPT3
 
 
-def openPTU(path, filename=None):
-    return openPT3(path, filename)
+def openPTU(path, filename=None, chunk_size=None, n_workers=1,
+            virtual_channels=None, segment_length=None, min_lag=None,
+            max_lag=None, points_per_octave=6, trace_bin=None,
+            trace_decimation="mean", max_lag_fraction=None):
+    return openPT3(path, filename, chunk_size=chunk_size,
+                   n_workers=n_workers, virtual_channels=virtual_channels,
+                   segment_length=segment_length, min_lag=min_lag,
+                   max_lag=max_lag, points_per_octave=points_per_octave,
+                   trace_bin=trace_bin, trace_decimation=trace_decimation,
+                   max_lag_fraction=max_lag_fraction)
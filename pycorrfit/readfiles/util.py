@@ -1,44 +1,181 @@
 """utility functions for reading data"""
+import itertools
+
 import numpy as np
 
 
-def downsample_trace(trace, bestlength=500):
+def downsample_trace(trace, bestlength=500, method="mean"):
     """
     Reduces the length of a trace so that there is no undersampling on a
     regular computer screen and the data size is not too large.
 
-    Downsampling is performed by averaging neighboring intensity values
-    for two time bins and omitting the first time bin.
+    Parameters
+    ----------
+    trace : ndarray of shape (N, 2)
+        Time and intensity values of the trace.
+    bestlength : int
+        Approximate length of the downsampled trace. Traces shorter
+        than `bestlength` are returned unchanged.
+    method : str
+        The decimation method:
+
+        - "mean": average `N // bestlength` neighboring intensity
+          values, the time of the last value in each interval is
+          used (`decimate_mean`). This preserves the average count
+          rate and is the default.
+        - "minmax": the minimum and maximum of each interval
+          (`decimate_minmax`), which keeps spikes visible.
+        - "lttb": the largest-triangle-three-buckets algorithm
+          (`decimate_lttb`), which preserves the visual shape.
     """
+    if method not in DECIMATION_METHODS:
+        raise ValueError("Unknown decimation method '{}'! ".format(method) +
+                         "Choose from {}.".format(
+                             sorted(DECIMATION_METHODS.keys())))
     # The trace is too big. Wee need to bin it.
     if len(trace) >= bestlength:
-        # We want about 500 bins
-        # We need to sum over intervals of length *teiler*
-        teiler = int(np.floor(len(trace)/bestlength))
-        newlength = int(np.floor(len(trace)/teiler))
-        newsignal = np.zeros(newlength)
-        # Simultaneously sum over all intervals
-        for j in np.arange(teiler):
-            newsignal = \
-                newsignal+trace[j:newlength*teiler:teiler][:, 1]
-        newsignal = 1. * newsignal / teiler
-        newtimes = trace[teiler-1:newlength*teiler:teiler][:, 0]
-        if len(trace) % teiler != 0:
-            # We have a rest signal
-            # We average it and add it to the trace
-            rest = trace[newlength*teiler:][:, 1]
-            lrest = len(rest)
-            rest = np.array([sum(rest)/lrest])
-            newsignal = np.concatenate((newsignal, rest),
-                                       axis=0)
-            timerest = np.array([trace[-1][0]])
-            newtimes = np.concatenate((newtimes, timerest),
-                                      axis=0)
-        newtrace = np.zeros((len(newtimes), 2))
-        newtrace[:, 0] = newtimes
-        newtrace[:, 1] = newsignal
+        return DECIMATION_METHODS[method](np.asarray(trace), bestlength)
     else:
-        # Declare newtrace -
-        # otherwise we have a problem down three lines ;)
-        newtrace = trace
+        return trace
+
+
+def downsample_traces(traces, bestlength=500, method="mean"):
+    """
+    Applies `downsample_trace` to the "Trace" list of a reader, whose
+    entries are arrays or lists of arrays (cross-correlation).
+    """
+    newtraces = []
+    for trace in traces:
+        if isinstance(trace, list):
+            newtraces.append(downsample_traces(trace, bestlength, method))
+        elif isinstance(trace, np.ndarray) and trace.ndim == 2:
+            newtraces.append(downsample_trace(trace, bestlength, method))
+        else:
+            newtraces.append(trace)
+    return newtraces
+
+
+def decimate_mean(trace, bestlength=500):
+    """
+    Averages neighboring intensity values in intervals of
+    `N // bestlength` time bins. The time of the last bin of each
+    interval is used. A remaining incomplete interval is averaged
+    as well.
+    """
+    # We need to average over intervals of length *teiler*
+    teiler = max(len(trace) // bestlength, 1)
+    newlength = len(trace) // teiler
+    newsignal = trace[:newlength*teiler, 1].reshape(newlength, teiler)
+    newsignal = newsignal.sum(axis=1) / teiler
+    newtimes = trace[teiler-1:newlength*teiler:teiler, 0]
+    if len(trace) % teiler != 0:
+        # We have a rest signal
+        # We average it and add it to the trace
+        rest = trace[newlength*teiler:, 1]
+        newsignal = np.append(newsignal, np.sum(rest)/len(rest))
+        newtimes = np.append(newtimes, trace[-1, 0])
+    newtrace = np.zeros((len(newtimes), 2))
+    newtrace[:, 0] = newtimes
+    newtrace[:, 1] = newsignal
     return newtrace
+
+
+def decimate_minmax(trace, bestlength=500):
+    """
+    Keeps the time bins with the minimum and the maximum intensity of
+    `bestlength // 2` intervals (min/max envelope). Spikes and dips
+    are preserved, but the average intensity is not.
+    """
+    teiler = max(len(trace) // max(bestlength // 2, 1), 1)
+    newlength = len(trace) // teiler
+    blocks = trace[:newlength*teiler, 1].reshape(newlength, teiler)
+    offset = np.arange(newlength) * teiler
+    idx = [offset + np.argmin(blocks, axis=1),
+           offset + np.argmax(blocks, axis=1)]
+    if len(trace) % teiler != 0:
+        rest = trace[newlength*teiler:, 1]
+        idx.append(newlength*teiler + np.array([np.argmin(rest),
+                                                np.argmax(rest)]))
+    return trace[np.unique(np.concatenate(idx))]
+
+
+def decimate_lttb(trace, bestlength=500):
+    """
+    Largest-Triangle-Three-Buckets downsampling to `bestlength`
+    points (Steinarsson, 2013). The first and last time bins are
+    kept; from each of the `bestlength - 2` buckets in between, the
+    bin that spans the largest triangle with the previously selected
+    bin and the average of the next bucket is selected.
+    """
+    size = len(trace)
+    nbuckets = bestlength - 2
+    if nbuckets < 1 or size <= bestlength:
+        return trace
+    edges = np.floor(np.arange(nbuckets+1) * (size-2) / nbuckets).astype(
+        np.int64) + 1
+    # Averages of the buckets (and of the last bin)
+    cumsum = np.zeros((size+1, 2))
+    np.cumsum(trace, axis=0, out=cumsum[1:])
+    means = (cumsum[edges[1:]] - cumsum[edges[:-1]]) \
+        / np.diff(edges).reshape(-1, 1)
+    means = np.concatenate((means, trace[-1:]))
+
+    selected = np.zeros(bestlength, dtype=np.int64)
+    selected[-1] = size - 1
+    ax, ay = trace[0]
+    for ii in range(nbuckets):
+        bucket = trace[edges[ii]:edges[ii+1]]
+        cx, cy = means[ii+1]
+        area = np.abs((ax - cx) * (bucket[:, 1] - ay)
+                      - (ax - bucket[:, 0]) * (cy - ay))
+        jj = np.argmax(area)
+        selected[ii+1] = edges[ii] + jj
+        ax, ay = bucket[jj]
+    return trace[selected]
+
+
+def find_sections(lines, markers):
+    """
+    Finds the line indices of section markers in one pass.
+
+    `markers` maps a name to a function that returns True for the
+    lines that mark the section. Returns a dictionary that maps
+    each name to the list of indices of the matching lines.
+    """
+    offsets = {name: [] for name in markers}
+    for ii, line in enumerate(lines):
+        for name, match in markers.items():
+            if match(line):
+                offsets[name].append(ii)
+    return offsets
+
+
+def parse_numeric_block(lines, delimiter=None):
+    """
+    Parses lines of numbers into a 2D array in one go.
+
+    This is much faster than converting the values one at a time.
+    By default, the values are separated by whitespace (leading
+    tabs are ignored). Empty lines are skipped.
+    """
+    if len(lines) == 0:
+        return np.zeros((0, 0))
+    return np.loadtxt(lines, delimiter=delimiter, ndmin=2)
+
+
+def read_numeric_block(fd, rows, delimiter=None, skip=0):
+    """
+    Reads `rows` lines of numbers from the file object `fd` after
+    skipping `skip` lines and returns them as a 2D array (see
+    `parse_numeric_block`). The file position is after the block,
+    so that only one block is kept in memory at a time.
+    """
+    lines = list(itertools.islice(fd, skip, skip + rows))
+    return parse_numeric_block(lines, delimiter)
+
+
+#: available methods of `downsample_trace`
+DECIMATION_METHODS = {"mean": decimate_mean,
+                      "minmax": decimate_minmax,
+                      "lttb": decimate_lttb,
+                      }
@@ -14,7 +14,7 @@ class Trace(object):
     """
 
     def __init__(self, trace=None, countrate=None, duration=None,
-                 name=None):
+                 name=None, pyramid=None):
         """ Load trace data
 
         Parameters
@@ -29,6 +29,8 @@ class Trace(object):
             Mandatory if `trace` is None.
         name : str
             The name of the trace.
+        pyramid : instance of TracePyramid
+            Optional full resolution of the trace, see `zoom`.
         """
         self._countrate = None
         self._duration = None
@@ -45,6 +47,7 @@ class Trace(object):
             name = "{:.2f}kHz, {:.0f}s".format(self.countrate,
                                                self.duration/1000)
         self.name = name
+        self.pyramid = pyramid
 
     def __getitem__(self, idx):
         return self.trace[idx]
@@ -85,6 +88,23 @@ class Trace(object):
             raise ValueError("Cannot set duration; `self.trace` is set.")
         self._duration = value
 
+    def zoom(self, start=None, stop=None, bestlength=500):
+        """ Trace between `start` and `stop` [ms]
+
+        Returns an array of shape (N, 2) with the finest level of
+        `self.pyramid` that has no more than `bestlength` points in
+        the interval. Without pyramid, `self.trace` is cropped.
+        """
+        if self.pyramid is not None:
+            return self.pyramid.trace(start, stop, bestlength)
+        trace = self.trace
+        valid = np.ones(trace.shape[0], dtype=bool)
+        if start is not None:
+            valid &= trace[:, 0] >= start
+        if stop is not None:
+            valid &= trace[:, 0] <= stop
+        return trace[valid]
+
     @property
     def uid(self):
         if self._uid is None:
@@ -113,3 +133,112 @@ class Trace(object):
             raise ValueError("Shape of array must be (N,2)!")
         self._trace = value
         # self.countrate is set automagically
+
+
+class TracePyramid(object):
+    """ multi-resolution intensity trace
+
+    Level 0 contains the photon counts in time bins of width
+    `binwidth`; every following level is a factor 2 coarser (sum of
+    two neighboring bins, an incomplete last bin is dropped). The
+    counts are stored with the smallest sufficient integer dtype and
+    the time axis is implicit.
+    """
+
+    def __init__(self, counts, binwidth, start=0, minlength=2):
+        """ Build the pyramid
+
+        Parameters
+        ----------
+        counts : 1d ndarray
+            Photon counts (or summed photon weights) of each time bin.
+        binwidth : float
+            Width of the time bins of `counts` in milliseconds.
+        start : float
+            Start time of the first bin in milliseconds.
+        minlength : int
+            Coarsening stops before a level would have less than
+            `minlength` bins.
+        """
+        counts = np.asarray(counts)
+        if counts.ndim != 1 or counts.shape[0] == 0:
+            raise ValueError("`counts` must be a non-empty 1d array!")
+        if binwidth <= 0:
+            raise ValueError("`binwidth` must be positive!")
+        if np.issubdtype(counts.dtype, np.integer) or \
+                np.all(np.mod(counts, 1) == 0):
+            counts = counts.astype(np.int64)
+        else:
+            counts = counts.astype(np.float64)
+        self.binwidth = float(binwidth)
+        self.start = float(start)
+        self.levels = [self._compact(counts)]
+        while counts.shape[0] // 2 >= max(minlength, 1):
+            size = counts.shape[0] // 2 * 2
+            counts = counts[:size:2] + counts[1:size:2]
+            self.levels.append(self._compact(counts))
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __repr__(self):
+        return "TracePyramid with {} levels of {} to {} bins".format(
+            len(self), self.levels[-1].shape[0], self.levels[0].shape[0])
+
+    @staticmethod
+    def _compact(counts):
+        if np.issubdtype(counts.dtype, np.floating) or np.min(counts) < 0:
+            return counts
+        return counts.astype(np.min_scalar_type(int(np.max(counts))))
+
+    @property
+    def nbytes(self):
+        """Memory used by all levels [bytes]"""
+        return sum(lev.nbytes for lev in self.levels)
+
+    def level(self, level):
+        """ Trace of one level
+
+        Returns an array of shape (N, 2) with the time [ms] at the
+        center of each bin and the count rate [kHz].
+        """
+        counts = self.levels[level]
+        width = self.binwidth * 2**level
+        trace = np.zeros((counts.shape[0], 2))
+        trace[:, 0] = self.start + (np.arange(counts.shape[0]) + .5) * width
+        trace[:, 1] = counts / width
+        return trace
+
+    def select(self, start=None, stop=None, bestlength=500):
+        """ Finest level with at most `bestlength` bins in the interval
+
+        `start` and `stop` are given in ms. The coarsest level is
+        returned if no level is coarse enough.
+        """
+        for ii in range(len(self)):
+            width = self.binwidth * 2**ii
+            first = 0
+            last = self.levels[ii].shape[0]
+            if start is not None:
+                first = max(first, int(np.floor((start-self.start)/width)))
+            if stop is not None:
+                last = min(last, int(np.ceil((stop-self.start)/width)))
+            if last - first <= bestlength:
+                return ii
+        return len(self) - 1
+
+    def trace(self, start=None, stop=None, bestlength=500):
+        """ Trace between `start` and `stop` [ms]
+
+        The level is chosen with `select`; returns an array of
+        shape (N, 2) like `level`.
+        """
+        level = self.select(start, stop, bestlength)
+        trace = self.level(level)
+        width = self.binwidth * 2**level
+        valid = np.ones(trace.shape[0], dtype=bool)
+        if start is not None:
+            valid &= trace[:, 0] + width/2 > start
+        if stop is not None:
+            valid &= trace[:, 0] - width/2 < stop
+        return trace[valid]
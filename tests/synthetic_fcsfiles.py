@@ -0,0 +1,241 @@
+"""
+Synthetic correlation data files for the reader tests
+
+The files written here mimic the layout of the files written by the
+instrument software as far as it is evaluated by the readers in
+`pycorrfit.readfiles`.
+"""
+import numpy as np
+
+
+def correlation_curve(size=150, seed=42):
+    """Return lag times [s] and a noisy diffusion correlation curve"""
+    rng = np.random.default_rng(seed)
+    tau = 2e-7 * 1.2**np.arange(size)
+    corr = 1 + .1 / (1 + tau / 1e-4) + rng.normal(0, 1e-3, size)
+    return tau, corr
+
+
+def count_rate(size=1000, seed=42):
+    """Return times [s] and a count rate [Hz]"""
+    rng = np.random.default_rng(seed)
+    time = np.arange(size) * 1e-3
+    rate = rng.poisson(50, size) * 1000.
+    return time, rate
+
+
+def write_confocor3(path, repetitions=2, tracelength=1000, corrlength=150,
+                    cross=True):
+    """Write a synthetic multi-curve Zeiss ConfoCor3 .fcs file
+
+    Every repetition consists of an autocorrelation data set with
+    count rate for each detector ("Ch1", "Ch2") and, if `cross` is
+    set, the two cross-correlation data sets. A final data set
+    without data mimics an average computed by the software.
+    """
+    detectors = ["Ch1", "Ch2"] if cross else ["Ch1"]
+    lines = ["Carl Zeiss ConfoCor3 - measurement data file - "
+             "version 3.0 ANSI",
+             "BEGIN ConfoCor3ExperimentRecord 3.0"]
+    datasets = []
+    for rep in range(repetitions):
+        acqtime = "2015-05-05T14:{:02d}:00".format(rep)
+        for ii, det in enumerate(detectors):
+            datasets.append(
+                (acqtime, "Auto-correlation detector " + det,
+                 count_rate(tracelength, seed=10*rep+ii),
+                 correlation_curve(corrlength, seed=10*rep+ii)))
+        if cross:
+            datasets.append(
+                (acqtime, "Cross-correlation detector Ch1 versus detector Ch2",
+                 None, correlation_curve(corrlength, seed=10*rep+5)))
+            datasets.append(
+                (acqtime, "Cross-correlation detector Ch2 versus detector Ch1",
+                 None, correlation_curve(corrlength, seed=10*rep+6)))
+    datasets.append(("", "Auto-correlation detector Ch1", None, None))
+    for jj, (acqtime, channel, trace, corr) in enumerate(datasets):
+        lines.append("\tBEGIN FcsDataSet {}".format(jj))
+        lines.append("\t\tAcquisitionTime = {}".format(acqtime))
+        lines.append("\t\tChannel = {}".format(channel))
+        if trace is None:
+            lines.append("\t\tCountRateArray = 0 0")
+        else:
+            lines.append("\t\tCountRateArray = {} 2".format(len(trace[0])))
+            lines += ["\t\t\t{:.6f}\t{:.3f}".format(*row)
+                      for row in zip(*trace)]
+        if corr is None:
+            lines.append("\t\tCorrelationArraySize = 0")
+            lines.append("\t\tCorrelationArray = 0 0")
+        else:
+            lines.append("\t\tCorrelationArraySize = {}".format(len(corr[0])))
+            lines.append("\t\tCorrelationArray = {} 2".format(len(corr[0])))
+            lines += ["\t\t\t{:.10e}\t{:.8f}".format(*row)
+                      for row in zip(*corr)]
+        lines.append("\tEND")
+    lines.append("END")
+    with open(path, "w", encoding="iso8859_15") as fd:
+        fd.write("\n".join(lines) + "\n")
+    return path
+
+
+def write_confocor3_single(path, tracelength=1000, corrlength=150):
+    """Write a synthetic single-curve Zeiss ConfoCor2/3 .fcs file"""
+    time, rate = count_rate(tracelength)
+    tau, corr = correlation_curve(corrlength)
+    lines = ["##TITLE=Synthetic",
+             "##DATA TYPE=FCS Count Rates",
+             "##NPOINTS={}".format(tracelength),
+             "##XYDATA=(X,Y)",
+             "##UNITS=s,kHz"]
+    lines += ["{:.6f}, {:.3f}".format(t, r / 1000) for t, r in zip(time, rate)]
+    lines += ["##DATA TYPE=FCS Correlogram",
+              "##NPOINTS={}".format(corrlength + 1),
+              "##XYDATA=(X,Y)",
+              "{:.10e}, {:.8f}".format(0, corr[0])]
+    lines += ["{:.10e}, {:.8f}".format(t * 1000, c) for t, c in zip(tau, corr)]
+    lines.append("##END=")
+    with open(path, "w", encoding="iso8859_15") as fd:
+        fd.write("\n".join(lines) + "\n")
+    return path
+
+
+def _fmt_rows(columns, fmt, sep="\t", prefix="", suffix=""):
+    return [prefix + sep.join(fmt.format(v) for v in row) + suffix
+            for row in zip(*columns)]
+
+
+def write_alv6000(path, mode="SINGLE AUTO CH0", runs=1, corrlength=150,
+                  tracelength=300):
+    """Write a synthetic ALV-6000 .ASC file
+
+    Dual modes have two correlation and count rate columns. With
+    several `runs`, the correlation curves of each run and their
+    average are stored ("Correlation (Multi, Averaged)").
+    """
+    dual = not mode.lower().count("single")
+    tau, corr = correlation_curve(corrlength)
+    time, rate = count_rate(tracelength)
+    lines = ["ALV-6000/E-WIN Data",
+             'Date :\t"2/20/2012"',
+             'Mode :\t"{}"'.format(mode),
+             "Duration [s] :\t{}".format(int(tracelength * 1e-3)),
+             ""]
+    if runs > 1:
+        curves = [corr + .01 * ii for ii in range(runs)]
+        curves.append(np.mean(curves, axis=0))
+        lines.append('"Correlation (Multi, Averaged)"')
+        names = ['"Run {}"'.format(ii + 1) for ii in range(runs)]
+        lines.append("\t".join(['"Lag [ms]"'] + names + ['"Average"', ""]))
+        lines += _fmt_rows([tau * 1000] + [c - 1 for c in curves],
+                           "{:17.5E}", suffix="\t")
+    else:
+        curves = [corr, corr + .01] if dual else [corr]
+        lines.append('"Correlation"')
+        lines += _fmt_rows([tau * 1000] + [c - 1 for c in curves],
+                           "{:17.5E}")
+    lines += ["", '"Count Rate"']
+    rates = [rate / 1000, rate / 2000] if dual else [rate / 1000]
+    lines += _fmt_rows([time] + rates, "{:17.5f}")
+    lines += ["", "Monitor Diode", "{:17.5f}\t{:17.5f}".format(1, 2)]
+    with open(path, "w", encoding="iso8859_15") as fd:
+        fd.write("\r\n".join(lines) + "\r\n")
+    return path
+
+
+def write_alv7004(path, corrlength=150, tracelength=300):
+    """Write a synthetic ALV-7004/USB .ASC file (FCCS mode)"""
+    tau, corr = correlation_curve(corrlength)
+    time, rate = count_rate(tracelength)
+    lines = ["ALV-7004/USB",
+             'Date :\t"20.02.2015"',
+             'Mode :\t"A-CH0+1  C-CH0/1+1/0"',
+             "",
+             '"Correlation"']
+    lines += _fmt_rows([tau * 1000, corr - 1, corr - .9, corr - 1.05,
+                        corr - 1.04], "{:17.5E}")
+    lines += ["", '"Count Rate"']
+    lines += _fmt_rows([time, rate / 1000, rate / 2000, rate / 1000,
+                        rate / 2000], "{:17.5f}")
+    with open(path, "w", encoding="iso8859_15") as fd:
+        fd.write("\r\n".join(lines) + "\r\n")
+    return path
+
+
+def write_sin(path, mode="Quad", corrlength=150, tracelength=300):
+    """Write a synthetic correlator.com .SIN file
+
+    `mode` is either one of the named modes ("Single Auto",
+    "Single Cross", "Dual Auto", "Dual Cross", "Quad") or an integer
+    mode such as "2 3 3 2" (pairs of channel numbers).
+    """
+    tau, corr = correlation_curve(corrlength)
+    time, rate = count_rate(tracelength)
+    ncorr = {"Single Auto": 1, "Single Cross": 1, "Dual Auto": 2,
+             "Dual Cross": 2, "Quad": 4}
+    if mode in ncorr:
+        curves = [corr + .01 * ii for ii in range(ncorr[mode])]
+        rates = [rate, rate / 2]
+    else:
+        curves = [corr + .01 * ii for ii in range(len(mode.split()) // 2)]
+        nch = max(int(m) for m in mode.split()) + 1
+        rates = [rate / (ii + 1) for ii in range(nch)]
+    lines = ["FLXA", "Version= 1d", "", "[Parameters]",
+             "Mode= {}".format(mode), "", "[CorrelationFunction]"]
+    lines += _fmt_rows([tau] + curves, "{:e}")
+    lines += ["", "[RawCorrelationFunction]"]
+    lines += _fmt_rows([tau] + curves, "{:e}")
+    lines += ["", "[IntensityHistory]",
+              "TraceNumber= {}".format(tracelength)]
+    lines += _fmt_rows([time] + rates, "{:f}")
+    lines += ["", "[Histogram]", "1\t2"]
+    with open(path, "w") as fd:
+        fd.write("\n".join(lines) + "\n")
+    return path
+
+
+def write_cor(path, corrlength=150):
+    """Write a synthetic PicoQuant .cor file"""
+    tau, corr = correlation_curve(corrlength)
+    lines = ["TTTR Correlator Export",
+             "PicoHarp Software version 3.0.0.3 format version 3.0",
+             "Mode: T2",
+             "Tau resolution [s]: 0.00000002500000",
+             "",
+             " taustep       tau/s        G(A,A)    G(B,B)    G(A,B)"]
+    lines += _fmt_rows([np.arange(corrlength), tau, corr - 1, corr - .9,
+                        corr - 1.05], "{:>12}", sep=" ")
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write("\n".join(lines) + "\n")
+    return path
+
+
+def write_csv(path, cross=False, weights=False, corrlength=150,
+              tracelength=300):
+    """Write a synthetic PyCorrFit .csv file like the export
+
+    With `weights`, the correlation is stored with fit, residuals
+    and weights columns.
+    """
+    tau, corr = correlation_curve(corrlength)
+    time, rate = count_rate(tracelength)
+    lines = ["# This file was created using PyCorrFit",
+             "#",
+             "# Type AC/CC\t{}".format("Cross-correlation 12" if cross
+                                       else "Autocorrelation"),
+             "#", "#"]
+    if weights:
+        lines.append("# Lag time [s]\tExperimental correlation\t"
+                     "Fitted correlation\tResiduals \t Weights [spline (5)] ")
+        lines += _fmt_rows([tau, corr - 1, corr - 1, 0 * tau, tau * 0 + .01],
+                           "{:.10e}")
+    else:
+        lines.append("# Lag time [s]\tCorrelation function")
+        lines += _fmt_rows([tau, corr - 1], "{:.10e}")
+    traces = [rate / 1000, rate / 2000] if cross else [rate / 1000]
+    for ii, tr in enumerate(traces):
+        lines += ["#", "#", "# BEGIN SECOND TRACE" if ii else "# BEGIN TRACE",
+                  "#", "# Time [s]\tIntensity trace [kHz] "]
+        lines += _fmt_rows([time, tr], "{:.10e}")
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write("\r\n".join(lines) + "\r\n")
+    return path
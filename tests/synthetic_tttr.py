@@ -0,0 +1,80 @@
+"""
+Synthetic PicoQuant T3 photon data for the TTTR correlator tests
+
+The files written here only contain the header fields that are
+evaluated by `read_pt3_scripts.import_methods.pt3import`.
+"""
+import struct
+
+import numpy as np
+
+#: size of the .pt3 header up to the first T3 record [bytes]
+PT3_HEADER_SIZE = 728
+WRAPAROUND = 65536
+
+
+def photon_stream(duration=1.0, syncrate=1e7, rate=100e3, seed=42,
+                  nchannels=2):
+    """Return sync counts, channels and micro times of photons
+
+    The channels are numbered from 1 to `nchannels`. Photons are
+    emitted in short bursts of a Gaussian shape
+    (diffusing molecules) on top of a constant background, so
+    that the correlation curves are not flat.
+    """
+    rng = np.random.default_rng(seed)
+    nsyncs = int(duration * syncrate)
+    # molecules
+    nburst = rng.poisson(duration * 2000)
+    centers = rng.uniform(0, nsyncs, nburst)
+    sizes = rng.poisson(0.7 * rate / 2000, nburst)
+    burst = np.repeat(centers, sizes) \
+        + rng.normal(0, 50e-6 * syncrate, sizes.sum())
+    # background
+    background = rng.uniform(0, nsyncs, rng.poisson(0.3 * rate * duration))
+    nsync = np.concatenate((burst, background)).astype(np.int64)
+    nsync = np.sort(nsync[(nsync >= 0) & (nsync < nsyncs)])
+    channel = rng.integers(1, nchannels + 1, nsync.size)
+    dtime = np.minimum(rng.exponential(300, nsync.size), 4095).astype(int)
+    # photons within one sync period are recorded in order of arrival
+    order = np.lexsort((dtime, nsync))
+    return nsync[order], channel[order], dtime[order]
+
+
+def t3_records(nsync, channel, dtime):
+    """Encode photons as PicoHarp T3 records including overflows"""
+    nofl = nsync[-1] // WRAPAROUND
+    photons = (channel.astype(np.uint32) << 28) \
+        | (dtime.astype(np.uint32) << 16) \
+        | (nsync % WRAPAROUND).astype(np.uint32)
+    overflows = np.full(nofl, 15 << 28, dtype=np.uint32)
+    # Sort overflows before the photons of the same period
+    keys = np.concatenate((2 * nsync + 1,
+                           2 * WRAPAROUND * np.arange(1, nofl + 1)))
+    records = np.concatenate((photons, overflows))
+    return records[np.argsort(keys, kind="stable")]
+
+
+def write_pt3(path, duration=1.0, syncrate=1e7, rate=100e3,
+              resolution=0.016, seed=42, nchannels=2):
+    """Write a synthetic .pt3 file and return its path
+
+    The TCSPC window (4096 * `resolution`) must be shorter than the
+    sync period, otherwise the arrival times are not sorted.
+    """
+    records = t3_records(*photon_stream(duration=duration,
+                                        syncrate=syncrate,
+                                        rate=rate,
+                                        seed=seed,
+                                        nchannels=nchannels))
+    header = bytearray(PT3_HEADER_SIZE)
+    header[:16] = b"PicoHarp 300".ljust(16, b"\x00")
+    header[16:22] = b"2.0".ljust(6, b"\x00")
+    struct.pack_into("f", header, 584, resolution)
+    struct.pack_into("i", header, 704, int(syncrate))
+    struct.pack_into("i", header, 720, records.size)
+    struct.pack_into("i", header, 724, 0)
+    with open(path, "wb") as fd:
+        fd.write(bytes(header))
+        fd.write(records.astype("<u4").tobytes())
+    return path
@@ -1,11 +1,13 @@
 """Constraints of model functions"""
 import os
 
+import lmfit
 import numpy as np
 import pytest
 
 import data_file_dl
 import pycorrfit as pcf
+from pycorrfit.fit import Constraint, ConstraintTransform
 
 NOAPITOKEN = "GITHUB_API_TOKEN" not in os.environ
 
@@ -93,6 +95,168 @@ def test_fit_constraint_sum_smaller_one():
     assert corr.fit_parameters[4] + corr.fit_parameters[5] < 1
 
 
+def synthetic_correlation(modelid, parms, noise=1e-3):
+    tau = np.exp(np.linspace(np.log(1e-4), np.log(1e5), 150))
+    model = pcf.models.modeldict[modelid]
+    data = model(parms, tau)
+    rng = np.random.default_rng(9)
+    data += (rng.random(tau.size) - .5) * noise * np.max(data)
+    return pcf.Correlation(correlation=np.column_stack((tau, data)),
+                           fit_model=modelid)
+
+
+@pytest.mark.parametrize("constraint", [[1, "<", 0],
+                                        [2, ">", 1],
+                                        [2, "<", 0, "0.7"],
+                                        [2, 1, "<", "1"],
+                                        [2, 1, ">", "-1.5"]])
+def test_constraint_transform(constraint):
+    """The numeric transform reproduces the lmfit expressions"""
+    values = np.array([1., .5, 2.])
+    bounds = [[0, np.inf], [-1, 1.5], [0, 3]]
+    con = Constraint(constraint=list(constraint), fit_bool=[True] * 3,
+                     fit_bounds=bounds, fit_values=values)
+    con.update_fit_bounds()
+    kwdelt, kwp1 = con.get_lmfit_parameter_kwargs()
+    params = lmfit.Parameters()
+    for pp in range(3):
+        params.add("parm{:04d}".format(pp), value=values[pp])
+    params.add(**kwdelt)
+    params.add(**kwp1)
+    names = [name for name, par in params.items() if par.vary]
+    transform = ConstraintTransform(
+        names=names, size=3, constraints=[con.get_transform_constraint()])
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        xfree = rng.uniform(-2, 4, len(names))
+        # lmfit clips the values to the boundaries (delta >= 0)
+        xfree = np.clip(xfree, [params[name].min for name in names],
+                        [params[name].max for name in names])
+        for name, val in zip(names, xfree):
+            params[name].value = val
+        params.update_constraints()
+        ref = [params["parm{:04d}".format(pp)].value for pp in range(3)]
+        assert np.allclose(transform(xfree, np.zeros(3)), ref,
+                           rtol=0, atol=1e-13)
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+@pytest.mark.parametrize("algorithm", ["Lev-Mar", "Nelder-Mead"])
+def test_fit_constraint_simple_inequality_synthetic(algorithm):
+    """ Check "smaller than" relation during fitting (synthetic data)
+    """
+    parms = np.array([25, .05, 3, .4, 5, 1, 0])
+    corr = synthetic_correlation(6035, parms)
+    corr.fit_algorithm = algorithm
+    corr.fit_parameters_variable = [True, True, True, True,
+                                    False, False, False]
+    pcf.Fit(corr)
+    assert corr.fit_parameters[1] <= corr.fit_parameters[2]
+    # -> deliberately reverse everything and try again
+    corr.fit_parameters[1], corr.fit_parameters[2] = (corr.fit_parameters[2],
+                                                      corr.fit_parameters[1])
+    corr.fit_parameters[3] = 1-corr.fit_parameters[3]
+    pcf.Fit(corr)
+    assert corr.fit_parameters[1] <= corr.fit_parameters[2]
+    if algorithm == "Lev-Mar":
+        assert np.allclose(corr.fit_parameters, parms, rtol=.05)
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+def test_fit_constraint_sum_smaller_one_synthetic():
+    """ Check "a+b<c" relation during fitting (synthetic data)
+    """
+    parms = np.array([2, .01, 2, 2000, .6, .3, 5, 1, 1, 1e-8, 0, 0])
+    corr = synthetic_correlation(6081, parms)
+    parms0 = parms.copy()
+    parms0[4] = .97
+    parms0[5] = .02
+    corr.fit_parameters = parms0
+    vary = [False] * 12
+    vary[4] = vary[5] = True
+    corr.fit_parameters_variable = vary
+    pcf.Fit(corr)
+    assert corr.fit_parameters[4] + corr.fit_parameters[5] < 1
+    assert np.allclose(corr.fit_parameters[4:6], parms[4:6], rtol=.02)
+    # -> deliberately reverse everything and try again
+    corr.fit_parameters[4], corr.fit_parameters[5] = (corr.fit_parameters[5],
+                                                      corr.fit_parameters[4])
+    pcf.Fit(corr)
+    assert corr.fit_parameters[4] + corr.fit_parameters[5] < 1
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+def test_fit_constraint_sum_smaller_one_synthetic_starts():
+    """ Check "a+b<c" relation when fitting n, τ₁, τ₂, τ₃, F₁, and F₂
+    from several starting points (synthetic data)
+    """
+    parms = np.array([2, .01, 2, 2000, .4, .3, 5, 1, 1, 1e-8, 0, 0])
+    corr = synthetic_correlation(6081, parms)
+    vary = np.zeros(12, dtype=bool)
+    vary[:6] = True
+    corr.fit_parameters_variable = vary
+    corr.fit_parameters = parms
+    pcf.Fit(corr)
+    chi2_ref = corr.fit_results["chi2"]
+    # starting points from which the fits with lmfit expression
+    # strings (PyCorrFit 1.3.1) converge, some with F₁ + F₂ > 1
+    starts = [[1.707, .01092, 1.471, 2604, .8071, .09013],
+              [1.124, .01098, 2.792, 1054, .7636, .1331],
+              [1.186, .00518, 1.586, 2454, .5452, .597],
+              [1.49, .01345, 2.484, 2092, .663, .4846]]
+    for start in starts:
+        parms0 = parms.copy()
+        parms0[:6] = start
+        corr.fit_parameters = parms0
+        pcf.Fit(corr)
+        assert corr.fit_parameters[4] + corr.fit_parameters[5] < 1
+        assert np.allclose(corr.fit_results["chi2"], chi2_ref, rtol=1e-3)
+        assert np.allclose(corr.fit_parameters[:6], parms[:6], rtol=.05)
+
+
+@pytest.mark.parametrize("clipped", [False, True])
+def test_constraint_transform_jacobian(clipped):
+    """`ConstraintTransform.jacobian` matches finite differences
+    (chained constraints of model 6081: τ₃ > τ₂ > τ₁ > τ_trip and
+    F₁ + F₂ < 1)"""
+    parms = np.array([2, .01, 2, 2000, .4, .3, 5, 1, 1, 1e-3, .1, 0])
+    corr = synthetic_correlation(6081, parms)
+    vary = np.zeros(12, dtype=bool)
+    vary[[0, 1, 2, 3, 4, 5, 9]] = True
+    corr.fit_parameters_variable = vary
+    corr.fit_parameters = parms
+    fit = pcf.Fit()
+    fit.set_fit_job(pcf.Fit.get_fit_job(corr))
+    params = fit.get_lmfitparm()
+    transform = fit.transform
+    assert len(transform.constraints) == 4
+    x0 = np.array([params[name].value for name in transform.names])
+    if clipped:
+        # F₂ = 1 - F₁ - δ < 0 and τ_trip = τ₁ - δ < 0 are clipped to 0
+        x0[transform.names.index("delta_5_4")] = .8
+        x0[transform.names.index("delta_9_1")] = .05
+    fixed = fit.lmfitparm2model(params)
+    model_parms = transform(x0, fixed.copy())
+    assert (model_parms[5] == 0) == clipped
+    assert (model_parms[9] == 0) == clipped
+    jac = transform.jacobian(x0, model_parms)
+    assert jac.shape == (12, len(x0))
+    # the transform is piecewise linear, away from the kinks central
+    # differences are exact up to rounding
+    step = 1e-6
+    for ii in range(len(x0)):
+        xplus = x0.copy()
+        xplus[ii] += step
+        xminus = x0.copy()
+        xminus[ii] -= step
+        diff = (transform(xplus, fixed.copy())
+                - transform(xminus, fixed.copy())) / (2*step)
+        assert np.allclose(jac[:, ii], diff, rtol=1e-6, atol=1e-9), \
+            transform.names[ii]
+    if clipped:
+        assert np.all(jac[[5, 9]] == 0)
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
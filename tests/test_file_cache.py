@@ -0,0 +1,140 @@
+"""Test the on-disk cache of parsed data files"""
+import os
+
+import numpy as np
+
+from pycorrfit import readfiles
+
+import synthetic_fcsfiles
+import synthetic_tttr
+
+
+def assert_same(a, b):
+    assert type(a) is type(b)
+    if isinstance(a, np.ndarray):
+        assert a.dtype == b.dtype
+        assert np.array_equal(a, b, equal_nan=True)
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b)
+        for ai, bi in zip(a, b):
+            assert_same(ai, bi)
+    elif isinstance(a, dict):
+        assert list(a.keys()) == list(b.keys())
+        for key in a:
+            assert_same(a[key], b[key])
+    elif hasattr(a, "__dict__"):
+        assert_same(a.__dict__, b.__dict__)
+    else:
+        assert a == b
+
+
+def test_cache_pt3(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3", duration=.5)
+    cache = readfiles.ParsedFileCache(tmp_path / "cache")
+    ref = readfiles.open_any(path, segment_length=.1)
+    data = readfiles.open_any(path, cache=cache, segment_length=.1)
+    assert_same(ref, data)
+    assert len(list(cache.directory.glob("*.npz"))) == 1
+    # loaded from the cache
+    data = readfiles.open_any(path, cache=cache, segment_length=.1)
+    assert_same(ref, data)
+    assert np.allclose(data["Segments"][0].correlation(exclude=[1])[:, 1],
+                       ref["Segments"][0].correlation(exclude=[1])[:, 1],
+                       equal_nan=True)
+    zoom = readfiles.get_traces(data)[0][0].zoom(0, 100)
+    assert np.array_equal(zoom, readfiles.get_traces(ref)[0][0].zoom(0, 100))
+    assert zoom.shape == (4, 2)
+    # other parameters
+    readfiles.open_any(path, cache=cache)
+    assert len(list(cache.directory.glob("*.npz"))) == 2
+
+
+def test_cache_hit_and_invalidation(tmp_path):
+    path = synthetic_fcsfiles.write_sin(tmp_path / "test.sin")
+    cache = readfiles.ParsedFileCache(tmp_path / "cache")
+    calls = []
+
+    def reader(path):
+        calls.append(path)
+        return readfiles.openSIN(path)
+
+    data1 = cache.open(path, reader)
+    data2 = cache.open(path, reader)
+    assert len(calls) == 1
+    assert_same(data1, data2)
+    # modified file
+    synthetic_fcsfiles.write_sin(path, mode="Dual Auto")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    data3 = cache.open(path, reader)
+    assert len(calls) == 2
+    assert data3["Type"] == ["AC1", "AC2"]
+
+
+def test_cache_lru(tmp_path):
+    cache = readfiles.ParsedFileCache(tmp_path / "cache")
+    data = {"Correlation": [np.zeros((100, 2))], "Type": ["AC"]}
+    for ii, key in enumerate("abc"):
+        assert cache.put(key, data)
+        entry = cache.directory / (key + ".npz")
+        os.utime(entry, ns=(ii * 10**9, ii * 10**9))
+    size = (cache.directory / "a.npz").stat().st_size
+    # mark "a" as recently used
+    assert_same(cache.get("a"), data)
+    cache.max_size = 2 * size
+    cache.evict()
+    assert sorted(ff.stem for ff in cache.directory.glob("*.npz")) \
+        == ["a", "c"]
+    assert cache.get("b") is None
+    cache.clear()
+    assert cache.size == 0
+
+
+def test_cache_unsupported(tmp_path):
+    cache = readfiles.ParsedFileCache(tmp_path / "cache")
+    assert not cache.put("a", {"Trace": [object()]})
+    assert cache.get("a") is None
+    # corrupt entries are removed
+    cache.directory.mkdir()
+    (tmp_path / "cache" / "b.npz").write_bytes(b"no zip file")
+    assert cache.get("b") is None
+    assert not (tmp_path / "cache" / "b.npz").exists()
+
+
+def test_cache_stale_entries(tmp_path):
+    """Entries that cannot be decoded are removed and re-parsed"""
+    path = synthetic_fcsfiles.write_sin(tmp_path / "test.sin")
+    cache = readfiles.ParsedFileCache(tmp_path / "cache")
+    calls = []
+
+    def reader(path):
+        calls.append(path)
+        return readfiles.openSIN(path)
+
+    key = cache.get_key(path, reader, {})
+    entry = cache.directory / (key + ".npz")
+    manifests = [None,  # no manifest
+                 "{no json",
+                 # class that is not in `CACHEABLE_CLASSES`
+                 '{"object": "Removed", "state": {"dict": []}}',
+                 # missing array
+                 '{"array": "a100"}',
+                 ]
+    for ii, manifest in enumerate(manifests):
+        cache.directory.mkdir(exist_ok=True)
+        arrays = {"a0": np.zeros(3)}
+        if manifest is not None:
+            arrays["manifest"] = np.array(manifest)
+        np.savez(entry, **arrays)
+        assert cache.get(key) is None
+        assert not entry.exists()
+        np.savez(entry, **arrays)
+        data = cache.open(path, reader)
+        assert len(calls) == ii + 1
+        assert_same(data, readfiles.openSIN(path))
+        # the entry was replaced
+        assert_same(cache.get(key), data)
+    # truncated entry
+    entry.write_bytes(entry.read_bytes()[:100])
+    assert cache.get(key) is None
+    assert not entry.exists()
@@ -2,6 +2,9 @@
 
 import os
 from os.path import split
+import subprocess
+import sys
+import time
 import warnings
 
 import numpy as np
@@ -9,6 +12,10 @@ import pytest
 
 import data_file_dl
 import pycorrfit
+from pycorrfit.readfiles import util
+
+import synthetic_fcsfiles
+import synthetic_tttr
 
 # Files that are known to not work
 exclude = []
@@ -234,6 +241,226 @@ def test_sin_all_open():
         assert data
 
 
+def test_fcs_confocor3_synthetic(tmp_path):
+    path = synthetic_fcsfiles.write_confocor3(tmp_path / "test.fcs",
+                                              repetitions=3,
+                                              tracelength=12345)
+    data = pycorrfit.readfiles.open_any(path)
+    assert data["Type"] == ["AC1", "AC2", "CC12", "CC21"] * 3
+    tau, corr = synthetic_fcsfiles.correlation_curve(seed=11)
+    assert np.allclose(data["Correlation"][5][:, 0], tau * 1000)
+    assert np.allclose(data["Correlation"][5][:, 1], corr - 1)
+    time, rate = synthetic_fcsfiles.count_rate(12345, seed=11)
+    # The trace is downsampled while reading
+    trace = data["Trace"][5]
+    assert trace.shape == (515, 2)
+    assert np.allclose(trace[0], [23, np.mean(rate[:24]) / 1000])
+    assert np.all(data["Trace"][6][1] == trace)
+    # single curve files
+    path = synthetic_fcsfiles.write_confocor3_single(tmp_path / "single.fcs")
+    data = pycorrfit.readfiles.open_any(path)
+    tau, corr = synthetic_fcsfiles.correlation_curve()
+    # the lag time zero is removed
+    assert np.allclose(data["Correlation"][0][:, 0], tau * 1000)
+    assert np.allclose(data["Correlation"][0][:, 1], corr - 1)
+    assert data["Trace"][0].shape == (500, 2)
+
+
+@pytest.mark.parametrize("writer,kwargs,types", [
+    (synthetic_fcsfiles.write_alv6000, {"mode": "SINGLE AUTO CH0"},
+     ["AC CH0"]),
+    (synthetic_fcsfiles.write_alv6000, {"mode": "DUAL CROSS"},
+     ["CC CC10"]),
+    (synthetic_fcsfiles.write_alv6000, {"runs": 3},
+     ["AC CH0", "AC CH0", "AC CH0", "CH0 average"]),
+    (synthetic_fcsfiles.write_alv7004, {}, ["AC1", "AC2", "CC12", "CC21"]),
+    (synthetic_fcsfiles.write_sin, {"mode": "Quad"},
+     ["AC1", "AC2", "CC12", "CC21"]),
+    (synthetic_fcsfiles.write_sin, {"mode": "2 3 3 2 0 1 1 0"},
+     ["CC23", "CC32", "CC01", "CC10"]),
+    (synthetic_fcsfiles.write_cor, {}, ["AC", "CC", "AC"]),
+    (synthetic_fcsfiles.write_csv, {"cross": True}, ["CC12"]),
+    (synthetic_fcsfiles.write_csv, {"weights": True}, ["AC"]),
+])
+def test_reader_throughput(tmp_path, writer, kwargs, types):
+    """Parse large synthetic files and report the throughput"""
+    ext = {"write_alv6000": ".ASC", "write_alv7004": ".ASC",
+           "write_sin": ".sin", "write_cor": ".cor", "write_csv": ".csv"}
+    name = writer.__name__
+    if name != "write_cor":
+        kwargs["tracelength"] = 200000
+    path = writer(tmp_path / ("test" + ext[name]), **kwargs)
+    t0 = time.perf_counter()
+    data = pycorrfit.readfiles.open_any(path)
+    duration = time.perf_counter() - t0
+    rate = path.stat().st_size / duration / 1024**2
+    print("{} {}: {:.1f} MB/s".format(name, kwargs, rate))
+    assert data["Type"] == types
+    tau, corr = synthetic_fcsfiles.correlation_curve()
+    # (.sin files: the last lag time is not imported)
+    size = len(data["Correlation"][0])
+    assert size >= len(tau) - 1
+    assert np.allclose(data["Correlation"][0][:, 0], tau[:size] * 1000,
+                       rtol=1e-5)
+    assert np.allclose(data["Correlation"][0][:, 1], corr[:size] - 1,
+                       atol=1e-5)
+    if name not in ["write_cor", "write_csv"]:
+        for trace in data["Trace"]:
+            if isinstance(trace, list):
+                trace = trace[0]
+            # traces are downsampled while reading
+            assert len(trace) < 1000
+    # This is a very loose lower limit (parsing line by line, the
+    # readers managed 2 to 25 MB/s with these files).
+    assert rate > 1
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_open_many(tmp_path, n_workers):
+    paths = [synthetic_fcsfiles.write_confocor3(tmp_path / "test{}.fcs".format(
+        ii), repetitions=ii+1) for ii in range(3)]
+    paths.append(synthetic_fcsfiles.write_sin(tmp_path / "test.sin"))
+    bad = tmp_path / "bad.ASC"
+    bad.write_text("ALV-6000/E-WIN Data\nno data\n")
+    paths.append(bad)
+    results = list(pycorrfit.readfiles.open_many(paths, n_workers=n_workers))
+    assert sorted(str(rr[0]) for rr in results) == sorted(map(str, paths))
+    for path, data, excpt in results:
+        if path == bad:
+            assert data is None
+            assert excpt is not None
+        else:
+            assert excpt is None
+            ref = pycorrfit.readfiles.open_any(path)
+            assert data["Type"] == ref["Type"]
+            for corr, refcorr in zip(data["Correlation"], ref["Correlation"]):
+                assert np.all(corr == refcorr)
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_open_many_reader_kwargs(tmp_path, n_workers):
+    """Reader options are only passed to the readers that accept them"""
+    pt3 = synthetic_tttr.write_pt3(tmp_path / "test.pt3", duration=.5)
+    sin = synthetic_fcsfiles.write_sin(tmp_path / "test.sin")
+    results = dict((rr[0], rr[1:]) for rr in pycorrfit.readfiles.open_many(
+        [pt3, sin], n_workers=n_workers, segment_length=.1))
+    for data, excpt in results.values():
+        assert excpt is None
+    ref = pycorrfit.readfiles.open_any(pt3, segment_length=.1)
+    assert len(results[pt3][0]["Segments"]) == len(ref["Segments"])
+    assert results[sin][0]["Type"] == pycorrfit.readfiles.open_any(sin)["Type"]
+    # single files are still strict
+    with pytest.raises(TypeError):
+        pycorrfit.readfiles.open_any(sin, segment_length=.1)
+
+
+def test_lazy_readers(tmp_path):
+    """The reader modules are imported on first use"""
+    path = synthetic_fcsfiles.write_csv(tmp_path / "test.csv")
+    code = "\n".join([
+        "import sys",
+        "import pycorrfit",
+        "mods = ['pycorrfit.readfiles.read_' + m for m in",
+        "        ['CSV_PyCorrFit', 'pt3_PicoQuant', 'ptu_PicoQuant']]",
+        "print([m in sys.modules for m in mods + ['ptufile']])",
+        "pycorrfit.readfiles.open_any(sys.argv[1])",
+        "print([m in sys.modules for m in mods + ['ptufile']])",
+    ])
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [split(split(pycorrfit.__file__)[0])[0], env.get("PYTHONPATH", "")])
+    out = subprocess.check_output([sys.executable, "-c", code, str(path)],
+                                  env=env, text=True).split("\n")
+    assert out[0] == "[False, False, False, False]"
+    assert out[1] == "[True, False, False, False]"
+    # the readers behave like the reader functions
+    from pycorrfit.readfiles.read_CSV_PyCorrFit import openCSV
+    assert pycorrfit.readfiles.openCSV.load() is openCSV
+    assert pycorrfit.readfiles.openCSV.__name__ == "openCSV"
+    assert pycorrfit.readfiles.openCSV(path)["Type"] == ["AC"]
+
+
+def test_register_filetype(tmp_path, monkeypatch):
+    readfiles = pycorrfit.readfiles
+    for name in ["filetypes_dict", "filetypes_bg_dict", "_extensions",
+                 "_extensions_bg"]:
+        monkeypatch.setattr(readfiles, name,
+                            getattr(readfiles, name).copy())
+
+    def reader(path):
+        return {"Correlation": [], "Trace": [], "Type": [], "Filename": []}
+
+    assert readfiles.get_extension_map(
+        readfiles.filetypes_dict)[".ASC"] is readfiles.openASC
+    readfiles.register_filetype("Test (*.tst)|*.tst;*.TST", reader)
+    assert readfiles.open_any(tmp_path / "a.TST") == reader(None)
+    assert readfiles.open_any_bg(tmp_path / "a.TST") is None
+    assert "tst" in readfiles.get_supported_extensions()
+    allkeys = [key for key in readfiles.filetypes_dict
+               if key.startswith(readfiles.ALL_SUP_STRING)]
+    assert len(allkeys) == 1
+    assert allkeys[0].endswith(";*.tst;*.TST")
+
+
+def test_downsample_trace():
+    rng = np.random.default_rng(42)
+    trace = np.zeros((100001, 2))
+    trace[:, 0] = np.arange(trace.shape[0]) * .1
+    trace[:, 1] = rng.poisson(50, trace.shape[0])
+    trace[12345, 1] = 500
+    # mean binning of 200 bins, the rest is averaged
+    mean = util.downsample_trace(trace)
+    assert mean.shape == (501, 2)
+    assert np.allclose(mean[:-1, 1],
+                       trace[:100000, 1].reshape(500, 200).mean(axis=1))
+    assert np.all(mean[:-1, 0] == trace[199:100000:200, 0])
+    assert np.all(mean[-1] == trace[-1])
+    assert mean[:, 1].max() < 100
+    # the spike is preserved
+    for method in ["minmax", "lttb"]:
+        dec = util.downsample_trace(trace, method=method)
+        assert 450 <= dec.shape[0] <= 501
+        assert np.all(np.diff(dec[:, 0]) > 0)
+        assert dec[:, 1].max() == 500
+        assert np.all(np.isin(dec[:, 0], trace[:, 0]))
+    assert util.downsample_trace(trace, method="minmax")[:, 1].min() == \
+        trace[:, 1].min()
+    # short traces are not changed
+    assert np.all(util.downsample_trace(trace[:499]) == trace[:499])
+    # lists of traces of cross-correlation curves
+    traces = util.downsample_traces([trace, [trace[:10], trace], None])
+    assert np.all(traces[0] == mean)
+    assert np.all(traces[1][1] == mean)
+    assert traces[1][0].shape == (10, 2)
+    assert traces[2] is None
+    with pytest.raises(ValueError, match="Unknown decimation method"):
+        util.downsample_trace(trace, method="median")
+
+
+def test_open_trace_decimation(tmp_path):
+    path = synthetic_fcsfiles.write_confocor3(tmp_path / "test.fcs",
+                                              repetitions=1,
+                                              tracelength=12345)
+    _, rate = synthetic_fcsfiles.count_rate(12345, seed=0)
+    # averaging flattens the maximum of the count rate
+    mean = pycorrfit.readfiles.open_any(path)["Trace"][0]
+    assert mean[:, 1].max() < rate.max() / 1000
+    for method in ["minmax", "lttb"]:
+        data = pycorrfit.readfiles.open_any(path, trace_decimation=method)
+        assert len(data["Trace"][0]) <= 515
+        assert np.isclose(data["Trace"][0][:, 1].max(), rate.max() / 1000)
+    # only passed to the readers that downsample traces
+    csv = synthetic_fcsfiles.write_csv(tmp_path / "test.csv")
+    results = dict((pp, (dd, ee)) for pp, dd, ee in
+                   pycorrfit.readfiles.open_many([path, csv], n_workers=1,
+                                                 trace_decimation="minmax"))
+    assert results[csv][1] is None
+    assert np.isclose(results[path][0]["Trace"][0][:, 1].max(),
+                      rate.max() / 1000)
+    with pytest.raises(ValueError, match="Unknown decimation method"):
+        pycorrfit.readfiles.open_any(path, trace_decimation="median")
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
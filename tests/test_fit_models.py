@@ -124,6 +124,251 @@ def test_fit_single_parameter_with_noise_five_percent():
         raise ValueError("Model tests failed for:\n", faillist)
 
 
+@pytest.mark.parametrize("model", pycorrfit.models.models,
+                         ids=lambda model: str(model.id))
+def test_model_apply_batch(model):
+    """Evaluate a stack of parameter vectors in one call"""
+    tau = np.exp(np.linspace(np.log(TAUMIN), np.log(TAUMAX), TAULEN))
+    rng = np.random.default_rng(42)
+    parms = np.array(model.default_values, dtype=float)
+    stack = parms * (1 + .2 * rng.random((20, parms.size)))
+    labels = model.parameters[0]
+    for ii, label in enumerate(labels):
+        if label.startswith("T"):
+            # switch off the triplet contribution of some curves
+            stack[::3, ii] = 0
+    if "F₁" in labels and "F₂" in labels:
+        # F₁ + F₂ > 1 for some curves of three-component models
+        stack[1::3, labels.index("F₁")] = .7
+        stack[1::3, labels.index("F₂")] = .6
+    ref = np.array([model.apply(pp, tau) for pp in stack])
+    res = model.apply(stack, tau)
+    assert res.shape == (20, TAULEN)
+    assert np.allclose(res, ref, rtol=1e-10, atol=1e-12*np.max(np.abs(ref)))
+    # scalar lag time
+    assert np.allclose(model.apply(stack, tau[5]), ref[:, 5],
+                       rtol=1e-10, atol=1e-12*np.max(np.abs(ref)))
+
+
+@pytest.mark.parametrize("model",
+                         [mm for mm in pycorrfit.models.models
+                          if mm.jacobian is not None],
+                         ids=lambda model: str(model.id))
+def test_model_jacobian(model):
+    """Compare the analytic jacobian to central finite differences"""
+    tau = np.exp(np.linspace(np.log(TAUMIN), np.log(TAUMAX), TAULEN))
+    parms = np.array(model.default_values, dtype=float)
+    parms *= 1 + .1 * np.random.default_rng(7).random(parms.size)
+    jac = model.apply_jacobian(parms, tau)
+    assert jac.shape == (parms.size, TAULEN)
+    for ii in range(parms.size):
+        step = 1e-6 * max(abs(parms[ii]), 1e-3)
+        pplus = parms.copy()
+        pplus[ii] += step
+        pminus = parms.copy()
+        pminus[ii] -= step
+        diff = (model.apply(pplus, tau) - model.apply(pminus, tau)) / (2*step)
+        assert np.allclose(jac[ii], diff, rtol=1e-5,
+                           atol=1e-6*np.max(np.abs(diff))), \
+            model.parameters[0][ii]
+    # stack of parameter vectors
+    stack = np.array([parms, parms * 1.1])
+    jacs = model.apply_jacobian(stack, tau)
+    assert jacs.shape == (2, parms.size, TAULEN)
+    assert np.allclose(jacs[0], jac)
+    assert np.allclose(jacs[1], model.apply_jacobian(parms * 1.1, tau))
+
+
+def test_model_jacobian_missing():
+    model = pycorrfit.models.modeldict[6000]
+    assert model.jacobian is None
+    with pytest.raises(ValueError, match="does not define a jacobian"):
+        model.apply_jacobian(model.default_values, np.ones(3))
+
+
+def fit_variable(modelid, tau, data, start, variable):
+    """
+    Fit `data` with the parameters `variable` varied, starting at the
+    parameter set `start`. Returns the fitted `Correlation`.
+    """
+    corr = Correlation(fit_model=modelid, fit_algorithm=FITALG,
+                       correlation=np.column_stack((tau, data)))
+    fit_bool = np.zeros(len(start), dtype=bool)
+    fit_bool[variable] = True
+    corr.fit_parameters_variable = fit_bool
+    corr.fit_parameters = np.array(start, dtype=float)
+    Fit(corr)
+    return corr
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+@pytest.mark.parametrize("modelid,variable", [
+    (6011, [0, 1, 2, 3]),  # constraint τ_diff > τ_trip
+    (6035, [0, 1, 2, 3]),  # constraint τ₂ > τ₁
+    (6082, [0, 1, 2, 4, 5]),  # constraints τ₂ > τ₁ and F₁ + F₂ < 1
+    (6013, [0, 3]),  # TIRF
+    (6034, [0, 1, 3]),  # TIRF, constraint D₂ > D₁
+])
+def test_fit_jacobian(monkeypatch, modelid, variable):
+    """Fits with the analytic jacobian and with finite differences
+    (including constraints) agree"""
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), TAULEN))
+    model = pycorrfit.models.modeldict[modelid]
+    parms = np.array(model.default_values, dtype=float)
+    if modelid == 6082:
+        parms[5] = .2
+    rng = np.random.default_rng(3)
+    data = model(parms, tau)
+    data += (rng.random(TAULEN) - .5) * 1e-3 * np.max(data)
+    start = parms.copy()
+    start[variable] *= .8
+
+    corr_jac = fit_variable(modelid, tau, data, start, variable)
+    monkeypatch.setattr(model, "_jacobian", None)
+    corr_num = fit_variable(modelid, tau, data, start, variable)
+    assert np.allclose(corr_jac.fit_results["chi2"],
+                       corr_num.fit_results["chi2"], rtol=1e-3)
+    assert np.allclose(corr_jac.fit_parameters, corr_num.fit_parameters,
+                       rtol=1e-3)
+    assert np.allclose(corr_jac.fit_parameters, parms, rtol=.05)
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+@pytest.mark.parametrize("use_least_squares", [False, True])
+@pytest.mark.parametrize("modelid,chi2_base", [
+    # Chi² of the fits with lmfit expression strings (PyCorrFit 1.3.1)
+    (6081, 5.04300751687573e-07),
+    (6082, 5.032322680702256e-07),
+])
+def test_fit_constraint_several_starts(monkeypatch, use_least_squares,
+                                       modelid, chi2_base):
+    """Constrained fits (F₁ + F₂ < 1, τ₂ > τ₁) do not get stuck at the
+    constraint when n, τ₁, τ₂, F₁ and F₂ are varied together"""
+    monkeypatch.setattr(Fit, "use_least_squares", use_least_squares)
+    variable = [0, 1, 2, 4, 5]
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), 200))
+    model = pycorrfit.models.modeldict[modelid]
+    parms = np.array(model.default_values, dtype=float)
+    parms[4] = .4
+    parms[5] = .3
+    rng = np.random.default_rng(42)
+    data = model(parms, tau)
+    data += (rng.random(tau.size) - .5) * 1e-2 * np.max(data)
+
+    def fit(start):
+        corr = fit_variable(modelid, tau, data, start, variable)
+        return corr.fit_parameters, corr.fit_results["chi2"]
+
+    _, chi2_ref = fit(parms)
+    assert np.allclose(chi2_ref, chi2_base, rtol=1e-6)
+    for _ in range(12):
+        # includes starts with F₁ + F₂ > 1 (clipped F₂)
+        start = parms.copy()
+        start[variable] *= rng.uniform(.5, 1.5, len(variable))
+        start[4] = rng.uniform(.3, .9)
+        start[5] = rng.uniform(0, .6)
+        parms_fit, chi2 = fit(start)
+        assert np.allclose(chi2, chi2_ref, rtol=1e-3)
+        assert np.allclose(parms_fit[variable], parms[variable], rtol=.05)
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+@pytest.mark.parametrize("modelid,variable", [
+    (6000, [0, 1, 2]),  # TIR-FCS, finite differences
+    (6001, [0, 1, 2]),
+    (6011, [0, 1, 3]),  # τ_trip fixed, constraint τ_diff > τ_trip
+    (6012, [0, 1, 2]),
+])
+def test_fit_least_squares(monkeypatch, modelid, variable):
+    """Fits with `Fit.least_squares` and with lmfit agree"""
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), TAULEN))
+    model = pycorrfit.models.modeldict[modelid]
+    parms = np.array(model.default_values, dtype=float)
+    rng = np.random.default_rng(5)
+    data = model(parms, tau)
+    data += (rng.random(TAULEN) - .5) * 1e-2 * np.max(data)
+    start = parms.copy()
+    start[variable] *= .8
+
+    def fit():
+        return fit_variable(modelid, tau, data, start, variable).fit_results
+
+    def lmfit_minimize(*args, **kwargs):
+        raise AssertionError("lmfit must not be used!")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(pycorrfit.fit.lmfit, "minimize", lmfit_minimize)
+        res_ls = fit()
+    monkeypatch.setattr(Fit, "use_least_squares", False)
+    res_lm = fit()
+    assert np.allclose(res_ls["chi2"], res_lm["chi2"], rtol=1e-6)
+    assert np.allclose(res_ls["fit result"], res_lm["fit result"],
+                       rtol=1e-4, atol=1e-10)
+    assert np.allclose(res_ls["fit error estimation"],
+                       res_lm["fit error estimation"], rtol=1e-2)
+
+
+def synthetic_correlations(modelids, seed=7):
+    """Correlations with noisy data of the default model parameters"""
+    tau = np.exp(np.linspace(np.log(1e-5), np.log(1e4), TAULEN))
+    rng = np.random.default_rng(seed)
+    corrs = []
+    for modelid in modelids:
+        corr = Correlation(fit_model=modelid, fit_algorithm=FITALG)
+        parms = corr.fit_model.default_values
+        data = corr.fit_model(parms, tau)
+        data += (rng.random(TAULEN) - .5) * 1e-2 * np.max(data)
+        corr.correlation = np.column_stack((tau, data))
+        corr.fit_parameters = parms * .8
+        corrs.append(corr)
+    return corrs
+
+
+@pytest.mark.filterwarnings('ignore::pycorrfit.fit.StuckParameterWarning')
+def test_fit_parallel():
+    """Fitting independent correlations in a process pool gives the
+    same results as fitting them one after another"""
+    modelids = [6000, 6001, 6011, 6035, 6012, 6001]
+    corrs_ser = synthetic_correlations(modelids)
+    corrs_par = synthetic_correlations(modelids)
+    corrs_par[-1].fit_algorithm = "Nelder-Mead"
+    corrs_ser[-1].fit_algorithm = "Nelder-Mead"
+    Fit(corrs_ser)
+    Fit(corrs_par, n_jobs=2)
+    for cs, cp in zip(corrs_ser, corrs_par):
+        assert np.all(cs.fit_parameters == cp.fit_parameters)
+        assert set(cs.fit_results.keys()) == set(cp.fit_results.keys())
+        for key in cs.fit_results:
+            assert np.all(cs.fit_results[key] == cp.fit_results[key])
+
+
+def test_fit_parallel_user_model():
+    """Models that cannot be pickled are fitted in the current process"""
+    model = pycorrfit.models.modeldict[6001]
+
+    def user_function(parms, tau):
+        return model.function(parms, tau)
+
+    user_model = pycorrfit.models.Model({
+        "Parameters": model.parameters,
+        "Definitions": [9999, "", "User model", user_function],
+    })
+    corrs = synthetic_correlations([6001, 6001])
+    corrs[0].fit_model = user_model
+    corrs[0].correlation = corrs[1].correlation
+    corrs[0].fit_parameters = corrs[1].fit_parameters
+    jobs = [Fit.get_fit_job(cc) for cc in corrs]
+    assert jobs[0]["model"] is user_model
+    assert jobs[1]["model"] == 6001
+    results = Fit.minimize_jobs(jobs, n_jobs=2)
+    assert results[0] is None
+    assert results[1] is not None
+    Fit(corrs, n_jobs=2)
+    assert np.allclose(corrs[0].fit_parameters, corrs[1].fit_parameters)
+    assert np.allclose(corrs[0].fit_parameters, model.default_values,
+                       rtol=.05)
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
@@ -0,0 +1,408 @@
+"""Test the TTTR photon import and correlation"""
+import numpy as np
+import pytest
+
+from pycorrfit import readfiles
+from pycorrfit.readfiles import openPT3
+from pycorrfit.readfiles.read_pt3_scripts import correlation_methods
+from pycorrfit.readfiles.read_pt3_scripts import fib4
+from pycorrfit.readfiles.read_pt3_scripts import import_methods
+
+import synthetic_tttr
+
+
+def test_pt3_header(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    with open(path, "rb") as fd:
+        records, resolution, syncperiod = import_methods.pt3header(fd)
+        assert fd.tell() == synthetic_tttr.PT3_HEADER_SIZE
+    assert np.allclose(resolution, 0.016)
+    assert syncperiod == 100
+
+
+def test_pt3_records():
+    nsync, channel, dtime = synthetic_tttr.photon_stream(duration=.2)
+    records = synthetic_tttr.t3_records(nsync, channel, dtime)
+    chan, time, dtm, ofltime = import_methods.pt3records(records, 0, 100, .5)
+    photons = chan != 15
+    assert np.all(chan[photons] == channel)
+    assert np.all(dtm[photons] == dtime)
+    assert np.all(dtm[~photons] == 0)
+    assert time.dtype == np.int64
+    assert np.all(time[photons] == np.round(nsync * 100 + dtime * .5))
+    assert ofltime == np.sum(~photons) * synthetic_tttr.WRAPAROUND
+    # overflow time is carried over
+    chan2, time2, _, _ = import_methods.pt3records(records, 65536, 100, .5)
+    assert np.all(time2 == time + 65536 * 100)
+
+
+def test_pt3_import_chunks(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    chan, time, dtime, res = import_methods.pt3import(path)
+    chunks = list(import_methods.pt3import_chunks(path, 9999))
+    assert len(chunks) > 1
+    assert np.all(chan == np.concatenate([c[0] for c in chunks]))
+    assert np.all(time == np.concatenate([c[1] for c in chunks]))
+    assert np.all(dtime == np.concatenate([c[2] for c in chunks]))
+
+
+def test_intersection_backends():
+    rng = np.random.default_rng(5)
+    y = np.unique(rng.integers(0, 10**6, 50000))
+    for lag in [1, 6, 101]:
+        ref = fib4.dividAndConquer_searchsorted(y, y + lag)
+        assert ref[0].sum() > 0
+        for name, func in fib4.BACKENDS.items():
+            res = func(y, y + lag)
+            assert np.all(res[0] == ref[0]), name
+            assert np.all(res[1] == ref[1]), name
+    # the last element is never matched
+    for func in fib4.BACKENDS.values():
+        mask1, mask2 = func(np.arange(5), np.arange(5) + 1)
+        assert np.all(mask1 == [0, 1, 1, 1])
+        assert np.all(mask2 == [1, 1, 1, 0])
+
+
+def test_intersection_set_backend():
+    default = fib4.get_backend()
+    assert default in fib4.BACKEND_PREFERENCE
+    try:
+        fib4.set_backend("searchsorted")
+        assert fib4.get_backend() == "searchsorted"
+        with pytest.raises(ValueError, match="Unknown or unavailable"):
+            fib4.set_backend("cython")
+    finally:
+        fib4.set_backend(default)
+
+
+def test_merge_times():
+    rng = np.random.default_rng(3)
+    y = np.sort(rng.integers(0, 500, 2000))
+    num = rng.integers(0, 2, (2000, 2)).astype(float)
+    yu = np.unique(y)
+    ym, nm = correlation_methods.mergeTimes(y, num)
+    assert np.all(ym == yu)
+    # each time gets the weights of its own photons
+    for ii in range(yu.size):
+        assert np.all(nm[ii] == num[y == yu[ii]].sum(0))
+    # no identical times
+    ym, nm = correlation_methods.mergeTimes(yu, num[:yu.size])
+    assert np.all(nm == num[:yu.size])
+
+
+def test_stream_correlator():
+    nsync, channel, _ = synthetic_tttr.photon_stream(duration=.2)
+    # many identical time stamps in the first cascade
+    y = nsync
+    num = np.zeros((y.size, 2))
+    num[:, 0] = channel == 1
+    num[:, 1] = channel == 2
+    auto, autotime = correlation_methods.tttr2xfcs(y, num, 0, 25, 6)
+    for chunk in [1000, 4321, y.size]:
+        stream = correlation_methods.tttr2xfcsStream(2, 0, 25, 6)
+        for ii in range(0, y.size, chunk):
+            stream.add(y[ii:ii+chunk], num[ii:ii+chunk])
+        sauto, sautotime = stream.result()
+        assert np.all(sauto == auto)
+        assert np.all(sautotime == autotime)
+    # float times are rounded to integer ticks
+    fauto, fautotime = correlation_methods.tttr2xfcs(y + .2, num, 0, 25, 6)
+    assert np.all(fauto == auto)
+
+
+def test_stream_delaytime2bin():
+    rng = np.random.default_rng(7)
+    values = np.sort(rng.uniform(0, 1000, 10000))
+    values[::7] = np.round(values[::7] / 25) * 25
+    chans = rng.integers(1, 3, values.size)
+    ref = correlation_methods.delayTime2bin(values, chans, 1, 25)
+    binner = correlation_methods.delayTime2binStream(1, 25)
+    for ii in range(0, values.size, 333):
+        binner.add(values[ii:ii+333], chans[ii:ii+333])
+    assert binner.result() == ref
+
+
+def test_delaytime2bin_channels():
+    rng = np.random.default_rng(9)
+    dtime = rng.integers(0, 4096, 20000).astype(np.uint16)
+    times = np.sort(rng.integers(0, 10**9, 20000))
+    times[::11] = times[::11] // 25000000 * 25000000
+    chans = rng.integers(1, 5, 20000).astype(np.uint8)
+    chans[::97] = 15
+    for values, winInt in [(dtime, 10), (times, 25000000),
+                           (times / 3., 25000)]:
+        res = correlation_methods.delayTime2binChannels(
+            values, chans, [1, 2, 4, 3, 2], winInt)
+        for ch, (counts, scale) in zip([1, 2, 4, 3, 2], res):
+            ref = correlation_methods.delayTime2bin(values, chans, ch, winInt)
+            assert (counts, scale) == ref
+
+
+def test_openpt3_chunk_size(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    data = openPT3(path)
+    sdata = openPT3(path, chunk_size=20000)
+    assert data["Type"] == ["AC0", "AC1", "CC01", "CC10"]
+    assert sdata["Type"] == data["Type"]
+    for ii in range(len(data["Type"])):
+        assert np.all(data["Correlation"][ii] == sdata["Correlation"][ii])
+        for tr1, tr2 in zip(data["Trace"][ii], sdata["Trace"][ii]):
+            assert np.all(tr1 == tr2)
+
+
+def test_parallel_correlator():
+    nsync, channel, _ = synthetic_tttr.photon_stream(duration=.2)
+    num = np.zeros((nsync.size, 2))
+    num[:, 0] = channel == 1
+    num[:, 1] = channel == 2
+    auto, autotime = correlation_methods.tttr2xfcs(nsync, num, 0, 25, 6)
+    for n_workers, ncascstart in [(2, 0), (3, 4), (16, 0)]:
+        ref, _ = correlation_methods.tttr2xfcs(nsync, num, ncascstart, 25, 6)
+        pauto, pautotime = correlation_methods.tttr2xfcs(
+            nsync, num, ncascstart, 25, 6, n_workers=n_workers)
+        assert np.all(pauto == ref)
+        assert np.all(pautotime == autotime)
+
+
+def test_openpt3_n_workers(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    data = openPT3(path)
+    pdata = openPT3(path, n_workers=2)
+    for ii in range(len(data["Type"])):
+        assert np.all(data["Correlation"][ii] == pdata["Correlation"][ii])
+
+
+def test_multichannel_correlator():
+    nsync, channel, _ = synthetic_tttr.photon_stream(duration=.2, nchannels=4)
+    num = (channel[:, np.newaxis] == np.arange(1, 5)).astype(float)
+    auto, _ = correlation_methods.tttr2xfcs(nsync, num, 0, 25, 6)
+    assert auto.shape[1:] == (4, 4)
+    # every pair equals the correlation with two weight columns
+    for ii, jj in [(0, 3), (2, 1)]:
+        pauto, _ = correlation_methods.tttr2xfcs(
+            nsync, num[:, [ii, jj]], 0, 25, 6)
+        assert np.all(auto[:, ii, jj] == pauto[:, 0, 1])
+        assert np.all(auto[:, jj, jj] == pauto[:, 1, 1])
+
+
+def test_stream_correlator_new_channel():
+    nsync, channel, _ = synthetic_tttr.photon_stream(duration=.2, nchannels=3)
+    # channel 3 only appears in the second half
+    channel[:nsync.size // 2][channel[:nsync.size // 2] == 3] = 1
+    num = (channel[:, np.newaxis] == np.arange(1, 4)).astype(float)
+    auto, _ = correlation_methods.tttr2xfcs(nsync, num, 0, 25, 6)
+    stream = correlation_methods.tttr2xfcsStream(2, 0, 25, 6)
+    half = nsync.size // 2
+    stream.add(nsync[:half], num[:half, :2])
+    stream.addChannels(3)
+    stream.add(nsync[half:], num[half:])
+    sauto, _ = stream.result()
+    assert np.all(sauto == auto)
+
+
+def test_openpt3_multichannel(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3", nchannels=4)
+    data = openPT3(path)
+    types = ["AC0", "AC1", "AC2", "AC3"]
+    types += ["CC{}{}".format(ii, jj) for ii in range(4) for jj in range(4)
+              if ii != jj]
+    assert data["Type"] == types
+    assert len(data["Trace"][types.index("CC23")]) == 2
+    sdata = openPT3(path, chunk_size=20000)
+    assert sdata["Type"] == types
+    for ii in range(len(types)):
+        assert np.all(data["Correlation"][ii] == sdata["Correlation"][ii])
+    # a curve does not depend on the other correlated channels
+    for kwargs in [{}, {"chunk_size": 20000}]:
+        pdata = openPT3(path, virtual_channels=[(1, None), (2, None)],
+                        **kwargs)
+        assert pdata["Type"] == ["AC0", "AC1", "CC01", "CC10"]
+        for ctype in ["AC0", "AC1", "CC01", "CC10"]:
+            assert np.all(pdata["Correlation"][pdata["Type"].index(ctype)]
+                          == data["Correlation"][types.index(ctype)])
+
+
+def test_gate_weights():
+    chan = np.array([1, 1, 2, 1, 15])
+    dtime = np.array([10, 500, 20, 4000, 0])
+    gw = correlation_methods.gateWeights
+    assert np.all(gw(chan, dtime, 1) == [1, 1, 0, 1, 0])
+    assert np.all(gw(chan, dtime, 1, (0, 1000)) == [1, 1, 0, 0, 0])
+    filt = np.linspace(0, 1, 1001)
+    assert np.allclose(gw(chan, dtime, 1, filt), [.01, .5, 0, 0, 0])
+    with pytest.raises(ValueError, match="must be \\(start, stop\\)"):
+        gw(chan, dtime, 1, (0, 1, 2))
+
+
+def test_openpt3_virtual_channels(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    data = openPT3(path)
+    # gates that contain all photons
+    vdata = openPT3(path, virtual_channels=[(1, (0, 4096)),
+                                            (2, np.ones(4096))])
+    assert vdata["Type"] == data["Type"]
+    for ii in range(len(data["Type"])):
+        assert np.all(data["Correlation"][ii] == vdata["Correlation"][ii])
+    # PIE-like gates on one detector and a gate without photons
+    gates = [(1, (0, 300)), (1, (300, 4096)), (2, None), (2, (5000, 6000))]
+    vdata = openPT3(path, virtual_channels=gates)
+    assert vdata["Type"] == ["AC0", "AC1", "AC2", "CC01", "CC02", "CC10",
+                             "CC12", "CC20", "CC21"]
+    sdata = openPT3(path, virtual_channels=gates, chunk_size=20000)
+    assert sdata["Type"] == vdata["Type"]
+    for ii in range(len(vdata["Type"])):
+        assert np.all(vdata["Correlation"][ii] == sdata["Correlation"][ii])
+        for tr1, tr2 in zip(vdata["Trace"][ii], sdata["Trace"][ii]):
+            assert np.all(tr1 == tr2)
+    # a window filter equals the gate
+    filt = np.zeros(4096)
+    filt[:300] = 1
+    fdata = openPT3(path, virtual_channels=[(1, filt)] + gates[1:])
+    for ii in range(len(vdata["Type"])):
+        assert np.all(vdata["Correlation"][ii] == fdata["Correlation"][ii])
+
+
+@pytest.mark.parametrize("kwargs", [{},
+                                    {"chunk_size": 20000},
+                                    {"segment_length": .1},
+                                    {"chunk_size": 20000,
+                                     "segment_length": .1}])
+def test_openpt3_virtual_channels_no_photons(tmp_path, kwargs):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3", duration=.5)
+    data = openPT3(path, virtual_channels=[(1, None)], **kwargs)
+    # detector 3 is not in the file
+    vdata = openPT3(path, virtual_channels=[(1, None), (3, None)], **kwargs)
+    assert vdata["Type"] == data["Type"] == ["AC0"]
+    assert np.all(vdata["Correlation"][0] == data["Correlation"][0])
+    with pytest.raises(ValueError, match="No photons"):
+        openPT3(path, virtual_channels=[(3, None)], **kwargs)
+    with pytest.raises(ValueError, match="No photons"):
+        openPT3(path, virtual_channels=[(3, (0, 300))], **kwargs)
+
+
+def test_segment_correlator():
+    nsync, channel, _ = synthetic_tttr.photon_stream(duration=.2)
+    y = nsync * 100
+    num = (channel[:, np.newaxis] == np.arange(1, 3)).astype(float)
+    auto, autotime = correlation_methods.tttr2xfcs(y, num, 0, 25, 6)
+    corr = correlation_methods.tttr2xfcsSegments(2, 0, 25, 6, 30000000)
+    for ii in range(0, y.size, 5000):
+        corr.add(y[ii:ii+5000], num[ii:ii+5000])
+    sauto, sautotime = corr.result()
+    assert np.all(sauto == auto)
+    segs = corr.segments()
+    assert segs["auto"].shape == (7, autotime.size, 2, 2)
+    assert np.all(segs["counts"].sum(axis=0) == num.sum(axis=0))
+    assert segs["duration"].sum() == segs["dt"] == y.max() - y.min()
+    # the segment sums add up to the complete correlation
+    dt = segs["dt"]
+    total = segs["auto"].sum(axis=0) * dt / (dt - segs["autotime"]).reshape(-1, 1, 1)
+    assert np.allclose(total, auto)
+
+
+def test_openpt3_segments(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3", duration=2)
+    data = openPT3(path)
+    sdata = openPT3(path, segment_length=.25)
+    assert "Segments" not in data
+    assert sdata["Weight Name"] == ["segments"] * 4
+    for ii in range(len(data["Type"])):
+        assert np.all(data["Correlation"][ii] == sdata["Correlation"][ii])
+        seg = sdata["Segments"][ii]
+        assert len(seg) == 8
+        assert np.allclose(seg.correlation(), data["Correlation"][ii])
+        assert not np.allclose(seg.correlation(exclude=[0, 3]),
+                               data["Correlation"][ii])
+        sem = sdata["Weight"][ii]
+        assert sem.shape == (data["Correlation"][ii].shape[0],)
+        assert np.count_nonzero(sem) > 100
+        assert np.all(sem >= 0)
+    with pytest.raises(ValueError, match="Cannot exclude all segments"):
+        seg.correlation(exclude=range(8))
+    # chunk-wise import
+    cdata = openPT3(path, segment_length=.25, chunk_size=12345)
+    for seg, cseg in zip(sdata["Segments"], cdata["Segments"]):
+        assert np.all(seg.auto == cseg.auto)
+        assert np.all(seg.count1 == cseg.count1)
+
+
+def test_cascade_levels():
+    levels = correlation_methods.cascadeLevels
+    assert levels(6, 25) == (0, 25)
+    # lags of the first cascades: 1..6, 8..18, 22..42
+    assert levels(6, 25, minLag=7) == (1, 25)
+    assert levels(6, 25, minLag=19) == (2, 25)
+    assert levels(6, 25, maxLag=18) == (0, 2)
+    assert levels(6, 25, maxLag=19) == (0, 3)
+    assert levels(6, 25, minLag=7, maxLag=7) == (1, 2)
+    # cascades beyond a fraction of the duration are skipped
+    assert levels(6, 25, duration=210, maxFraction=.1) == (0, 2)
+    assert levels(6, 25, maxLag=1000, duration=40) == (0, 3)
+    assert levels(6, 25, duration=1) == (0, 1)
+    assert levels(4, 30, duration=10**12, maxFraction=1) == (0, 30)
+
+
+def test_openpt3_lag_range(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    data = openPT3(path)
+    lag = data["Correlation"][0][:, 0]
+    # all cascades of the 1 s measurement (as in PyCorrFit 1.3)
+    assert lag.size == 25 * 6
+    # cascades starting beyond a tenth of the measurement duration
+    fdata = openPT3(path, max_lag_fraction=.1)
+    flag = fdata["Correlation"][0][:, 0]
+    assert flag.size == 24 * 6
+    assert flag[-6] < 100
+    assert np.all(fdata["Correlation"][0] == data["Correlation"][0][:144])
+    rdata = openPT3(path, min_lag=1e-3, max_lag=10)
+    for corr, rcorr in zip(data["Correlation"], rdata["Correlation"]):
+        incl = (lag >= 1e-3) & (lag <= 10)
+        assert np.all(rcorr == corr[incl])
+    sdata = openPT3(path, min_lag=1e-3, max_lag=10, chunk_size=30000)
+    for corr, scorr in zip(rdata["Correlation"], sdata["Correlation"]):
+        assert np.all(corr == scorr)
+    # long lag times
+    ldata = openPT3(path, max_lag=500)
+    assert 400 < ldata["Correlation"][0][-1, 0] <= 500
+    # lag times per octave
+    pdata = openPT3(path, points_per_octave=8, max_lag=10)
+    plag = pdata["Correlation"][0][:, 0]
+    assert np.sum((plag > 1) & (plag <= 2)) == 8
+    with pytest.raises(ValueError, match="must be at least 1"):
+        openPT3(path, points_per_octave=0)
+
+
+def test_openpt3_trace_pyramid(tmp_path):
+    path = synthetic_tttr.write_pt3(tmp_path / "test.pt3")
+    data = openPT3(path, trace_bin=.25)
+    pyrs = data["Trace Pyramid"]
+    assert len(pyrs) == len(data["Trace"])
+    # the cross-correlation curves share the pyramids of the channels
+    assert pyrs[data["Type"].index("CC01")][0] is pyrs[0][0]
+    pyr = pyrs[0][0]
+    # full resolution is kept, the trace is downsampled
+    assert pyr.levels[0].size > 3000
+    assert len(data["Trace"][0][0]) < 1000
+    assert pyr.levels[0].dtype.itemsize == 1
+    for fine, coarse in zip(pyr.levels[:-1], pyr.levels[1:]):
+        size = coarse.size * 2
+        assert np.all(coarse == fine[:size:2].astype(int) + fine[1:size:2])
+    assert pyr.levels[-1].size in [2, 3]
+    # same count rate as the trace
+    ref = pyr.level(0)
+    assert np.allclose(np.mean(ref[:, 1]),
+                       np.mean(data["Trace"][0][0][:, 1]), rtol=.01)
+    assert np.allclose(ref[:2, 0], [.125, .375])
+    # default view and zoom
+    assert pyr.select() == 3
+    assert len(pyr.trace()) <= 500
+    zoom = pyr.trace(100, 110)
+    assert np.allclose(zoom[:, 0], np.arange(100.125, 110, .25))
+    traces = readfiles.get_traces(data)
+    assert np.all(traces[0][0].trace == data["Trace"][0][0])
+    assert np.all(traces[0][0].zoom(100, 110) == zoom)
+    # trace bin
+    cdata = openPT3(path)
+    assert cdata["Trace Pyramid"][0][0].binwidth == 25
+    with pytest.raises(ValueError, match="must be positive"):
+        openPT3(path, trace_bin=0)
@@ -3,6 +3,8 @@ import os
 import pathlib
 import tempfile
 import shutil
+import threading
+import zipfile
 
 import numpy as np
 import pytest
@@ -92,6 +94,159 @@ def test_basic():
     shutil.rmtree(tmpdir, ignore_errors=True)
 
 
+def make_infodict():
+    """Synthetic session with an autocorrelation, a cross-correlation,
+    and a page without experimental data"""
+    tau = np.exp(np.linspace(np.log(1e-3), np.log(1e3), 200))
+    corr = np.column_stack((tau, 1 / (1 + tau)))
+    time = np.linspace(0, 1e4, 300)
+    trace = pcf.Trace(trace=np.column_stack((time, 10 + np.sin(time))),
+                      name="trace")
+
+    def parms(number, cross):
+        return ["#{}:".format(number), 6000, [4, .4, .1], [True, True, False],
+                [0, 200], [0, 3, 5, "Lev-Mar"], [0, None], cross, None,
+                [[0, np.inf], [0, np.inf], [0, np.inf]]]
+
+    return {
+        "Correlations": {1: [tau, corr],
+                         2: [tau, corr * 2],
+                         3: [tau, None]},
+        "Parameters": {1: parms(1, False),
+                       2: parms(2, True),
+                       3: parms(3, False)},
+        "Supplements": {1: {"FitErr": [], "Chi sq": 1.0,
+                            "Global Share": []}},
+        "External Functions": {},
+        "Traces": {1: [trace],
+                   2: [trace, pcf.Trace(trace=trace.trace * [1, 2])],
+                   3: None},
+        "Comments": {1: "first", 2: "second", 3: "third",
+                     "Session": "No comment."},
+        "Backgrounds": [pcf.Trace(trace=np.column_stack((time, time*0+.5)),
+                                  name="bg, buffer")],
+        "External Weights": {2: {"Other": np.linspace(1, 2, 200)}},
+        "Preferences": {},
+    }
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_session_synthetic(tmp_path, version):
+    infodict = make_infodict()
+    path = tmp_path / "session.pcfs"
+    pcf.openfile.SaveSessionData(str(path), infodict, version=version)
+    ldt = pcf.openfile.LoadSessionData(str(path))
+    assert sorted(ldt["Correlations"]) == [1, 2, 3]
+    for pageid in [1, 2]:
+        assert np.allclose(ldt["Correlations"][pageid][1],
+                           infodict["Correlations"][pageid][1])
+        for tr, ref in zip(ldt["Traces"][pageid], infodict["Traces"][pageid]):
+            assert np.allclose(tr, ref.trace)
+    assert len(ldt["Traces"][2]) == 2
+    assert ldt["Correlations"][3][1] is None
+    assert np.allclose(ldt["Correlations"][3][0],
+                       infodict["Correlations"][3][0])
+    assert not ldt["Traces"][3]
+    assert np.allclose(ldt["External Weights"][2]["Other"],
+                       infodict["External Weights"][2]["Other"])
+    assert 1 not in ldt["External Weights"]
+    bg = ldt["Backgrounds"][0]
+    assert bg.name == "bg, buffer"
+    assert np.allclose(bg.countrate, .5)
+    assert np.allclose(bg.trace, infodict["Backgrounds"][0].trace)
+    assert ldt["Comments"][2] == "second"
+    assert ldt["Comments"]["Session"] == "No comment."
+    assert ldt["Parameters"][1][7]
+
+
+def test_session_lazy(tmp_path):
+    path = tmp_path / "session.pcfs"
+    pcf.openfile.SaveSessionData(str(path), make_infodict())
+    with zipfile.ZipFile(path) as arc:
+        names = arc.namelist()
+    assert "Manifest.yaml" in names
+    assert "arrays/data1.npy" in names
+    assert not [nn for nn in names if nn.endswith(".csv")]
+    ldt = pcf.openfile.LoadSessionData(str(path))
+    correlations = ldt["Correlations"]
+    assert isinstance(correlations, pcf.openfile.LazySessionData)
+    assert len(correlations._data) == 0
+    archive = correlations._archive
+    correlations[1]
+    assert list(correlations._data) == [1]
+    assert archive._pending == 2 * 3 + 1 - 1
+    # the session file is closed when all arrays were loaded
+    for key in ["Correlations", "Traces", "External Weights"]:
+        for pageid in ldt[key]:
+            ldt[key][pageid]
+    assert archive._arc is None
+    # the session file can be overwritten
+    pcf.openfile.SaveSessionData(str(path), make_infodict(), version=1)
+    ldt = pcf.openfile.LoadSessionData(str(path))
+    assert isinstance(ldt["Correlations"], dict)
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_session_open_zip(tmp_path, version):
+    infodict = make_infodict()
+    path = tmp_path / "session.pcfs"
+    pcf.openfile.SaveSessionData(str(path), infodict, version=version)
+    data = pcf.readfiles.open_any(path)
+    assert data["Type"] == ["AC", "CC"]
+    assert data["Filename"] == ["session.pcfs/#1", "session.pcfs/#2"]
+    assert np.allclose(data["Correlation"][1],
+                       infodict["Correlations"][2][1])
+    assert np.allclose(data["Trace"][0], infodict["Traces"][1][0].trace)
+    assert len(data["Trace"][1]) == 2
+
+
+@pytest.mark.parametrize("compression,n_threads",
+                         [(zipfile.ZIP_STORED, 1),
+                          (zipfile.ZIP_DEFLATED, 1),
+                          (zipfile.ZIP_DEFLATED, 3)])
+def test_session_save_threads(tmp_path, compression, n_threads):
+    cwd = os.getcwd()
+    paths = [tmp_path / "session{}.pcfs".format(ii) for ii in range(4)]
+    workers = [threading.Thread(
+        target=pcf.openfile.SaveSessionData,
+        args=(str(pp), make_infodict()),
+        kwargs={"version": 1 + ii % 2, "compression": compression,
+                "n_threads": n_threads})
+        for ii, pp in enumerate(paths)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert os.getcwd() == cwd
+    assert sorted(tmp_path.iterdir()) == paths
+    ref = make_infodict()
+    for path in paths:
+        with zipfile.ZipFile(path) as arc:
+            assert arc.infolist()[0].compress_type == compression
+        ldt = pcf.openfile.LoadSessionData(str(path))
+        assert np.allclose(ldt["Correlations"][2][1],
+                           ref["Correlations"][2][1])
+        assert np.allclose(ldt["Traces"][2][1], ref["Traces"][2][1].trace)
+
+
+def test_session_save_error(tmp_path, monkeypatch):
+    path = tmp_path / "session.pcfs"
+    pcf.openfile.SaveSessionData(str(path), make_infodict(), version=1)
+    data = path.read_bytes()
+
+    def broken_member(array):
+        def write(fd):
+            raise OSError("disk full")
+        return write
+
+    monkeypatch.setattr(pcf.openfile, "_npy_member", broken_member)
+    with pytest.raises(OSError, match="disk full"):
+        pcf.openfile.SaveSessionData(str(path), make_infodict())
+    # the session file was not modified and there are no leftovers
+    assert path.read_bytes() == data
+    assert list(tmp_path.iterdir()) == [path]
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()